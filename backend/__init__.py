@@ -1,3 +1,12 @@
-from .app import app
+from typing import Any
 
 __all__ = ["app"]
+
+
+def __getattr__(name: str) -> Any:
+    # `uvicorn backend:app` continua funcionando; scripts que importam só
+    # backend.ml/backend.benchmarks não carregam mais o app inteiro
+    if name == "app":
+        from .app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,33 +5,45 @@ import logging
 import math
 import os
 import random
-import sqlite3
 import subprocess
 import uuid
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile
+from fastapi import Depends, FastAPI, HTTPException, Request, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from passlib.context import CryptContext
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from pathlib import Path
 
 from prisma import Prisma
 from prisma.errors import DataError
 
+from backend.services.admin_auth import require_admin
+from backend.services.activity_stats import activity_stats, public_view as public_activity_stats
+from backend.services.checkin_anomalies import OPEN_ALERTS_SQL, checkin_anomalies
+from backend.services.cpu_budget import cpu_budget
+from backend.services.course_recommendations import USER_RECOMMENDATIONS_SQL, course_recommendations
+from backend.services.idempotency import idempotency_store
+from backend.services.interaction_ingest import interaction_writer
+from backend.services import sqlite_reader
 from backend.services.predictive_lab import predictive_lab
-from backend.services.social_impact import build_social_impact
-
-# Import ML endpoints
-try:
-    from backend.ml.inference.ml_endpoints import router as ml_router
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
-    print("Warning: ML endpoints not available. Run: python backend/ml/models/all_models.py")
+from backend.services.profiling import AllocationMiddleware, allocation_tracker, stack_sampler
+from backend.services.query_tracer import QUERY_TRACING_ENABLED, QueryTraceMiddleware, query_budget, query_tracer
+from backend.services.request_metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    METRICS_ENABLED,
+    MetricsMiddleware,
+    request_metrics,
+)
+from backend.services.shared_state import shared_state
+from backend.services.social_impact import build_social_impact, social_impact
+from backend.services.sqlite_reader import SQLiteReadPool, sqlite_datetime
 
+from backend.services.ml_executor import ExecutorSaturated, ExecutorTimeout, ml_executor
+from backend.services.ml_loader import DeferredMLMiddleware, ml_loader
 AI_MODEL_DEFAULT = "gemini-1.5-flash"
 AI_API_KEY = (
     os.getenv("GENAI_API_KEY")
@@ -67,12 +79,31 @@ app.add_middleware(
     allow_origin_regex=allow_origin_regex,
 )
 
-# Include ML router if available
-if ML_AVAILABLE:
-    app.include_router(ml_router)
-    print("✓ ML endpoints registered successfully!")
+# Limites de threads nativas antes de o ML importar numpy/sklearn/torch (com o
+# launcher já vêm definidos pelo mestre) — ver backend/services/cpu_budget.py
+cpu_budget.configure_environment()
+
+# Router de ML: importado no startup (eager) ou depois que o servidor já atende
+# (background/lazy), conforme ML_STARTUP_MODE — ver backend/services/ml_loader.py
+ml_loader.attach(app)
+app.add_middleware(DeferredMLMiddleware, loader=ml_loader)
+ml_loader.add_warmup(predictive_lab.preload)
+course_recommendations.use_model(lambda: ml_loader.registry.get("recommender"))
+
+
+# Trabalho de CPU do ML roda no ml_executor: fila cheia responde na hora em vez
+# de enfileirar atrás das outras requisições
+@app.exception_handler(ExecutorSaturated)
+async def ml_saturated(request: Request, exc: ExecutorSaturated):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(ExecutorTimeout)
+async def ml_timeout(request: Request, exc: ExecutorTimeout):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
 
 prisma = Prisma()
+interaction_writer.add_listener(activity_stats.record)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -90,16 +121,61 @@ def _resolve_sqlite_path(url: str) -> str:
     return os.path.abspath(path)
 
 _SQLITE_DB_PATH = _resolve_sqlite_path(os.getenv("DATABASE_URL", "file:./data/databases/dev.db"))
+read_pool = SQLiteReadPool(_SQLITE_DB_PATH)
+
+
+# Colunas de perfil de aprendizado (migração 20261019120000_perfil_aprendizado)
+# em bancos que ainda não a aplicaram: o cliente Prisma gerado já as espera
+_PROFILE_COLUMNS = (("perfilAprendizado", "TEXT"), ("perfilCluster", "INTEGER"), ("perfilAtualizadoEm", "DATETIME"))
+
+
+async def ensure_profile_columns(db: Prisma) -> None:
+    existing = {row["name"] for row in await db.query_raw('PRAGMA table_info("usuarios")')}
+    for column, sql_type in _PROFILE_COLUMNS:
+        if column in existing:
+            continue
+        try:
+            await db.execute_raw(f'ALTER TABLE "usuarios" ADD COLUMN "{column}" {sql_type}')
+        except Exception:
+            # outro worker subindo junto pode ter criado a coluna primeiro
+            columns = {row["name"] for row in await db.query_raw('PRAGMA table_info("usuarios")')}
+            if column not in columns:
+                raise
 
 
 @app.on_event("startup")
 async def on_startup():
+    await shared_state.open()
     await prisma.connect()
+    await ensure_profile_columns(prisma)
+    await idempotency_store.ensure_schema(prisma)
+    await activity_stats.ensure_schema(prisma)
+    await activity_stats.start(prisma)
+    await social_impact.ensure_schema(prisma)
+    await social_impact.start(prisma)
+    await course_recommendations.ensure_schema(prisma)
+    await course_recommendations.start(prisma)
+    await checkin_anomalies.ensure_schema(prisma)
+    await checkin_anomalies.start(prisma)
+    await interaction_writer.start(prisma)
+    await read_pool.open()
+    # pools globais (BLAS, torch) já carregados; as threads do ml_executor aplicam por conta própria
+    cpu_budget.apply()
+    await ml_loader.start()
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    await ml_loader.stop()
+    await interaction_writer.stop()
+    await activity_stats.stop()
+    await social_impact.stop()
+    await course_recommendations.stop()
+    await checkin_anomalies.stop()
+    await read_pool.close()
+    ml_executor.shutdown()
     await prisma.disconnect()
+    await shared_state.close()
 
 
 def _uuid(value: Optional[str] = None) -> str:
@@ -152,27 +228,119 @@ def _dec(value: Optional[str]) -> Optional[str]:
         return value
 
 # --- Rate Limiting (IP/rota) ---
-# Aumentado para 200 requisições por minuto para suportar carregamento inicial
+# Aumentado para 200 requisições por minuto para suportar carregamento inicial.
+# A janela fica no estado compartilhado: com vários workers o limite vale para
+# o conjunto (SHARED_STATE_URL), não para cada processo.
 RATE_MAX = int(os.getenv("RATE_MAX", "200"))
 RATE_WINDOW_SEC = int(os.getenv("RATE_WINDOW_SEC", "60"))
-_RATE_BUCKETS: Dict[str, List[float]] = {}
 
 @app.middleware("http")
 async def rate_limit(request: Request, call_next):
     ip = request.client.host if request.client else "unknown"
-    key = f"{ip}:{request.url.path}"
-    now = datetime.utcnow().timestamp()
-    window_start = now - RATE_WINDOW_SEC
-    bucket = _RATE_BUCKETS.get(key, [])
-    bucket = [t for t in bucket if t >= window_start]
-    if len(bucket) >= RATE_MAX:
-        retry = int(bucket[0] + RATE_WINDOW_SEC - now)
-        from fastapi.responses import PlainTextResponse
-        return PlainTextResponse("Too Many Requests", status_code=429, headers={"Retry-After": str(max(retry, 1))})
-    bucket.append(now)
-    _RATE_BUCKETS[key] = bucket
+    try:
+        allowed, retry = await shared_state.hit(f"{ip}:{request.url.path}", RATE_MAX, RATE_WINDOW_SEC)
+    except Exception as exc:
+        # falha aberta: estado compartilhado indisponível (lock, backend fora) não derruba as rotas
+        logging.warning("Rate limit indisponível, requisição liberada: %s", exc)
+        return await call_next(request)
+    if not allowed:
+        return PlainTextResponse("Too Many Requests", status_code=429, headers={"Retry-After": str(max(int(retry), 1))})
     return await call_next(request)
 
+# --- Métricas (Prometheus) ---
+# O último middleware adicionado é o mais externo. Este vem depois do rate limit
+# e por isso também mede as respostas 429; o rastreamento de consultas e o de
+# alocações, adicionados a seguir, ficam por fora dele. As consultas chegam
+# às métricas e ao rastreamento por um único envoltório (query_hooks).
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+    request_metrics.instrument(prisma, read_pool)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(request_metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+# --- Rastreamento de consultas (N+1 e orçamento por rota, ver @query_budget) ---
+if QUERY_TRACING_ENABLED:
+    app.add_middleware(QueryTraceMiddleware, tracer=query_tracer)
+    query_tracer.instrument(prisma, read_pool)
+
+# --- Profiling sob demanda (somente admin) ---
+app.add_middleware(AllocationMiddleware, tracker=allocation_tracker)
+
+
+@app.post("/api/admin/profile/cpu", dependencies=[Depends(require_admin)])
+async def profile_cpu(
+    seconds: float = 10, interval_ms: float = 10, all_threads: bool = False, format: str = "collapsed"
+):
+    """Amostra as pilhas por `seconds`; `collapsed` serve para flamegraph.pl/speedscope, `json` é um resumo."""
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format deve ser collapsed ou json")
+    try:
+        result = await stack_sampler.profile(seconds, interval_ms, all_threads)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if format == "json":
+        return stack_sampler.summary(result)
+    filename = f"synapse-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.collapsed"
+    return PlainTextResponse(
+        stack_sampler.collapsed(result),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/api/admin/profile/memory", dependencies=[Depends(require_admin)])
+async def profile_memory_status():
+    return {**allocation_tracker.status(), "routes": allocation_tracker.route_growth()}
+
+
+@app.post("/api/admin/profile/memory/start", dependencies=[Depends(require_admin)])
+async def profile_memory_start(frames: int = 10):
+    return allocation_tracker.start(frames)
+
+
+@app.post("/api/admin/profile/memory/stop", dependencies=[Depends(require_admin)])
+async def profile_memory_stop():
+    return allocation_tracker.stop()
+
+
+@app.post("/api/admin/profile/memory/snapshots", dependencies=[Depends(require_admin)])
+async def profile_memory_snapshot(label: str = ""):
+    try:
+        return await asyncio.to_thread(allocation_tracker.snapshot, label)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@app.get("/api/admin/profile/memory/diff", dependencies=[Depends(require_admin)])
+async def profile_memory_diff(base: int, current: Optional[int] = None, group: str = "lineno", limit: int = 25):
+    """Crescimento de `base` até `current` (ou até agora) por linha, arquivo ou traceback."""
+    try:
+        return await asyncio.to_thread(allocation_tracker.diff, base, current, group, limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"Snapshot {exc.args[0]} não encontrado")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+# --- Prontidão (para o balanceador só mandar tráfego depois do aquecimento) ---
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    services = {
+        "database": prisma.is_connected(),
+        "readPool": read_pool.ready,
+        "checkinAnomalies": checkin_anomalies.ready,
+    }
+    ml = ml_loader.status()
+    ready = all(services.values()) and ml["ready"]
+    # fila do ML cheia não tira o worker do balanceamento: o resto do app atende
+    body = {"ready": ready, "services": services, "ml": ml, "mlExecutor": ml_executor.status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 # --- Auditoria ---
 async def audit(db: Prisma, user_id: Optional[str], action: str, details: str):
     try:
@@ -360,61 +528,38 @@ def map_enrollment(record) -> Dict[str, Any]:
     }
 
 
-def _calculate_team_stats_from_sqlite(conn: sqlite3.Connection, team_id: str) -> Dict[str, int]:
-    member_rows = conn.execute("SELECT id FROM usuarios WHERE idEquipe = ?", (team_id,)).fetchall()
-    member_ids = [row["id"] for row in member_rows]
-    member_count = len(member_ids)
-    avg_completion = 0
-    avg_score = 0
-
-    if member_ids:
-        placeholders = ",".join(["?"] * len(member_ids))
-        enrollment_rows = conn.execute(
-            f"SELECT progresso, notaFinal FROM matriculas WHERE idUsuario IN ({placeholders})",
-            tuple(member_ids),
-        ).fetchall()
-        completions = [
-            row["progresso"] if row["progresso"] is not None else 0
-            for row in enrollment_rows
-        ]
-        if completions:
-            avg_completion = round(sum(completions) / len(completions))
-
-        scores = [row["notaFinal"] for row in enrollment_rows if row["notaFinal"] is not None]
-        if scores:
-            avg_score = round(sum(scores) / len(scores))
-
+def map_user_row(row) -> Dict[str, Any]:
     return {
-        "memberCount": member_count,
-        "avgCompletionRate": avg_completion,
-        "avgSimulationScore": avg_score,
+        "id": row["id"],
+        "name": row["nome"],
+        "email": _dec(row["email"]),
+        "cpf": _dec(row["cpf"]),
+        "role": row["cargo"] or "Colaborador",
+        "teamId": row["idEquipe"],
+        "avatarUrl": row["avatarUrl"] or f"https://i.pravatar.cc/150?u={row['id']}",
+        "totalXP": row["totalXp"] or 0,
+        "level": row["nivel"] or 1,
+        "streakDays": row["diasSequencia"] or 0,
+        "coursesAssigned": row["atribuidos"],
+        "coursesCompleted": row["concluidos"],
+        "coursesLate": row["atrasados"],
     }
 
 
-def _load_teams_from_sqlite() -> List[Dict[str, Any]]:
-    if not os.path.exists(_SQLITE_DB_PATH):
-        return []
-
-    conn = sqlite3.connect(_SQLITE_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        rows = conn.execute(
-            "SELECT id, nome, descricao, idGestor FROM equipes"
-        ).fetchall()
-        fallback: List[Dict[str, Any]] = []
-        for row in rows:
-            fallback.append(
-                {
-                    "id": row["id"],
-                    "name": row["nome"],
-                    "area": row["descricao"] or "",
-                    "managerId": row["idGestor"],
-                    "stats": _calculate_team_stats_from_sqlite(conn, row["id"]),
-                }
-            )
-        return fallback
-    finally:
-        conn.close()
+def map_team_row(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["nome"],
+        "area": row["descricao"] or "",  # Legacy: kept for backwards compatibility
+        "areaId": row["idArea"],
+        "areaName": row["areaNome"],
+        "managerId": row["idGestor"],
+        "stats": {
+            "memberCount": row["membros"],
+            "avgCompletionRate": round(row["progressoMedio"]) if row["progressoMedio"] is not None else 0,
+            "avgSimulationScore": round(row["notaMedia"]) if row["notaMedia"] is not None else 0,
+        },
+    }
 
 
 class CoursePayload(BaseModel):
@@ -680,6 +825,7 @@ def _parse_datetime(value: Optional[str], fallback: Optional[datetime] = None) -
 
 
 @app.get("/courses")
+@query_budget(2)
 async def list_courses():
     records = await prisma.materialfonte.find_many(
         include={
@@ -726,6 +872,7 @@ async def create_course(payload: CoursePayload):
         await sync_course_modules(course_id, payload.modules)
 
     record = await fetch_course_record(course_id)
+    await social_impact.record(prisma, "curso", after=record)
     return map_course(record)
 
 
@@ -751,7 +898,9 @@ async def update_course(course_id: str, payload: CourseUpdatePayload):
     if payload.statusProcessamento is not None:
         update_data["statusProcessamento"] = payload.statusProcessamento
 
+    before = None
     if update_data:
+        before = await prisma.materialfonte.find_unique(where={"id": course_id})
         await prisma.materialfonte.update(where={"id": course_id}, data=update_data)
 
     if payload.tags is not None:
@@ -760,6 +909,8 @@ async def update_course(course_id: str, payload: CourseUpdatePayload):
         await sync_course_modules(course_id, payload.modules)
 
     record = await fetch_course_record(course_id)
+    if before is not None:
+        await social_impact.record(prisma, "curso", before=before, after=record)
     return map_course(record)
 
 
@@ -767,16 +918,29 @@ async def update_course(course_id: str, payload: CourseUpdatePayload):
 async def delete_course(course_id: str):
     await fetch_course_record(course_id)
     await prisma.materialfonte.delete(where={"id": course_id})
+    # a exclusão remove matrículas em cascata: recalcula os indicadores
+    await social_impact.reconcile(prisma)
     return {"deleted": True}
 
 
-@app.get("/users")
-async def list_users():
+async def _list_users_prisma() -> List[Dict[str, Any]]:
     records = await prisma.usuario.find_many(include={"matriculas": True})
     ordered = sorted(records, key=lambda record: record.nome or "")
     return [map_user(record) for record in ordered]
 
 
+async def _list_users_sqlite() -> List[Dict[str, Any]]:
+    rows = await read_pool.fetch_all(sqlite_reader.USERS_SQL)
+    return [map_user_row(row) for row in rows]
+
+
+@app.get("/users")
+async def list_users():
+    if read_pool.available:
+        return await _list_users_sqlite()
+    return await _list_users_prisma()
+
+
 @app.post("/users", status_code=201)
 async def create_user(payload: UserPayload):
     user_id = _uuid(payload.id)
@@ -809,12 +973,13 @@ async def create_user(payload: UserPayload):
         where={"id": user_id},
         include={"matriculas": True},
     )
+    await social_impact.record(prisma, "usuario", after=record)
     return map_user(record)
 
 
 @app.put("/users/{user_id}")
 async def update_user(user_id: str, payload: UserUpdatePayload):
-    await ensure_exists(prisma.usuario.find_unique, {"id": user_id}, "Usuário não encontrado")
+    before = await ensure_exists(prisma.usuario.find_unique, {"id": user_id}, "Usuário não encontrado")
     cargo_id = await resolve_cargo_id(payload.role)
     update_data: Dict[str, Any] = {}
 
@@ -850,6 +1015,7 @@ async def update_user(user_id: str, payload: UserUpdatePayload):
         where={"id": user_id},
         include={"matriculas": True},
     )
+    await social_impact.record(prisma, "usuario", before=before, after=record)
     return map_user(record)
 
 
@@ -857,19 +1023,35 @@ async def update_user(user_id: str, payload: UserUpdatePayload):
 async def delete_user(user_id: str):
     await ensure_exists(prisma.usuario.find_unique, {"id": user_id}, "Usuário não encontrado")
     await prisma.usuario.delete(where={"id": user_id})
+    # check-ins, matrículas e sessões caem em cascata: recalcula os indicadores
+    await social_impact.reconcile(prisma)
     return {"deleted": True}
 
 
+async def _list_teams_prisma() -> List[Dict[str, Any]]:
+    records = await prisma.equipe.find_many(
+        include={"usuarios": {"include": {"matriculas": True}}, "area": True},
+    )
+    return [map_team(record) for record in records]
+
+
+async def _list_teams_sqlite() -> List[Dict[str, Any]]:
+    rows = await read_pool.fetch_all(sqlite_reader.TEAMS_SQL)
+    return [map_team_row(row) for row in rows]
+
+
 @app.get("/teams")
+@query_budget(3)
 async def list_teams():
+    if read_pool.available:
+        return await _list_teams_sqlite()
     try:
-        records = await prisma.equipe.find_many(
-            include={"usuarios": {"include": {"matriculas": True}}, "area": True},
-        )
-        return [map_team(record) for record in records]
+        return await _list_teams_prisma()
     except DataError as exc:
         logging.warning("Falling back to SQLite while loading teams: %s", exc)
-        return await asyncio.to_thread(_load_teams_from_sqlite)
+        if not read_pool.ready:
+            return []
+        return await _list_teams_sqlite()
 
 
 @app.get("/api/leaderboard")
@@ -1096,12 +1278,14 @@ async def create_enrollment(payload: EnrollmentPayload):
             "ultimoAcesso": _parse_datetime(payload.lastAccessAt, datetime.utcnow()),
         }
     )
+    await social_impact.record(prisma, "matricula", after=record)
+    course_recommendations.mark_stale(record.idUsuario)
     return map_enrollment(record)
 
 
 @app.put("/enrollments/{enrollment_id}")
 async def update_enrollment(enrollment_id: str, payload: EnrollmentPayload):
-    await ensure_exists(prisma.matricula.find_unique, {"id": enrollment_id}, "Matrícula não encontrada")
+    before = await ensure_exists(prisma.matricula.find_unique, {"id": enrollment_id}, "Matrícula não encontrada")
     data: Dict[str, Any] = {}
     if payload.status is not None:
         data["status"] = payload.status
@@ -1119,6 +1303,7 @@ async def update_enrollment(enrollment_id: str, payload: EnrollmentPayload):
         data["atribuidoEm"] = _parse_datetime(payload.assignedAt)
     if data:
         record = await prisma.matricula.update(where={"id": enrollment_id}, data=data)
+        await social_impact.record(prisma, "matricula", before=before, after=record)
     else:
         record = await prisma.matricula.find_unique(where={"id": enrollment_id})
     return map_enrollment(record)
@@ -1126,8 +1311,10 @@ async def update_enrollment(enrollment_id: str, payload: EnrollmentPayload):
 
 @app.delete("/enrollments/{enrollment_id}")
 async def delete_enrollment(enrollment_id: str):
-    await ensure_exists(prisma.matricula.find_unique, {"id": enrollment_id}, "Matrícula não encontrada")
+    before = await ensure_exists(prisma.matricula.find_unique, {"id": enrollment_id}, "Matrícula não encontrada")
     await prisma.matricula.delete(where={"id": enrollment_id})
+    await social_impact.record(prisma, "matricula", before=before)
+    course_recommendations.mark_stale(before.idUsuario)
     return {"deleted": True}
 
 
@@ -1295,7 +1482,7 @@ async def receive_biofeedback(data: BioData):
 
     user = await prisma.usuario.find_unique(where={"id": data.userId})
     if not user:
-        await prisma.usuario.create(
+        user = await prisma.usuario.create(
             data={
                 "id": data.userId,
                 "nome": "Colaborador IoT",
@@ -1306,10 +1493,11 @@ async def receive_biofeedback(data: BioData):
                 "cargo": "Colaborador",
             }
         )
+        await social_impact.record(prisma, "usuario", after=user)
 
     now = datetime.utcnow()
     checkin_id = str(uuid.uuid4())
-    await prisma.checkinbio.create(
+    checkin = await prisma.checkinbio.create(
         data={
             "id": checkin_id,
             "idUsuario": data.userId,
@@ -1325,6 +1513,13 @@ async def receive_biofeedback(data: BioData):
             "horaDoDia": now.hour,
         }
     )
+    await social_impact.record(prisma, "checkin", after=checkin)
+    await checkin_anomalies.ingest(prisma, data.userId, checkin_id, {
+        "nivelFoco": checkin.nivelFoco,
+        "nivelEstresse": checkin.nivelEstresse,
+        "nivelFadiga": checkin.nivelFadiga,
+        "horasSono": checkin.horasSono,
+    })
 
     await prisma.logauditoria.create(
         data={
@@ -1429,25 +1624,41 @@ async def analytics_r_report():
     return {"report": encoded, "summary": summary_payload}
 
 
+def _window_start(days: Optional[int]) -> Optional[datetime]:
+    """Início da janela `?days=N` das consultas analíticas (None = todo o histórico)."""
+    if days is None:
+        return None
+    if days <= 0:
+        raise HTTPException(status_code=400, detail="days deve ser positivo.")
+    return datetime.utcnow() - timedelta(days=days)
+
+
 @app.get("/api/analytics/overview")
-async def analytics_overview():
-    teams = await prisma.equipe.find_many(include={"usuarios": True})
-    data = []
-    for t in teams:
-        user_ids = [u.id for u in (t.usuarios or [])]
-        if not user_ids:
-            data.append({"teamId": t.id, "teamName": t.nome, "avgStress": 0, "avgFocus": 0})
-            continue
-        checkins = await prisma.checkinbio.find_many(where={"idUsuario": {"in": user_ids}})
-        if not checkins:
-            data.append({"teamId": t.id, "teamName": t.nome, "avgStress": 0, "avgFocus": 0})
-            continue
-        stress_values = [c.nivelEstresse or 0 for c in checkins]
-        focus_values = [c.nivelFoco or 0 for c in checkins]
-        avg_stress = sum(stress_values) / len(stress_values) if stress_values else 0
-        avg_focus = sum(focus_values) / len(focus_values) if focus_values else 0
-        data.append({"teamId": t.id, "teamName": t.nome, "avgStress": avg_stress, "avgFocus": avg_focus})
-    return {"teams": data}
+@query_budget(2)
+async def analytics_overview(days: Optional[int] = None):
+    since = _window_start(days)
+    rows = await predictive_lab.team_metrics(prisma, since)
+    data = [
+        {
+            "teamId": row["teamId"],
+            "teamName": row["teamName"],
+            "avgStress": float(row["nivelEstresse"] or 0) if row["checkins"] else 0,
+            "avgFocus": float(row["nivelFoco"] or 0) if row["checkins"] else 0,
+        }
+        for row in rows
+    ]
+    return {"teams": data, "windowDays": days}
+
+
+@app.get("/api/analytics/social-impact")
+async def analytics_social_impact():
+    return await build_social_impact(prisma)
+
+
+@app.get("/api/analytics/social-impact/history")
+async def analytics_social_impact_history(days: Optional[int] = 30):
+    history = await social_impact.history(prisma, _window_start(days))
+    return {"history": history, "windowDays": days}
 
 
 # --- SESSÕES DE APRENDIZADO ---
@@ -1466,6 +1677,7 @@ async def create_session(payload: SessionPayload):
             "iniciadoEm": now,
         }
     )
+    await social_impact.record(prisma, "sessao", after=session)
 
     await audit(prisma, payload.userId, "SESSION_START", f"Sessão {session_id} iniciada")
 
@@ -1525,32 +1737,120 @@ async def get_user_sessions(user_id: str, limit: int = 50):
 
 # --- INTERAÇÕES ---
 
+INTERACTIONS_BATCH_MAX = int(os.getenv("INTERACTIONS_BATCH_MAX", "5000"))
+
+
+def _interaction_row(payload: InteractionPayload, interaction_id: str, created_at: datetime) -> Dict[str, Any]:
+    return {
+        "id": interaction_id,
+        "idUsuario": payload.userId,
+        "idSessao": payload.sessionId,
+        "idAtividade": payload.activityId,
+        "estaCorreto": payload.isCorrect,
+        "tempoRespostaMs": payload.responseTimeMs,
+        "tentativas": payload.attempts,
+        "criadoEm": created_at,
+    }
+
+
+def map_interaction_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "userId": row["idUsuario"],
+        "sessionId": row.get("idSessao"),
+        "activityId": row["idAtividade"],
+        "isCorrect": row.get("estaCorreto"),
+        "responseTimeMs": row["tempoRespostaMs"],
+        "attempts": row.get("tentativas"),
+        "createdAt": _iso(row.get("criadoEm")),
+    }
+
+
+def _parse_interaction_items(raw_body: bytes, content_type: str) -> List[InteractionPayload]:
+    items: List[Any]
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line_no, line in enumerate(raw_body.decode("utf-8").splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail=f"Linha {line_no} não é um JSON válido")
+    else:
+        try:
+            data = json.loads(raw_body or b"[]")
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Corpo inválido: envie um array JSON ou NDJSON")
+        items = data.get("interactions", []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Corpo inválido: envie um array JSON ou NDJSON")
+
+    if len(items) > INTERACTIONS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Lote excede o limite de {INTERACTIONS_BATCH_MAX} interações")
+
+    payloads: List[InteractionPayload] = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            payloads.append(InteractionPayload.parse_obj(item))
+        except ValidationError as exc:
+            errors.append({"index": index, "errors": exc.errors()})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    return payloads
+
+
 @app.post("/api/interactions")
 async def create_interaction(payload: InteractionPayload):
-    interaction_id = _uuid(payload.id)
+    row = _interaction_row(payload, _uuid(payload.id), datetime.utcnow())
+    await interaction_writer.submit(prisma, [row])
+    return map_interaction_row(row)
 
-    interaction = await prisma.interacao.create(
-        data={
-            "id": interaction_id,
-            "idUsuario": payload.userId,
-            "idSessao": payload.sessionId,
-            "idAtividade": payload.activityId,
-            "estaCorreto": payload.isCorrect,
-            "tempoRespostaMs": payload.responseTimeMs,
-            "tentativas": payload.attempts,
+
+@app.post("/api/interactions/batch")
+async def create_interactions_batch(request: Request):
+    """
+    Ingestão em lote de interações (array JSON ou NDJSON).
+
+    Com o header `Idempotency-Key`, retries devolvem a mesma resposta e
+    interações sem `id` recebem ids determinísticos derivados da chave, de
+    modo que um retry após falha parcial nunca duplica linhas.
+    """
+    payloads = _parse_interaction_items(await request.body(), request.headers.get("content-type", ""))
+    idempotency_key = request.headers.get("idempotency-key")
+
+    async def ingest() -> Dict[str, Any]:
+        now = datetime.utcnow()
+        rows = []
+        for index, item in enumerate(payloads):
+            if item.id:
+                interaction_id = item.id
+            elif idempotency_key:
+                interaction_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"interactions:{idempotency_key}:{index}"))
+            else:
+                interaction_id = _uuid()
+            rows.append(_interaction_row(item, interaction_id, now))
+
+        unique_rows: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            unique_rows.setdefault(row["id"], row)
+        existing = await prisma.interacao.find_many(where={"id": {"in": list(unique_rows)}})
+        duplicates = {record.id for record in existing}
+        fresh = [row for row_id, row in unique_rows.items() if row_id not in duplicates]
+
+        await interaction_writer.submit(prisma, fresh)
+        return {
+            "received": len(rows),
+            "inserted": len(fresh),
+            "duplicates": sorted(duplicates),
+            "ids": [row["id"] for row in rows],
         }
-    )
 
-    return {
-        "id": interaction.id,
-        "userId": interaction.idUsuario,
-        "sessionId": interaction.idSessao,
-        "activityId": interaction.idAtividade,
-        "isCorrect": interaction.estaCorreto,
-        "responseTimeMs": interaction.tempoRespostaMs,
-        "attempts": interaction.tentativas,
-        "createdAt": _iso(interaction.criadoEm),
-    }
+    response, replayed = await idempotency_store.run_once(prisma, idempotency_key, "interactions.batch", ingest)
+    if replayed:
+        return JSONResponse(response, headers={"Idempotent-Replay": "true"})
+    return response
 
 
 @app.get("/api/activities/{activity_id}/interactions")
@@ -1582,6 +1882,29 @@ async def get_activity_interactions(activity_id: str, user_id: Optional[str] = N
     }
 
 
+@app.get("/api/activities/{activity_id}/stats")
+async def get_activity_stats(activity_id: str):
+    stats = await activity_stats.get(prisma, activity_id)
+    return public_activity_stats(stats)
+
+
+@app.get("/api/courses/{course_id}/activity-stats")
+async def get_course_activity_stats(course_id: str):
+    activities = await prisma.atividadeaprendizado.find_many(
+        where={"idMaterialFonte": course_id},
+        order={"ordem": "asc"},
+    )
+    if not activities:
+        await fetch_course_record(course_id)
+    stats = await activity_stats.get_many(prisma, [activity.id for activity in activities])
+    ordered = [stats[activity.id] for activity in activities]
+    return {
+        "courseId": course_id,
+        "summary": public_activity_stats(activity_stats.summarize(ordered)),
+        "activities": [public_activity_stats(item) for item in ordered],
+    }
+
+
 # --- SPACED REPETITION ---
 
 @app.get("/api/users/{user_id}/reviews")
@@ -1693,6 +2016,7 @@ async def update_review(review_id: str, payload: ReviewPayload):
 
 
 @app.get("/api/dashboard/collaborator/{user_id}")
+@query_budget(10)
 async def dashboard_collaborator(user_id: str):
     '''
     Retorna dados agregados para o dashboard do colaborador
@@ -1794,23 +2118,28 @@ async def dashboard_collaborator(user_id: str):
             ranking["xpDoLider"] = team_users[0].totalXp or 0
 
     # Último check-in bio
-    all_checkins_user = await prisma.checkinbio.find_many(
-        where={"idUsuario": user_id}
-    )
-    # Sort by date descending and get first
-    ultimo_checkin = None
-    if all_checkins_user:
-        sorted_checkins = sorted(all_checkins_user, key=lambda c: c.dataHora if c.dataHora else datetime.min, reverse=True)
-        ultimo_checkin = sorted_checkins[0] if sorted_checkins else None
+    ultimo_checkin: Optional[Dict[str, Any]] = None
+    if read_pool.available:
+        row = await read_pool.fetch_one(sqlite_reader.LATEST_USER_CHECKIN_SQL, (user_id,))
+        if row:
+            ultimo_checkin = {**dict(row), "dataHora": sqlite_datetime(row["dataHora"])}
+    else:
+        all_checkins_user = await prisma.checkinbio.find_many(
+            where={"idUsuario": user_id}
+        )
+        # Sort by date descending and get first
+        if all_checkins_user:
+            sorted_checkins = sorted(all_checkins_user, key=lambda c: c.dataHora if c.dataHora else datetime.min, reverse=True)
+            ultimo_checkin = sorted_checkins[0].dict()
 
     checkin_bio = None
     if ultimo_checkin:
         checkin_bio = {
-            "nivelFoco": ultimo_checkin.nivelFoco or 0,
-            "nivelEstresse": ultimo_checkin.nivelEstresse or 0,
-            "horasSono": ultimo_checkin.horasSono or 0,
-            "qualidadeSono": ultimo_checkin.qualidadeSono or 0,
-            "dataHora": _iso(ultimo_checkin.dataHora)
+            "nivelFoco": ultimo_checkin["nivelFoco"] or 0,
+            "nivelEstresse": ultimo_checkin["nivelEstresse"] or 0,
+            "horasSono": ultimo_checkin["horasSono"] or 0,
+            "qualidadeSono": ultimo_checkin["qualidadeSono"] or 0,
+            "dataHora": _iso(ultimo_checkin["dataHora"])
         }
 
     # Cursos ativos (em andamento ou atrasados)
@@ -1832,23 +2161,43 @@ async def dashboard_collaborator(user_id: str):
     # Ordenar: atrasados primeiro, depois por progresso decrescente
     cursos_ativos.sort(key=lambda x: (x["status"] != "ATRASADO", -x["progresso"]))
 
-    # Cursos recomendados (cursos que o usuário não está matriculado)
-    cursos_matriculados_ids = [m.idCurso for m in matriculas]
-    cursos_recomendados = await prisma.materialfonte.find_many(
-        where={"id": {"notIn": cursos_matriculados_ids}} if cursos_matriculados_ids else {},
-        take=6
-    )
+    # Cursos recomendados: top-N pré-calculado (uma leitura pela PK)
+    if read_pool.available:
+        recomendados = [dict(row) for row in await read_pool.fetch_all(USER_RECOMMENDATIONS_SQL, (user_id,))]
+    else:
+        recomendados = await course_recommendations.for_user(prisma, user_id)
+
+    cursos_rec_list = [
+        {
+            "id": c["id"],
+            "titulo": c["titulo"],
+            "descricao": c["descricao"],
+            "categoria": c["categoria"],
+            "thumbnailUrl": c["thumbnailUrl"],
+            "tipoCurso": c["tipoCurso"],
+            "score": c["score"],
+        }
+        for c in recomendados
+    ]
 
-    cursos_rec_list = []
-    for c in cursos_recomendados:
-        cursos_rec_list.append({
-            "id": c.id,
-            "titulo": c.titulo,
-            "descricao": c.descricao,
-            "categoria": c.categoria,
-            "thumbnailUrl": c.thumbnailUrl,
-            "tipoCurso": c.tipoCurso
-        })
+    if not cursos_rec_list:
+        # ainda não calculado para este usuário: agenda e responde como antes
+        course_recommendations.mark_stale(user_id)
+        cursos_matriculados_ids = [m.idCurso for m in matriculas]
+        cursos_recomendados = await prisma.materialfonte.find_many(
+            where={"id": {"notIn": cursos_matriculados_ids}} if cursos_matriculados_ids else {},
+            take=6
+        )
+        for c in cursos_recomendados:
+            cursos_rec_list.append({
+                "id": c.id,
+                "titulo": c.titulo,
+                "descricao": c.descricao,
+                "categoria": c.categoria,
+                "thumbnailUrl": c.thumbnailUrl,
+                "tipoCurso": c.tipoCurso,
+                "score": None
+            })
 
     return {
         "stats": stats,
@@ -1860,7 +2209,8 @@ async def dashboard_collaborator(user_id: str):
 
 
 @app.get("/api/dashboard/manager")
-async def dashboard_manager():
+@query_budget(25)
+async def dashboard_manager(days: Optional[int] = None):
     '''
     Retorna dados agregados para o dashboard do gestor
     '''
@@ -1902,11 +2252,15 @@ async def dashboard_manager():
 
     # Distribuição de status
     status_counts = {}
-    all_matriculas = await prisma.matricula.find_many()
+    if read_pool.available:
+        for row in await read_pool.fetch_all(sqlite_reader.ENROLLMENT_STATUS_COUNTS_SQL):
+            status_counts[row["status"]] = row["total"]
+    else:
+        all_matriculas = await prisma.matricula.find_many()
 
-    for m in all_matriculas:
-        status = m.status or "NAO_INICIADO"
-        status_counts[status] = status_counts.get(status, 0) + 1
+        for m in all_matriculas:
+            status = m.status or "NAO_INICIADO"
+            status_counts[status] = status_counts.get(status, 0) + 1
 
     distribuicao_status = {
         "NAO_INICIADO": status_counts.get("NAO_INICIADO", 0),
@@ -1985,10 +2339,34 @@ async def dashboard_manager():
             "notaFinal": m.notaFinal
         })
 
+    # 4. Anomalias de bem-estar detectadas na ingestão dos check-ins
+    desde_ms = int((datetime.utcnow() - timedelta(days=7) - datetime(1970, 1, 1)).total_seconds() * 1000)
+    if read_pool.available:
+        anomalias_rows = [dict(row) for row in await read_pool.fetch_all(OPEN_ALERTS_SQL, (desde_ms, 10))]
+    else:
+        anomalias_rows = await checkin_anomalies.open_alerts(prisma, desde_ms, 10)
+    anomalias_bem_estar = [
+        {
+            "id": row["id"],
+            "idUsuario": row["idUsuario"],
+            "nomeUsuario": row["nomeUsuario"],
+            "avatarUrl": row["avatarUrl"],
+            "metrica": row["metrica"],
+            "valor": row["valor"],
+            "media": round(row["media"], 1),
+            "zScore": round(row["zScore"], 2),
+            "tipo": row["tipo"],
+            "direcao": row["direcao"],
+            "dataHora": _iso(sqlite_datetime(row["criadoEm"])),
+        }
+        for row in anomalias_rows
+    ]
+
     alertas = {
         "atrasados": colaboradores_atrasados,
         "prazosProximos": prazos_proximos,
-        "reprovados": reprovados_list
+        "reprovados": reprovados_list,
+        "anomaliasBemEstar": anomalias_bem_estar,
     }
 
     # Performance: Top 5 e Bottom 5
@@ -2022,31 +2400,36 @@ async def dashboard_manager():
     }
 
     # Bem-estar da equipe (última leitura de cada colaborador)
-    all_checkins_raw = await prisma.checkinbio.find_many(
-        include={"usuario": True}
-    )
-    # Sort by date descending
-    all_checkins = sorted(all_checkins_raw, key=lambda c: c.dataHora if c.dataHora else datetime.min, reverse=True)
-
-    # Filtrar último checkin de cada colaborador
-    user_latest_checkin = {}
-    for cb in all_checkins:
-        if cb.usuario and cb.usuario.papel == "COLABORADOR":
-            user_id = cb.usuario.id
-            if user_id not in user_latest_checkin:
-                user_latest_checkin[user_id] = cb
-
-    checkins_recentes = list(user_latest_checkin.values())
-
-    foco_medio = 0
-    stress_medio = 0
-    if len(checkins_recentes) > 0:
-        foco_medio = int(
-            sum(c.nivelFoco or 0 for c in checkins_recentes) / len(checkins_recentes)
-        )
-        stress_medio = int(
-            sum(c.nivelEstresse or 0 for c in checkins_recentes) / len(checkins_recentes)
+    if read_pool.available:
+        row = await read_pool.fetch_one(sqlite_reader.LATEST_COLLABORATOR_CHECKINS_SQL)
+        foco_medio = int(row["focoMedio"] or 0) if row and row["total"] else 0
+        stress_medio = int(row["stressMedio"] or 0) if row and row["total"] else 0
+    else:
+        all_checkins_raw = await prisma.checkinbio.find_many(
+            include={"usuario": True}
         )
+        # Sort by date descending
+        all_checkins = sorted(all_checkins_raw, key=lambda c: c.dataHora if c.dataHora else datetime.min, reverse=True)
+
+        # Filtrar último checkin de cada colaborador
+        user_latest_checkin = {}
+        for cb in all_checkins:
+            if cb.usuario and cb.usuario.papel == "COLABORADOR":
+                user_id = cb.usuario.id
+                if user_id not in user_latest_checkin:
+                    user_latest_checkin[user_id] = cb
+
+        checkins_recentes = list(user_latest_checkin.values())
+
+        foco_medio = 0
+        stress_medio = 0
+        if len(checkins_recentes) > 0:
+            foco_medio = int(
+                sum(c.nivelFoco or 0 for c in checkins_recentes) / len(checkins_recentes)
+            )
+            stress_medio = int(
+                sum(c.nivelEstresse or 0 for c in checkins_recentes) / len(checkins_recentes)
+            )
 
     bem_estar = {
         "focoMedio": foco_medio,
@@ -2054,41 +2437,53 @@ async def dashboard_manager():
     }
 
     # Comparativo de equipes
-    equipes = await prisma.equipe.find_many(
-        include={"usuarios": {"include": {"matriculas": True}}}
-    )
+    if read_pool.available:
+        equipes_stats = [
+            {
+                "nome": row["nome"],
+                "totalColaboradores": row["totalColaboradores"],
+                "taxaConclusao": int((row["concluidas"] / row["totalMatriculas"]) * 100) if row["totalMatriculas"] > 0 else 0,
+                "cursosAtrasados": row["atrasadas"],
+                "xpMedio": int(row["xpMedio"]),
+            }
+            for row in await read_pool.fetch_all(sqlite_reader.TEAM_COMPARISON_SQL)
+        ]
+    else:
+        equipes = await prisma.equipe.find_many(
+            include={"usuarios": {"include": {"matriculas": True}}}
+        )
 
-    equipes_stats = []
-    for e in equipes:
-        usuarios_equipe = e.usuarios or []
-        total_colab = len(usuarios_equipe)
+        equipes_stats = []
+        for e in equipes:
+            usuarios_equipe = e.usuarios or []
+            total_colab = len(usuarios_equipe)
 
-        if total_colab == 0:
-            continue
+            if total_colab == 0:
+                continue
 
-        xp_medio = sum(u.totalXp or 0 for u in usuarios_equipe) / total_colab
+            xp_medio = sum(u.totalXp or 0 for u in usuarios_equipe) / total_colab
 
-        # Calcular taxa de conclusão da equipe
-        total_mat = sum(len(u.matriculas or []) for u in usuarios_equipe)
-        concluidas_mat = sum(
-            len([m for m in (u.matriculas or []) if m.status == "CONCLUIDO"])
-            for u in usuarios_equipe
-        )
-        taxa_equipe = int((concluidas_mat / total_mat) * 100) if total_mat > 0 else 0
+            # Calcular taxa de conclusão da equipe
+            total_mat = sum(len(u.matriculas or []) for u in usuarios_equipe)
+            concluidas_mat = sum(
+                len([m for m in (u.matriculas or []) if m.status == "CONCLUIDO"])
+                for u in usuarios_equipe
+            )
+            taxa_equipe = int((concluidas_mat / total_mat) * 100) if total_mat > 0 else 0
 
-        # Cursos atrasados da equipe
-        atrasados_equipe = sum(
-            len([m for m in (u.matriculas or []) if m.status == "ATRASADO"])
-            for u in usuarios_equipe
-        )
+            # Cursos atrasados da equipe
+            atrasados_equipe = sum(
+                len([m for m in (u.matriculas or []) if m.status == "ATRASADO"])
+                for u in usuarios_equipe
+            )
 
-        equipes_stats.append({
-            "nome": e.nome,
-            "totalColaboradores": total_colab,
-            "taxaConclusao": taxa_equipe,
-            "cursosAtrasados": atrasados_equipe,
-            "xpMedio": int(xp_medio)
-        })
+            equipes_stats.append({
+                "nome": e.nome,
+                "totalColaboradores": total_colab,
+                "taxaConclusao": taxa_equipe,
+                "cursosAtrasados": atrasados_equipe,
+                "xpMedio": int(xp_medio)
+            })
 
     # Timeline de atividades recentes (logs de auditoria)
     logs_todos = await prisma.logauditoria.find_many(
@@ -2106,7 +2501,7 @@ async def dashboard_manager():
             "usuarioNome": log.usuario.nome if log.usuario else "Sistema"
         })
 
-    neuro_predictor = await predictive_lab.organization_snapshot(prisma)
+    neuro_predictor = await predictive_lab.organization_snapshot(prisma, _window_start(days))
     social_impact = await build_social_impact(prisma)
 
     return {
@@ -2123,6 +2518,13 @@ async def dashboard_manager():
 
 
 
+@app.post("/api/dashboard/manager/wellbeing-alerts/{alert_id}/resolve")
+async def resolve_wellbeing_alert(alert_id: int):
+    if not await checkin_anomalies.resolve(prisma, alert_id):
+        raise HTTPException(status_code=404, detail="Alerta não encontrado")
+    return {"id": alert_id, "resolvido": True}
+
+
 class CheckInPayload(BaseModel):
     userId: str
     horasSono: Optional[float] = None
@@ -2143,7 +2545,7 @@ async def create_checkin(payload: CheckInPayload):
     dia_da_semana = now.weekday()
     hora_do_dia = now.hour
 
-    await prisma.checkinbio.create(
+    checkin = await prisma.checkinbio.create(
         data={
             "id": checkin_id,
             "idUsuario": payload.userId,
@@ -2159,6 +2561,13 @@ async def create_checkin(payload: CheckInPayload):
             "horaDoDia": hora_do_dia
         }
     )
+    await social_impact.record(prisma, "checkin", after=checkin)
+    await checkin_anomalies.ingest(prisma, payload.userId, checkin_id, {
+        "nivelFoco": payload.nivelFoco,
+        "nivelEstresse": payload.nivelEstresse,
+        "nivelFadiga": payload.nivelFadiga,
+        "horasSono": payload.horasSono,
+    })
 
     return {"id": checkin_id}
 
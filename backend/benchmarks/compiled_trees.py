@@ -0,0 +1,146 @@
+"""
+Paridade e latência dos ensembles compilados x modelos originais.
+
+Para cada pickle da versão ativa (ou de --model-dir), compila o modelo,
+compara as saídas em linhas sintéticas que cobrem os dois lados dos splits e
+mede a latência por linha (uma linha por chamada) e em lote. Em produção
+lotes acima de ML_COMPILED_BATCH_ROWS usam o modelo original.
+
+Uso (na raiz do repositório):
+  python -m backend.benchmarks.compiled_trees
+  python -m backend.benchmarks.compiled_trees --rows 2000 --repeat 200
+  python -m backend.benchmarks.compiled_trees --model-dir backend/ml/models
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+import numpy as np
+
+from backend.ml.artifacts import ArtifactStore
+from backend.ml.inference.compiled_trees import TreeEnsemble, compile_model
+from backend.ml.inference.model_registry import ML_MODEL_DIR
+
+# arquivo -> método comparado
+ARTIFACTS = {
+    "burnout_model.pkl": "predict",
+    "performance_model.pkl": "predict",
+    "churn_model.pkl": "predict_proba",
+    "grade_model.pkl": "predict",
+    "anomaly_model.pkl": "score_samples",
+}
+
+# XGBoost acumula em float32
+RTOL = 1e-5
+ATOL = 1e-4
+
+
+def _inputs(trees: TreeEnsemble, n_features: int, rows: int, seed: int) -> np.ndarray:
+    """Linhas uniformes no intervalo dos thresholds de cada feature (±10%)."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, n_features))
+    for feature in range(n_features):
+        thresholds = trees.threshold[trees.feature == feature]
+        if len(thresholds):
+            low, high = thresholds.min(), thresholds.max()
+            margin = max(abs(high - low) * 0.1, 1e-3)
+            X[:, feature] = rng.uniform(low - margin, high + margin, size=rows)
+    return X
+
+
+def _per_row_us(fn: Callable[[np.ndarray], Any], X: np.ndarray, repeat: int) -> List[float]:
+    fn(X[:1])  # aquecimento
+    samples = []
+    for i in range(repeat):
+        row = X[i % len(X): i % len(X) + 1]
+        start = time.perf_counter()
+        fn(row)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _batch_us(fn: Callable[[np.ndarray], Any], X: np.ndarray) -> float:
+    fn(X)
+    start = time.perf_counter()
+    fn(X)
+    return (time.perf_counter() - start) * 1e6 / len(X)
+
+
+def _p(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def check(model_dir: str, rows: int, repeat: int, seed: int = 42) -> Dict[str, Dict[str, Any]]:
+    """Roda paridade + latência; retorna o resultado por artefato."""
+    results: Dict[str, Dict[str, Any]] = {}
+    for filename, method in ARTIFACTS.items():
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            continue
+        original = joblib.load(path)["model"]
+        if original is None:
+            continue
+        compiled = compile_model(original)
+        # mede o avaliador compilado em si, sem o desvio de lotes para o original
+        compiled.original = None
+        n_features = int(getattr(original, "n_features_in_", 0) or compiled.trees.feature.max() + 1)
+        X = _inputs(compiled.trees, n_features, rows, seed)
+
+        expected = np.asarray(getattr(original, method)(X), dtype=np.float64)
+        actual = np.asarray(getattr(compiled, method)(X), dtype=np.float64)
+        max_diff = float(np.max(np.abs(expected - actual)))
+        single_orig = _per_row_us(getattr(original, method), X, repeat)
+        single_comp = _per_row_us(getattr(compiled, method), X, repeat)
+        results[filename] = {
+            "model": type(original).__name__,
+            "trees": compiled.trees.n_trees,
+            "nodes": compiled.trees.n_nodes,
+            "parity": bool(np.allclose(expected, actual, rtol=RTOL, atol=ATOL)),
+            "maxAbsDiff": max_diff,
+            "rowOriginalP50": statistics.median(single_orig),
+            "rowCompiledP50": statistics.median(single_comp),
+            "rowCompiledP95": _p(single_comp, 0.95),
+            "batchOriginal": _batch_us(getattr(original, method), X),
+            "batchCompiled": _batch_us(getattr(compiled, method), X),
+        }
+    return results
+
+
+def _default_model_dir() -> str:
+    store = ArtifactStore()
+    version = store.current()
+    return store.path(version) if version else ML_MODEL_DIR
+
+
+def main(model_dir: Optional[str], rows: int, repeat: int) -> int:
+    model_dir = model_dir or _default_model_dir()
+    results = check(model_dir, rows, repeat)
+    if not results:
+        print(f"Nenhum artefato de árvores em {model_dir}")
+        return 1
+    print(f"Artefatos: {model_dir} | {rows} linhas | {repeat} chamadas de 1 linha")
+    print(
+        f"{'artefato':24} {'modelo':24} {'paridade':>9} {'dif máx':>10} "
+        f"{'1 linha orig µs':>16} {'1 linha comp µs':>16} {'lote orig µs/l':>15} {'lote comp µs/l':>15}"
+    )
+    for filename, info in results.items():
+        print(
+            f"{filename:24} {info['model']:24} {'ok' if info['parity'] else 'FALHOU':>9} {info['maxAbsDiff']:10.2e} "
+            f"{info['rowOriginalP50']:16.1f} {info['rowCompiledP50']:16.1f} "
+            f"{info['batchOriginal']:15.2f} {info['batchCompiled']:15.2f}"
+        )
+    return 0 if all(info["parity"] for info in results.values()) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=None, help="diretório dos pickles (padrão: versão ativa)")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(main(args.model_dir, args.rows, args.repeat))
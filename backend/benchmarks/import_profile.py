@@ -0,0 +1,128 @@
+"""
+Perfil do tempo de import (cold start) da aplicação por ML_STARTUP_MODE.
+
+Para cada modo, roda um interpretador novo com `python -X importtime`
+importando o módulo alvo (padrão: backend.app) e reporta o tempo total até o
+app existir, a memória residente nesse ponto e os pacotes/módulos que mais
+pesaram (tempo próprio somado por pacote de topo e cumulativo por módulo).
+
+Uso (na raiz do repositório):
+  python -m backend.benchmarks.import_profile
+  python -m backend.benchmarks.import_profile --modes eager,background --top 15
+  python -m backend.benchmarks.import_profile --module backend.ml.inference.ml_endpoints --modes eager
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend.services.ml_loader import ML_STARTUP_MODES
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+# roda no processo filho: importa o alvo e imprime tempo e memória como JSON
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mib = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    rss_mib = None
+print(json.dumps({{"seconds": seconds, "rssMiB": rss_mib, "modules": len(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Linhas `import time: self | cumulative | nome` (microssegundos) do `-X importtime`."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            entries.append({
+                "module": match.group(4),
+                "selfUs": int(match.group(1)),
+                "cumulativeUs": int(match.group(2)),
+                "depth": len(match.group(3)) // 2,
+            })
+    return entries
+
+
+def profile_mode(module: str, mode: str, top: int) -> Dict[str, Any]:
+    env = {**os.environ, "ML_STARTUP_MODE": mode, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module)],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        return {"mode": mode, "error": tail[0]}
+    entries = parse_importtime(proc.stderr)
+    packages: Counter = Counter()
+    for entry in entries:
+        packages[entry["module"].split(".", 1)[0]] += entry["selfUs"]
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "mode": mode,
+        "importSeconds": round(result["seconds"], 3),
+        "rssMiB": round(result["rssMiB"], 1) if result["rssMiB"] is not None else None,
+        "modulesLoaded": result["modules"],
+        "topPackages": [
+            {"package": name, "selfMs": round(us / 1000, 1)} for name, us in packages.most_common(top)
+        ],
+        "topModules": [
+            {"module": entry["module"], "cumulativeMs": round(entry["cumulativeUs"] / 1000, 1)}
+            for entry in sorted(entries, key=lambda item: -item["cumulativeUs"])[:top]
+        ],
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    if "error" in report:
+        print(f"\n[{report['mode']}] falhou: {report['error']}")
+        return
+    rss = f"{report['rssMiB']:.1f} MiB" if report["rssMiB"] is not None else "n/d"
+    print(f"\n[{report['mode']}] import {report['importSeconds']:.3f}s | RSS {rss} | "
+          f"{report['modulesLoaded']} módulos")
+    print(f"  {'pacote':28} {'próprio ms':>11}")
+    for item in report["topPackages"]:
+        print(f"  {item['package']:28} {item['selfMs']:11.1f}")
+    print(f"  {'módulo':48} {'cumulativo ms':>14}")
+    for item in report["topModules"]:
+        print(f"  {item['module'][:48]:48} {item['cumulativeMs']:14.1f}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="backend.app", help="módulo importado no processo filho")
+    parser.add_argument("--modes", default="eager,background", help=f"modos: {','.join(ML_STARTUP_MODES)}")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", default=None, help="grava o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in ML_STARTUP_MODES]
+    if unknown:
+        print(f"Modos desconhecidos: {unknown} (disponíveis: {list(ML_STARTUP_MODES)})")
+        return 2
+
+    reports = [profile_mode(args.module, mode, args.top) for mode in modes]
+    for report in reports:
+        _print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"module": args.module, "reports": reports}, handle, ensure_ascii=False, indent=2)
+        print(f"\nRelatório salvo em {args.output}")
+    return 0 if all("error" not in report for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
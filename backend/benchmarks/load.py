@@ -0,0 +1,307 @@
+"""
+Teste de carga ponta a ponta da API sobre um tenant sintético.
+
+Gera (ou reaproveita) o banco do tamanho pedido, sobe a aplicação FastAPI em
+processo (httpx + ASGITransport, com os eventos de startup/shutdown) e roda
+cada cenário com N requisições e C clientes concorrentes. Reporta latência
+p50/p95/p99, vazão e consultas ao banco por requisição (operações Prisma +
+leituras do pool SQLite). O resultado vai para um JSON com o commit atual,
+para comparar execuções entre commits (`--compare`).
+
+Uso (na raiz do repositório):
+  python -m backend.benchmarks.load --size 1k
+  python -m backend.benchmarks.load --size 10k --requests 500 --concurrency 20
+  python -m backend.benchmarks.load --scenarios catalog,iot-ingest --compare data/benchmarks/results/antes.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.benchmarks.synthetic_data import SIZES, ensure_tenant, parse_size
+from backend.services.query_hooks import QueryEvent, query_hooks
+
+RESULTS_DIR = "data/benchmarks/results"
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]  # (método, caminho, corpo JSON)
+
+
+@dataclass
+class TenantContext:
+    """Ids reais do tenant usados para montar as requisições."""
+    users: List[str]
+    quiz_activities: List[str]
+
+    @classmethod
+    def load(cls, path: str, limit: int = 5000) -> "TenantContext":
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            users = [row[0] for row in conn.execute(
+                "SELECT id FROM usuarios WHERE papel = 'COLABORADOR' LIMIT ?", (limit,))]
+            activities = [row[0] for row in conn.execute(
+                "SELECT id FROM atividades_aprendizado WHERE tipo IN ('QUIZ', 'SIMULADO') LIMIT ?", (limit,))]
+        finally:
+            conn.close()
+        return cls(users, activities)
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    build: Callable[[TenantContext, random.Random], Request]
+
+
+SCENARIOS: Dict[str, Scenario] = {scenario.name: scenario for scenario in (
+    Scenario("catalog", "GET /courses (catálogo com atividades e tags)",
+             lambda ctx, rng: ("GET", "/courses", None)),
+    Scenario("dashboard-manager", "GET /api/dashboard/manager",
+             lambda ctx, rng: ("GET", "/api/dashboard/manager", None)),
+    Scenario("dashboard-collaborator", "GET /api/dashboard/collaborator/{id}",
+             lambda ctx, rng: ("GET", f"/api/dashboard/collaborator/{rng.choice(ctx.users)}", None)),
+    Scenario("iot-ingest", "POST /api/iot/checkin (biofeedback do sensor)",
+             lambda ctx, rng: ("POST", "/api/iot/checkin", {
+                 "userId": rng.choice(ctx.users),
+                 "bpm": rng.randint(55, 130),
+                 "gsr": rng.randint(1, 10),
+                 "movement": rng.randint(0, 100),
+             })),
+    Scenario("quiz-answer", "POST /api/interactions (resposta de quiz)",
+             lambda ctx, rng: ("POST", "/api/interactions", {
+                 "userId": rng.choice(ctx.users),
+                 "activityId": rng.choice(ctx.quiz_activities),
+                 "isCorrect": rng.random() < 0.7,
+                 "responseTimeMs": rng.randint(800, 60_000),
+                 "attempts": rng.randint(1, 3),
+             })),
+)}
+
+
+class QueryCounter:
+    """Conta as consultas feitas dentro de cada requisição (contexto da task)."""
+
+    def __init__(self) -> None:
+        self._current: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+            "bench_queries", default=None
+        )
+
+    def _on_query(self, event: QueryEvent) -> None:
+        box = self._current.get()
+        if box is not None:
+            box[0] += 1
+
+    def install(self, prisma: Any, read_pool: Any) -> bool:
+        """Conta as consultas do cliente Prisma e do pool de leitura; False se o Prisma não expõe `_execute`."""
+        counted = query_hooks.install(prisma, read_pool)
+        query_hooks.subscribe(self._on_query)
+        return counted
+
+    def start(self) -> List[int]:
+        box = [0]
+        self._current.set(box)
+        return box
+
+
+def _percentile(ordered: Sequence[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_scenario(
+    client: Any,
+    scenario: Scenario,
+    ctx: TenantContext,
+    counter: QueryCounter,
+    requests: int,
+    concurrency: int,
+    seed: int,
+    warmup: int = 5,
+) -> Dict[str, Any]:
+    rng = random.Random(f"{seed}:{scenario.name}")
+    planned = [scenario.build(ctx, rng) for _ in range(warmup + requests)]
+    for method, path, body in planned[:warmup]:
+        await client.request(method, path, json=body)
+
+    latencies: List[float] = []
+    queries: List[int] = []
+    statuses: Dict[str, int] = {}
+    queue = iter(planned[warmup:])
+
+    async def worker() -> None:
+        for method, path, body in queue:
+            box = counter.start()
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(box[0])
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    # cada worker roda na própria task (contexto próprio para o contador)
+    await asyncio.gather(*(asyncio.create_task(worker()) for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "description": scenario.description,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "status": statuses,
+        "latencyMs": {
+            "mean": round(statistics.fmean(ordered), 3),
+            "p50": round(_percentile(ordered, 0.50), 3),
+            "p95": round(_percentile(ordered, 0.95), 3),
+            "p99": round(_percentile(ordered, 0.99), 3),
+            "max": round(ordered[-1], 3),
+        },
+        "throughputRps": round(len(latencies) / wall, 2),
+        "queriesPerRequest": {
+            "mean": round(statistics.fmean(queries), 2),
+            "max": max(queries),
+        },
+    }
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(
+    db_path: str,
+    scenarios: Sequence[str],
+    requests: int,
+    concurrency: int,
+    seed: int,
+    settle: float,
+) -> Dict[str, Any]:
+    # a aplicação lê banco e limites do ambiente na importação
+    os.environ["DATABASE_URL"] = f"file:{os.path.abspath(db_path)}"
+    os.environ.setdefault("RATE_MAX", str(10 ** 9))
+    import httpx
+    from backend.app import app, prisma, read_pool
+
+    ctx = TenantContext.load(db_path)
+    counter = QueryCounter()
+    prisma_counted = counter.install(prisma, read_pool)
+    results: Dict[str, Any] = {}
+    await app.router.startup()
+    try:
+        # jobs de startup (recomendações, estado de anomalias) começam a rodar
+        await asyncio.sleep(settle)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name in scenarios:
+                results[name] = await run_scenario(
+                    client, SCENARIOS[name], ctx, counter, requests, concurrency, seed
+                )
+                _print_row(name, results[name])
+    finally:
+        await app.router.shutdown()
+    return {"scenarios": results, "prismaQueriesCounted": prisma_counted}
+
+
+def _print_header() -> None:
+    print(f"{'cenário':24} {'req':>6} {'erros':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>9} {'consultas':>10}")
+
+
+def _print_row(name: str, info: Dict[str, Any]) -> None:
+    latency = info["latencyMs"]
+    print(f"{name:24} {info['requests']:>6} {info['errors']:>6} {latency['p50']:9.2f} {latency['p95']:9.2f} "
+          f"{latency['p99']:9.2f} {info['throughputRps']:9.1f} {info['queriesPerRequest']['mean']:10.1f}")
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    print(f"\nComparação com {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print(f"{'cenário':24} {'p50':>16} {'p95':>16} {'req/s':>16} {'consultas':>14}")
+    for name, info in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+
+        def delta(now: float, then: float) -> str:
+            change = (now - then) / then * 100 if then else 0.0
+            return f"{then:.1f}→{now:.1f} ({change:+.0f}%)"
+
+        print(f"{name:24} {delta(info['latencyMs']['p50'], before['latencyMs']['p50']):>16} "
+              f"{delta(info['latencyMs']['p95'], before['latencyMs']['p95']):>16} "
+              f"{delta(info['throughputRps'], before['throughputRps']):>16} "
+              f"{delta(info['queriesPerRequest']['mean'], before['queriesPerRequest']['mean']):>14}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1k", help=f"{'/'.join(SIZES)} ou número de usuários")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="usa um banco existente em vez do tenant sintético")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="cenários separados por vírgula")
+    parser.add_argument("--requests", type=int, default=200, help="requisições medidas por cenário")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--settle", type=float, default=2.0, help="segundos entre o startup e a carga")
+    parser.add_argument("--output", default=None, help=f"JSON de saída (padrão: {RESULTS_DIR}/...)")
+    parser.add_argument("--compare", default=None, metavar="JSON", help="resultado anterior para comparar")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"Cenários desconhecidos: {unknown} (disponíveis: {list(SCENARIOS)})")
+        return 2
+
+    users = parse_size(args.size)
+    db_path = args.db or ensure_tenant(users, args.seed)
+    print(f"Banco: {db_path} | {args.requests} req x {args.concurrency} clientes por cenário")
+    _print_header()
+    outcome = asyncio.run(run(db_path, scenarios, args.requests, args.concurrency, args.seed, args.settle))
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    result = {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db": db_path,
+            "users": None if args.db else users,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "prismaQueriesCounted": outcome["prismaQueriesCounted"],
+        },
+        "scenarios": outcome["scenarios"],
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{commit or 'nogit'}-{args.size}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(result, handle, ensure_ascii=False, indent=2)
+    print(f"\nResultado salvo em {output}")
+    if not outcome["prismaQueriesCounted"]:
+        print("Aviso: cliente Prisma sem `_execute`; consultas contam só as leituras do pool SQLite")
+    if args.compare:
+        compare(result, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
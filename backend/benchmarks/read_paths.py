@@ -0,0 +1,85 @@
+"""
+Compara os caminhos de leitura Prisma x pool SQLite nos endpoints quentes.
+
+Uso (na raiz do repositório, com o banco em data/databases/real.db):
+  python -m backend.benchmarks.read_paths
+  python -m backend.benchmarks.read_paths --repeat 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from backend.app import (
+    _list_teams_prisma,
+    _list_teams_sqlite,
+    _list_users_prisma,
+    _list_users_sqlite,
+    dashboard_collaborator,
+    dashboard_manager,
+    prisma,
+    read_pool,
+)
+
+
+async def _time(fn: Callable[[], Awaitable[object]], repeat: int) -> List[float]:
+    await fn()  # aquecimento (conexões, cache de statements)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+async def _toggled(fn: Callable[[], Awaitable[object]], fast: bool) -> object:
+    read_pool.enabled = fast
+    return await fn()
+
+
+async def main(repeat: int, user_id: str) -> None:
+    fast_reads = read_pool.enabled
+    await prisma.connect()
+    await read_pool.open()
+    try:
+        cases = [
+            ("GET /api/teams", _list_teams_prisma, _list_teams_sqlite),
+            ("GET /api/users", _list_users_prisma, _list_users_sqlite),
+            (
+                "GET /api/dashboard/manager",
+                lambda: _toggled(dashboard_manager, False),
+                lambda: _toggled(dashboard_manager, True),
+            ),
+            (
+                "GET /api/dashboard/collaborator/{id}",
+                lambda: _toggled(lambda: dashboard_collaborator(user_id), False),
+                lambda: _toggled(lambda: dashboard_collaborator(user_id), True),
+            ),
+        ]
+        print(f"{'endpoint':38} {'caminho':8} {'média ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+        for name, slow, fast in cases:
+            for label, fn in (("prisma", slow), ("sqlite", fast)):
+                stats = _summary(await _time(fn, repeat))
+                print(f"{name:38} {label:8} {stats['mean']:10.2f} {stats['p50']:10.2f} {stats['p95']:10.2f}")
+    finally:
+        read_pool.enabled = fast_reads
+        await read_pool.close()
+        await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--user", default="col-0", help="id do colaborador para o dashboard")
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.user))
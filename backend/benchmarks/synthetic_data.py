@@ -0,0 +1,530 @@
+"""
+Gera bancos SQLite sintéticos ("tenants") para benchmarks e testes de carga.
+
+O schema é copiado do banco modelo (tabelas e índices do Prisma) e as colunas
+adicionadas por migrações posteriores (`ALTER TABLE ... ADD COLUMN`) são
+aplicadas por cima. O volume de cada tabela é proporcional ao número de
+usuários, então 1k/10k/100k comparam o mesmo perfil de uso em escalas
+diferentes; check-ins e interações também aceitam um total explícito.
+Mesma semente e mesma data de referência (`--as-of`), mesmo banco.
+
+Cada usuário tem um perfil latente (sono e estresse de base, sensibilidade
+ao sono ruim, cronotipo, procrastinação) e prazos de matrícula. Os check-ins
+saem correlacionados: noites curtas elevam estresse e fadiga, segunda-feira
+pesa mais que sábado, e a semana antes de um prazo aperta o sono e eleva o
+estresse. Procrastinadores concentram as interações nos dias antes do prazo,
+respondendo mais rápido e errando mais.
+
+As linhas são geradas em streaming e gravadas com `executemany`, uma
+transação por tabela, journal desligado e índices criados só no final; o
+arquivo é escrito ao lado e renomeado quando termina.
+
+Uso (na raiz do repositório):
+  python -m backend.benchmarks.synthetic_data --size 10k
+  python -m backend.benchmarks.synthetic_data --users 2500 --output /tmp/bench.db --seed 7
+  python -m backend.benchmarks.synthetic_data --users 100000 --checkins 10000000 --output /tmp/10m.db
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+TEMPLATE_DB = "data/databases/real.db"
+MIGRATIONS_DIR = "prisma/migrations"
+OUTPUT_DIR = "data/benchmarks"
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# linhas geradas por usuário (ou usuários por entidade)
+USERS_PER_TEAM = 25
+USERS_PER_COURSE = 50
+MIN_COURSES = 20
+ACTIVITIES_PER_COURSE = 8
+ENROLLMENTS_PER_USER = 5
+CHECKINS_PER_USER = 20
+INTERACTIONS_PER_USER = 30
+REVIEWS_PER_USER = 4
+
+# linhas por executemany
+CHUNK_ROWS = 10_000
+# intervalo de linhas entre avisos de progresso
+PROGRESS_ROWS = 1_000_000
+# cache de páginas durante a carga (KiB)
+BULK_CACHE_KIB = 256 * 1024
+
+# mesmo placeholder do seed (nenhuma rota autentica por senha)
+PASSWORD_HASH = "hashed_secret"
+
+ACTIVITY_TYPES = ("RESUMO", "FLASHCARD", "QUIZ", "SIMULADO", "ESTUDO_DE_CASO", "CLOZE")
+ENROLLMENT_STATUS = ("NAO_INICIADO", "EM_ANDAMENTO", "CONCLUIDO", "ATRASADO", "REPROVADO_SIMULADO")
+CATEGORIES = ("Obrigatórios", "Técnico", "Liderança", "Soft Skills", "Compliance", "Dados")
+DAY_MS = 86_400_000
+HOUR_MS = 3_600_000
+
+# efeito do dia da semana (segunda = 0, como datetime.weekday)
+WEEKDAY_STRESS = (7.0, 3.0, 0.0, 1.0, 4.0, -8.0, -10.0)
+WEEKDAY_SLEEP = (-0.4, 0.0, 0.0, 0.0, -0.2, 0.7, 0.9)
+# chance de haver check-in no sábado/domingo
+WEEKEND_CHECKIN_RATE = 0.3
+# dias antes do prazo em que a pressão começa a subir
+DEADLINE_RAMP_DAYS = 7
+
+_ADD_COLUMN = re.compile(r'ALTER TABLE "?(\w+)"? ADD COLUMN "?(\w+)"? ([^;]+);', re.IGNORECASE)
+
+
+@dataclass
+class TenantSize:
+    users: int
+    # totais explícitos; None = proporcional ao número de usuários
+    checkins: Optional[int] = None
+    interactions: Optional[int] = None
+
+    @property
+    def teams(self) -> int:
+        return max(1, self.users // USERS_PER_TEAM)
+
+    @property
+    def courses(self) -> int:
+        return max(MIN_COURSES, self.users // USERS_PER_COURSE)
+
+    @property
+    def total_checkins(self) -> int:
+        return self.checkins if self.checkins is not None else self.users * CHECKINS_PER_USER
+
+    @property
+    def total_interactions(self) -> int:
+        return self.interactions if self.interactions is not None else self.users * INTERACTIONS_PER_USER
+
+    def share(self, total: int, index: int) -> int:
+        """Parte do total que cabe ao usuário `index` (soma exata = total)."""
+        return total // self.users + (index < total % self.users)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "usuarios": self.users,
+            "equipes": self.teams,
+            "materiais_fonte": self.courses,
+            "atividades_aprendizado": self.courses * ACTIVITIES_PER_COURSE,
+            "matriculas": self.users * min(ENROLLMENTS_PER_USER, self.courses),
+            "checkins_bio": self.total_checkins,
+            "interacoes": self.total_interactions,
+            "revisoes_sr": self.users * REVIEWS_PER_USER,
+        }
+
+
+def user_id(index: int) -> str:
+    return f"syn-u{index:07d}"
+
+
+def course_id(index: int) -> str:
+    return f"syn-c{index:05d}"
+
+
+def activity_id(course: int, order: int) -> str:
+    return f"syn-a{course:05d}-{order}"
+
+
+def _chunks(rows: Iterable[Tuple[Any, ...]], size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    chunk: List[Tuple[Any, ...]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_schema(
+    conn: sqlite3.Connection,
+    template: str,
+    migrations_dir: str = MIGRATIONS_DIR,
+    defer_indexes: bool = False,
+) -> List[str]:
+    """
+    Tabelas e índices do banco modelo + colunas de migrações mais novas que ele.
+    Com `defer_indexes` os índices não são criados: o SQL deles é devolvido
+    para ser executado depois da carga.
+    """
+    source = sqlite3.connect(f"file:{template}?mode=ro", uri=True)
+    try:
+        objects = source.execute(
+            "SELECT type, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' AND type IN ('table', 'index') "
+            "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END"
+        ).fetchall()
+    finally:
+        source.close()
+    deferred: List[str] = []
+    for kind, sql in objects:
+        if kind == "index" and defer_indexes:
+            deferred.append(sql)
+        else:
+            conn.execute(sql)
+    for path in sorted(glob.glob(os.path.join(migrations_dir, "*", "migration.sql"))):
+        with open(path, encoding="utf-8-sig") as handle:
+            for table, column, definition in _ADD_COLUMN.findall(handle.read()):
+                existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+                if existing and column not in existing:
+                    conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}')
+    conn.commit()
+    return deferred
+
+
+def _bulk_pragmas(conn: sqlite3.Connection) -> None:
+    # arquivo temporário e descartável até o rename: sem journal nem fsync
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA cache_size=-{BULK_CACHE_KIB}")
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return low if value < low else high if value > high else value
+
+
+class UserProfile(NamedTuple):
+    """Traços latentes de um usuário; derivados só de (semente, índice)."""
+    sleep: float            # horas de sono de base
+    stress: float           # estresse de base (0-100)
+    sensitivity: float      # quanto cada hora de sono a menos pesa no estresse
+    chronotype: int         # hora habitual do check-in
+    procrastination: float  # fração das interações feitas nos dias antes de um prazo
+    courses: Tuple[int, ...]
+    assigned: Tuple[int, ...]   # atribuição de cada matrícula (ms)
+    deadlines: Tuple[int, ...]  # prazo de cada matrícula (ms)
+
+
+class TenantGenerator:
+    """Gera as linhas de cada tabela de forma determinística (por semente)."""
+
+    def __init__(self, size: TenantSize, seed: int = 42, now_ms: Optional[int] = None):
+        self.size = size
+        self.seed = seed
+        self.now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+
+    def _rng(self, table: str) -> random.Random:
+        # uma sequência por tabela: gerar uma tabela a mais não muda as outras
+        return random.Random(f"{self.seed}:{table}")
+
+    def profile(self, index: int) -> UserProfile:
+        """Perfil do usuário; recalculado sob demanda, igual em todas as tabelas."""
+        rng = random.Random((self.seed << 32) + index)
+        per_user = min(ENROLLMENTS_PER_USER, self.size.courses)
+        courses = tuple(rng.sample(range(self.size.courses), per_user))
+        assigned = tuple(self.now_ms - rng.randint(1, 180) * DAY_MS for _ in courses)
+        return UserProfile(
+            sleep=_clamp(rng.gauss(7.0, 0.7), 5.0, 9.0),
+            stress=_clamp(rng.gauss(40, 10), 10, 75),
+            sensitivity=rng.uniform(0.5, 1.5),
+            chronotype=int(_clamp(round(rng.gauss(9, 1.5)), 6, 14)),
+            procrastination=rng.betavariate(2, 5),
+            courses=courses,
+            assigned=assigned,
+            deadlines=tuple(moment + rng.randint(7, 90) * DAY_MS for moment in assigned),
+        )
+
+    def equipes(self) -> Iterator[Tuple[Any, ...]]:
+        for team in range(self.size.teams):
+            yield (f"syn-t{team:05d}", f"Equipe {team + 1}", None, user_id(team * USERS_PER_TEAM),
+                   self.now_ms, self.now_ms)
+
+    def usuarios(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("usuarios")
+        for index in range(self.size.users):
+            manager = index % USERS_PER_TEAM == 0
+            xp = int(rng.lognormvariate(6.5, 1.0))
+            yield (
+                user_id(index), f"Colaborador {index + 1}", f"colaborador{index + 1}@synthetic.synapse",
+                PASSWORD_HASH, f"{index + 1:011d}", None, "GESTOR" if manager else "COLABORADOR",
+                f"syn-t{min(index // USERS_PER_TEAM, self.size.teams - 1):05d}",
+                "Gestor" if manager else "Analista", xp, 1 + xp // 1000, rng.randint(0, 30), 1,
+                self.now_ms - rng.randint(30, 720) * DAY_MS, self.now_ms,
+            )
+
+    def materiais_fonte(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("materiais_fonte")
+        for course in range(self.size.courses):
+            created = self.now_ms - rng.randint(1, 365) * DAY_MS
+            yield (
+                course_id(course), f"Curso sintético {course + 1}", "Curso gerado para benchmark",
+                CATEGORIES[course % len(CATEGORIES)], "RECOMENDADO" if course % 3 else "OBRIGATORIO",
+                None, f"https://cdn.synapse/{course_id(course)}.pdf", "AI_GENERATED", "CONCLUIDO",
+                created, created,
+            )
+
+    def atividades_aprendizado(self) -> Iterator[Tuple[Any, ...]]:
+        for course in range(self.size.courses):
+            for order in range(ACTIVITIES_PER_COURSE):
+                kind = ACTIVITY_TYPES[order % len(ACTIVITY_TYPES)]
+                content = json.dumps({"id": activity_id(course, order), "type": kind,
+                                      "title": f"Atividade {order + 1}"})
+                yield (activity_id(course, order), course_id(course), kind, content, 10 + 10 * order, 5,
+                       order, int(kind in ("QUIZ", "SIMULADO")), self.now_ms)
+
+    def matriculas(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("matriculas")
+        for index in range(self.size.users):
+            profile = self.profile(index)
+            for course, assigned, deadline in zip(profile.courses, profile.assigned, profile.deadlines):
+                if deadline <= self.now_ms:
+                    status = "CONCLUIDO" if rng.random() > profile.procrastination * 0.6 else rng.choice(
+                        ("ATRASADO", "REPROVADO_SIMULADO"))
+                elif rng.random() < profile.procrastination:
+                    status = "NAO_INICIADO"
+                else:
+                    status = "EM_ANDAMENTO"
+                progress = {"NAO_INICIADO": 0, "CONCLUIDO": 100}.get(status, rng.randint(5, 95))
+                grade = round(rng.uniform(50, 100), 1) if status == "CONCLUIDO" else None
+                yield (
+                    f"syn-m{index:07d}-{course:05d}", user_id(index), course_id(course), status, progress,
+                    grade, int(course % 3 == 0), assigned, deadline,
+                    min(self.now_ms, assigned + rng.randint(0, 30) * DAY_MS),
+                )
+
+    def checkins_bio(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("checkins_bio")
+        gauss, uniform = rng.gauss, rng.random
+        today = self.now_ms - self.now_ms % DAY_MS
+        ramp_ms = DEADLINE_RAMP_DAYS * DAY_MS
+        total = self.size.total_checkins
+        for index in range(self.size.users):
+            profile = self.profile(index)
+            uid = user_id(index)
+            chronotype, sensitivity = profile.chronotype, profile.sensitivity * 7
+            deadlines = sorted(profile.deadlines)
+            wanted = self.size.share(total, index)
+            sample = day = 0
+            # um check-in por dia, de hoje para trás; fins de semana são mais raros
+            while sample < wanted:
+                start = today - day * DAY_MS
+                day += 1
+                weekday = (start // DAY_MS + 3) % 7  # 01/01/1970 foi quinta-feira
+                if weekday >= 5 and uniform() >= WEEKEND_CHECKIN_RATE:
+                    continue
+                hour = int(_clamp(chronotype + gauss(0, 1.5), 6, 22))
+                moment = start + hour * HOUR_MS + int(uniform() * HOUR_MS)
+                if moment > self.now_ms:
+                    continue
+                # pressão sobe linearmente nos DEADLINE_RAMP_DAYS antes do próximo prazo
+                upcoming = bisect_left(deadlines, moment)
+                ahead = deadlines[upcoming] - moment if upcoming < len(deadlines) else ramp_ms
+                pressure = 1.0 - ahead / ramp_ms if ahead < ramp_ms else 0.0
+                off_hours = abs(hour - chronotype)
+
+                sleep = _clamp(profile.sleep + WEEKDAY_SLEEP[weekday] - 1.2 * pressure + gauss(0, 0.7), 3.0, 11.0)
+                stress = _clamp(profile.stress + sensitivity * (7 - sleep) + WEEKDAY_STRESS[weekday]
+                                + 30 * pressure + gauss(0, 8), 0, 100)
+                fatigue = _clamp(15 + 9 * (7.5 - sleep) + 0.35 * stress + 1.5 * off_hours + gauss(0, 8), 0, 100)
+                focus = _clamp(85 - 0.35 * stress - 0.3 * fatigue + (6 if off_hours <= 2 else 0)
+                               + gauss(0, 7), 0, 100)
+                quality = _clamp(2 + 0.9 * sleep - 1.5 * pressure + gauss(0, 1), 1, 10)
+                yield (
+                    f"syn-b{index:07d}-{sample:06d}", uid, round(sleep, 1), round(quality), round(focus),
+                    round(stress), round(fatigue), "SIMULACAO_BENCHMARK", None, moment, weekday, hour,
+                )
+                sample += 1
+
+    def interacoes(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("interacoes")
+        uniform = rng.random
+        total = self.size.total_interactions
+        for index in range(self.size.users):
+            profile = self.profile(index)
+            uid = user_id(index)
+            due = [deadline for deadline in profile.deadlines if deadline <= self.now_ms]
+            for sample in range(self.size.share(total, index)):
+                # a maior parte das interações é nos cursos em que o usuário está matriculado
+                course = rng.choice(profile.courses) if uniform() < 0.85 else rng.randrange(self.size.courses)
+                cramming = bool(due) and uniform() < profile.procrastination
+                if cramming:
+                    # véspera do prazo: mais rápido e mais erros
+                    moment = rng.choice(due) - int(uniform() * 3 * DAY_MS)
+                    correct = uniform() < 0.6
+                    response = rng.lognormvariate(9.3, 0.5)
+                else:
+                    moment = self.now_ms - int(uniform() * 90 * DAY_MS)
+                    correct = uniform() < 0.78
+                    response = rng.lognormvariate(9.8, 0.5)
+                attempts = 1 if correct else rng.randint(1, 3)
+                yield (
+                    f"syn-i{index:07d}-{sample:06d}", uid,
+                    activity_id(course, rng.randrange(ACTIVITIES_PER_COURSE)),
+                    int(correct), int(_clamp(response, 800, 120_000)), attempts, moment,
+                )
+
+    def revisoes_sr(self) -> Iterator[Tuple[Any, ...]]:
+        rng = self._rng("revisoes_sr")
+        activities = self.size.courses * ACTIVITIES_PER_COURSE
+        for index in range(self.size.users):
+            for sample in range(REVIEWS_PER_USER):
+                activity = rng.randrange(activities)
+                last = self.now_ms - rng.randint(0, 30) * DAY_MS
+                interval = rng.randint(1, 30)
+                yield (
+                    f"syn-r{index:07d}-{sample:02d}", user_id(index),
+                    activity_id(activity // ACTIVITIES_PER_COURSE, activity % ACTIVITIES_PER_COURSE),
+                    round(rng.uniform(1.3, 2.8), 2), interval, rng.randint(0, 8), last, last + interval * DAY_MS,
+                )
+
+
+# (tabela, colunas) na ordem de inserção (chaves estrangeiras primeiro)
+TABLES: Sequence[Tuple[str, Sequence[str]]] = (
+    ("equipes", ("id", "nome", "descricao", "idGestor", "criadoEm", "atualizadoEm")),
+    ("usuarios", ("id", "nome", "email", "hashSenha", "cpf", "avatarUrl", "papel", "idEquipe", "cargo",
+                  "totalXp", "nivel", "diasSequencia", "aceitouTermos", "criadoEm", "atualizadoEm")),
+    ("materiais_fonte", ("id", "titulo", "descricao", "categoria", "tipoCurso", "thumbnailUrl", "urlArquivo",
+                         "tipoArquivo", "statusProcessamento", "criadoEm", "atualizadoEm")),
+    ("atividades_aprendizado", ("id", "idMaterialFonte", "tipo", "conteudo", "xpReward", "tempoEstimadoMin",
+                                "ordem", "avaliativa", "criadoEm")),
+    ("matriculas", ("id", "idUsuario", "idCurso", "status", "progresso", "notaFinal", "ehObrigatorio",
+                    "atribuidoEm", "prazo", "ultimoAcesso")),
+    ("checkins_bio", ("id", "idUsuario", "horasSono", "qualidadeSono", "nivelFoco", "nivelEstresse",
+                      "nivelFadiga", "origemDados", "dadosBrutosSensor", "dataHora", "diaDaSemana", "horaDoDia")),
+    ("interacoes", ("id", "idUsuario", "idAtividade", "estaCorreto", "tempoRespostaMs", "tentativas", "criadoEm")),
+    ("revisoes_sr", ("id", "idUsuario", "idAtividade", "easinessFactor", "intervalo", "repeticoes",
+                     "ultimaRevisao", "proximaRevisao")),
+)
+
+
+def generate(
+    path: str,
+    users: int,
+    seed: int = 42,
+    template: str = TEMPLATE_DB,
+    progress: Optional[Callable[[str, int, float, bool], None]] = None,
+    checkins: Optional[int] = None,
+    interactions: Optional[int] = None,
+    now_ms: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Cria `path` do zero; retorna contagens, tempo e vazão por tabela."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    size = TenantSize(users, checkins, interactions)
+    generator = TenantGenerator(size, seed, now_ms)
+    started_all = time.perf_counter()
+    conn = sqlite3.connect(partial)
+    timings: Dict[str, Dict[str, float]] = {}
+    try:
+        _bulk_pragmas(conn)
+        indexes = copy_schema(conn, template, defer_indexes=True)
+        for table, columns in TABLES:
+            started = time.perf_counter()
+            names = ", ".join('"%s"' % column for column in columns)
+            sql = f'INSERT INTO "{table}" ({names}) VALUES ({", ".join("?" for _ in columns)})'
+            rows = 0
+            with conn:
+                for chunk in _chunks(getattr(generator, table)(), CHUNK_ROWS):
+                    conn.executemany(sql, chunk)
+                    rows += len(chunk)
+                    if progress and rows % PROGRESS_ROWS < len(chunk) and rows >= PROGRESS_ROWS:
+                        progress(table, rows, time.perf_counter() - started, False)
+            elapsed = time.perf_counter() - started
+            timings[table] = {
+                "rows": rows,
+                "seconds": round(elapsed, 3),
+                "rowsPerSecond": round(rows / max(elapsed, 1e-9)),
+            }
+            if progress:
+                progress(table, rows, elapsed, True)
+
+        # índices de uma vez no fim: ordenação única em vez de manutenção linha a linha
+        started = time.perf_counter()
+        with conn:
+            for sql in indexes:
+                conn.execute(sql)
+        index_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        conn.execute("ANALYZE")
+        analyze_seconds = time.perf_counter() - started
+    finally:
+        conn.close()
+    os.replace(partial, path)
+
+    total_rows = sum(int(info["rows"]) for info in timings.values())
+    total_seconds = time.perf_counter() - started_all
+    return {
+        "path": path,
+        "users": users,
+        "seed": seed,
+        "tables": timings,
+        "indexSeconds": round(index_seconds, 3),
+        "analyzeSeconds": round(analyze_seconds, 3),
+        "totalRows": total_rows,
+        "totalSeconds": round(total_seconds, 3),
+        "rowsPerSecond": round(total_rows / max(total_seconds, 1e-9)),
+        "bytes": os.path.getsize(path),
+    }
+
+
+def default_path(users: int, seed: int) -> str:
+    return os.path.join(OUTPUT_DIR, f"tenant-{users}-s{seed}.db")
+
+
+def ensure_tenant(users: int, seed: int = 42, path: Optional[str] = None, template: str = TEMPLATE_DB) -> str:
+    """Reaproveita o banco já gerado para (usuários, semente) ou gera um novo."""
+    path = path or default_path(users, seed)
+    if not os.path.exists(path):
+        generate(path, users, seed, template)
+    return path
+
+
+def parse_size(value: str) -> int:
+    return SIZES[value] if value in SIZES else int(value)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1k", help=f"{'/'.join(SIZES)} ou número de usuários")
+    parser.add_argument("--users", type=int, default=None, help="número exato de usuários (sobrepõe --size)")
+    parser.add_argument("--checkins", type=int, default=None,
+                        help=f"total de check-ins (padrão: {CHECKINS_PER_USER} por usuário)")
+    parser.add_argument("--interactions", type=int, default=None,
+                        help=f"total de interações (padrão: {INTERACTIONS_PER_USER} por usuário)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help=f"arquivo de saída (padrão: {OUTPUT_DIR}/tenant-N-sS.db)")
+    parser.add_argument("--template", default=TEMPLATE_DB, help="banco de onde o schema é copiado")
+    parser.add_argument("--as-of", default=None, metavar="AAAA-MM-DD[THH:MM]",
+                        help="data de referência em UTC (padrão: agora); fixa os timestamps gerados")
+    args = parser.parse_args(argv)
+
+    users = args.users or parse_size(args.size)
+    path = args.output or default_path(users, args.seed)
+    now_ms = None
+    if args.as_of:
+        as_of = datetime.fromisoformat(args.as_of).replace(tzinfo=timezone.utc)
+        now_ms = int(as_of.timestamp() * 1000)
+    print(f"Gerando {path}: {users} usuários, semente {args.seed}")
+    print(f"Esperado: {TenantSize(users, args.checkins, args.interactions).counts()}")
+
+    def report(table: str, rows: int, seconds: float, done: bool) -> None:
+        mark = "" if done else " ..."
+        print(f"  {table:24} {rows:>11,} linhas {seconds:8.1f}s ({rows / max(seconds, 1e-9):>9,.0f}/s){mark}")
+
+    result = generate(
+        path, users, args.seed, args.template, progress=report,
+        checkins=args.checkins, interactions=args.interactions, now_ms=now_ms,
+    )
+    print(f"  {'índices':24} {'':>18} {result['indexSeconds']:8.1f}s")
+    print(f"  {'ANALYZE':24} {'':>18} {result['analyzeSeconds']:8.1f}s")
+    print(
+        f"Concluído: {result['totalRows']:,} linhas em {result['totalSeconds']:.1f}s "
+        f"({result['rowsPerSecond']:,}/s), {result['bytes'] / 2 ** 20:,.0f} MiB"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Latência x vazão por configuração de threads nativas (cpu_budget).
+
+Para cada carga (predição XGBoost/LightGBM/sklearn, BLAS do numpy, forward do
+torch) e cada par threads por chamada x chamadas simultâneas, roda um
+interpretador novo com os limites no ambiente (como o launcher faz) e mede,
+pelo ml_executor:
+  - latência isolada: uma chamada por vez (p50/p95);
+  - vazão: `concurrency` chamadas em voo até completar N chamadas, com a
+    latência p95 sob carga.
+Mais threads por chamada baixam a latência isolada; com várias chamadas
+simultâneas, threads x chamadas acima dos núcleos derrubam a vazão e esticam
+a cauda. Rode na máquina de produção (ou com CPU_BUDGET igual a ela).
+
+Uso (na raiz do repositório):
+  python -m backend.benchmarks.thread_budget
+  python -m backend.benchmarks.thread_budget --workloads xgboost,blas --threads 1,2,4 --concurrency 1,4
+  python -m backend.benchmarks.thread_budget --output data/benchmarks/thread_budget.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from backend.services.cpu_budget import THREAD_ENV_VARS, cpu_budget
+
+# carga -> pacote necessário
+WORKLOADS = {"xgboost": "xgboost", "lightgbm": "lightgbm", "sklearn": "sklearn", "blas": "numpy", "torch": "torch"}
+
+# roda no processo filho: limites já no ambiente, antes de qualquer import nativo
+_CHILD = """
+import asyncio, json
+from backend.benchmarks.thread_budget import measure
+print(json.dumps(asyncio.run(measure({workload!r}, {concurrency}, {rows}, {calls}))))
+"""
+
+
+def build_workload(name: str, rows: int) -> Callable[[], Any]:
+    """Modelo treinado fora da medição; devolve a chamada medida (uma requisição)."""
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(5000, 20)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    batch = X[:rows]
+    if name == "xgboost":
+        import xgboost as xgb
+
+        # sem n_jobs: usa o limite OpenMP da thread, como os modelos carregados
+        model = xgb.XGBClassifier(n_estimators=200, max_depth=6, tree_method="hist").fit(X, y)
+        return lambda: model.predict_proba(batch)
+    if name == "lightgbm":
+        import lightgbm as lgb
+
+        model = lgb.LGBMClassifier(n_estimators=200, verbose=-1).fit(X, y)
+        return lambda: model.predict_proba(batch)
+    if name == "sklearn":
+        from sklearn.ensemble import HistGradientBoostingClassifier
+
+        model = HistGradientBoostingClassifier(max_iter=200).fit(X, y)
+        return lambda: model.predict_proba(batch)
+    if name == "blas":
+        A = rng.normal(size=(rows, 512))
+        B = rng.normal(size=(512, 512))
+        return lambda: A @ B
+    if name == "torch":
+        import torch
+
+        net = torch.nn.Sequential(
+            torch.nn.Linear(20, 256), torch.nn.ReLU(), torch.nn.Linear(256, 256), torch.nn.ReLU(), torch.nn.Linear(256, 2)
+        )
+        inputs = torch.tensor(batch)
+
+        def forward():
+            with torch.no_grad():
+                return net(inputs)
+        return forward
+    raise ValueError(f"Carga desconhecida: {name} (disponíveis: {list(WORKLOADS)})")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def measure(workload: str, concurrency: int, rows: int, calls: int) -> Dict[str, Any]:
+    """No processo filho: latência isolada e vazão com `concurrency` chamadas em voo."""
+    import asyncio
+
+    from backend.services.ml_executor import MLExecutor
+
+    call = build_workload(workload, rows)
+    executor = MLExecutor(mode="thread", workers=concurrency, queue_max=concurrency, timeout=0)
+
+    def timed() -> float:
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    for _ in range(max(3, concurrency)):
+        await executor.run(timed)
+
+    isolated = [await executor.run(timed) for _ in range(calls)]
+
+    remaining = calls * concurrency
+    loaded: List[float] = []
+
+    async def client() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            loaded.append(await executor.run(timed))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+    return {
+        "isolatedP50Ms": round(statistics.median(isolated) * 1000, 3),
+        "isolatedP95Ms": round(_percentile(isolated, 0.95) * 1000, 3),
+        "loadedP95Ms": round(_percentile(loaded, 0.95) * 1000, 3),
+        "throughput": round(len(loaded) / elapsed, 1),
+        "pools": cpu_budget.pools(),
+    }
+
+
+def run_config(workload: str, threads: int, concurrency: int, rows: int, calls: int) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        **{var: str(threads) for var in THREAD_ENV_VARS},
+        "ML_INFERENCE_THREADS": str(threads),
+        "ML_EXECUTOR_WORKERS": str(concurrency),
+        "WEB_WORKERS": "1",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    code = _CHILD.format(workload=workload, concurrency=concurrency, rows=rows, calls=calls)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+    base = {"workload": workload, "threads": threads, "concurrency": concurrency}
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        return {**base, "error": tail[0]}
+    return {**base, **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+def _parse_counts(value: str, cores: int) -> List[int]:
+    counts = []
+    for item in value.split(","):
+        item = item.strip()
+        if item:
+            counts.append(cores if item == "all" else int(item))
+    return sorted(set(count for count in counts if count >= 1))
+
+
+def _print_reports(reports: List[Dict[str, Any]], cores: int) -> None:
+    print(f"\nNúcleos no orçamento: {cores}")
+    print(f"{'carga':9} {'threads':>7} {'simult.':>7} {'isolada p50':>12} {'p95':>9} "
+          f"{'sob carga p95':>14} {'vazão/s':>9}")
+    for report in reports:
+        head = f"{report['workload']:9} {report['threads']:7d} {report['concurrency']:7d}"
+        if "error" in report:
+            print(f"{head}  falhou: {report['error']}")
+            continue
+        oversubscribed = " *" if report["threads"] * report["concurrency"] > cores else ""
+        print(f"{head} {report['isolatedP50Ms']:10.2f}ms {report['isolatedP95Ms']:7.2f}ms "
+              f"{report['loadedP95Ms']:12.2f}ms {report['throughput']:9.1f}{oversubscribed}")
+    print("* threads x chamadas simultâneas acima dos núcleos")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", default="xgboost,lightgbm,sklearn,blas,torch",
+                        help=f"cargas: {','.join(WORKLOADS)}")
+    parser.add_argument("--threads", default="1,2,4,all", help="threads nativas por chamada (all = núcleos)")
+    parser.add_argument("--concurrency", default="1,all", help="chamadas simultâneas (all = núcleos)")
+    parser.add_argument("--rows", type=int, default=256, help="linhas por chamada")
+    parser.add_argument("--calls", type=int, default=50, help="chamadas medidas por cliente")
+    parser.add_argument("--output", default=None, help="grava o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    cores = cpu_budget.cores
+    workloads = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    unknown = [name for name in workloads if name not in WORKLOADS]
+    if unknown:
+        print(f"Cargas desconhecidas: {unknown} (disponíveis: {list(WORKLOADS)})")
+        return 2
+
+    missing = [name for name in workloads if find_spec(WORKLOADS[name]) is None]
+    if missing:
+        print(f"Sem o pacote instalado, ignoradas: {missing}")
+    reports = []
+    for workload in (name for name in workloads if name not in missing):
+        for threads in _parse_counts(args.threads, cores):
+            for concurrency in _parse_counts(args.concurrency, cores):
+                reports.append(run_config(workload, threads, concurrency, args.rows, args.calls))
+    _print_reports(reports, cores)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"cores": cores, "reports": reports}, handle, ensure_ascii=False, indent=2)
+        print(f"\nRelatório salvo em {args.output}")
+    return 0 if all("error" not in report for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
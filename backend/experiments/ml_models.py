@@ -1,4 +1,6 @@
-from typing import Any, Dict, List, Sequence
+import io
+import pickle
+from typing import Any, Dict, List, Optional, Sequence
 
 stress_model = None
 focus_model = None
@@ -20,6 +22,41 @@ def _to_dataset(rows: Sequence[Dict[str, Any]]):
     return X, ys, yf
 
 
+def preload() -> None:
+    """
+    Importa antecipadamente sklearn e torch (os imports de `train_models` ficam
+    dentro da função para não pesar no startup); chamado numa thread de aquecimento.
+    """
+    try:
+        import sklearn.ensemble
+        import sklearn.linear_model
+    except Exception:
+        pass
+    try:
+        import torch
+    except Exception:
+        pass
+
+
+def _build_net():
+    import torch
+    import torch.nn as nn
+
+    class Net(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.fc1 = nn.Linear(len(FEATURE_KEYS), 24)
+            self.fc2 = nn.Linear(24, 12)
+            self.out = nn.Linear(12, 2)
+
+        def forward(self, x):
+            x = torch.relu(self.fc1(x))
+            x = torch.relu(self.fc2(x))
+            return self.out(x)
+
+    return Net()
+
+
 def train_models(rows: Sequence[Dict[str, Any]]) -> None:
     """
     Treina modelos clássicos + um micro MLP para prever risco de estresse e curva de foco.
@@ -35,10 +72,14 @@ def train_models(rows: Sequence[Dict[str, Any]]) -> None:
         from sklearn.linear_model import LogisticRegression
         from sklearn.ensemble import RandomForestRegressor
 
+        from backend.ml.inference.compiled_trees import compiled_or_original
+
         stress_model = LogisticRegression(max_iter=1000)
         stress_model.fit(X, ys)
         focus_model = RandomForestRegressor(n_estimators=120, random_state=42)
         focus_model.fit(X, yf)
+        # avaliação em arrays numpy: as predições são de poucas linhas por chamada
+        focus_model = compiled_or_original(focus_model)
     except Exception:
         stress_model = None
         focus_model = None
@@ -47,20 +88,8 @@ def train_models(rows: Sequence[Dict[str, Any]]) -> None:
         import torch
         import torch.nn as nn
 
-        class Net(nn.Module):
-            def __init__(self):
-                super().__init__()
-                self.fc1 = nn.Linear(len(FEATURE_KEYS), 24)
-                self.fc2 = nn.Linear(24, 12)
-                self.out = nn.Linear(12, 2)
-
-            def forward(self, x):
-                x = torch.relu(self.fc1(x))
-                x = torch.relu(self.fc2(x))
-                return self.out(x)
-
         if len(X) >= 5:
-            torch_model = Net()
+            torch_model = _build_net()
             opt = torch.optim.Adam(torch_model.parameters(), lr=0.01)
             loss_fn = nn.MSELoss()
             inputs = torch.tensor(X, dtype=torch.float32)
@@ -79,18 +108,59 @@ def train_models(rows: Sequence[Dict[str, Any]]) -> None:
         torch_model = None
 
 
+def dump_state() -> bytes:
+    """Modelos treinados serializados, para outro processo usar sem treinar de novo."""
+    torch_state: Optional[bytes] = None
+    if torch_model is not None:
+        import torch
+
+        buffer = io.BytesIO()
+        torch.save(torch_model.state_dict(), buffer)
+        torch_state = buffer.getvalue()
+    return pickle.dumps(
+        {"stress": stress_model, "focus": focus_model, "torch": torch_state}, protocol=pickle.HIGHEST_PROTOCOL
+    )
+
+
+def load_state(blob: bytes) -> None:
+    global stress_model, focus_model, torch_model
+    state = pickle.loads(blob)
+    stress_model = state["stress"]
+    focus_model = state["focus"]
+    torch_model = None
+    if state["torch"] is not None:
+        try:
+            import torch
+
+            model = _build_net()
+            model.load_state_dict(torch.load(io.BytesIO(state["torch"])))
+            torch_model = model
+        except Exception:
+            torch_model = None
+
+
 def predict(sample: Dict[str, Any]) -> Dict[str, float]:
     """
     Recebe um dicionário com as features do colaborador e retorna projeções (%).
     """
-    x = [float(sample.get(key, 0)) for key in FEATURE_KEYS]
-    s = 0.5
-    f = 0.5
+    return predict_many([sample])[0]
+
+
+def predict_many(samples: Sequence[Dict[str, Any]]) -> List[Dict[str, float]]:
+    """
+    Versão vetorizada de `predict`: projeta todas as amostras com uma única
+    chamada a cada modelo (ex.: uma linha por equipe no heatmap).
+    """
+    if not samples:
+        return []
+    X = [[float(sample.get(key) or 0) for key in FEATURE_KEYS] for sample in samples]
+    s = [0.5] * len(X)
+    f = [0.5] * len(X)
     try:
         if stress_model is not None:
-            s = float(stress_model.predict_proba([x])[0][1])
+            s = [float(proba[1]) for proba in stress_model.predict_proba(X)]
         if focus_model is not None:
-            f = float(focus_model.predict([x])[0])
+            f = [float(value) for value in focus_model.predict(X)]
     except Exception:
         pass
     try:
@@ -98,14 +168,18 @@ def predict(sample: Dict[str, Any]) -> Dict[str, float]:
 
         if torch_model is not None:
             with torch.no_grad():
-                out = torch_model(torch.tensor([x], dtype=torch.float32))[0]
-                s = float(out[0].item())
-                f = float(out[1].item())
+                out = torch_model(torch.tensor(X, dtype=torch.float32))
+                s = [float(value) for value in out[:, 0].tolist()]
+                f = [float(value) for value in out[:, 1].tolist()]
     except Exception:
         pass
-    s_clamped = max(0.0, min(1.0, s))
-    f_clamped = max(0.0, min(1.0, f))
-    return {"stress": s_clamped * 100.0, "focus": f_clamped * 100.0}
+    return [
+        {
+            "stress": max(0.0, min(1.0, stress)) * 100.0,
+            "focus": max(0.0, min(1.0, focus)) * 100.0,
+        }
+        for stress, focus in zip(s, f)
+    ]
 
 
 def feature_template() -> Dict[str, float]:
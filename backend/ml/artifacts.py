@@ -0,0 +1,156 @@
+"""
+Model Artifacts
+===============
+
+Versões imutáveis dos modelos treinados.
+
+Cada treino grava em um diretório próprio (`<ML_ARTIFACT_DIR>/<versão>/`) com
+os pickles e um `manifest.json` (fingerprint dos dados de treino, métricas,
+features de entrada e arquivos). A versão servida é indicada por
+`current.json`, reescrito atomicamente (arquivo temporário + `os.replace`) a
+cada promoção ou rollback; os processos da API observam esse ponteiro e
+trocam os modelos sem reiniciar.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+ML_ARTIFACT_DIR = os.getenv("ML_ARTIFACT_DIR", "backend/ml/models/versions")
+# quantas versões antigas manter ao treinar (a atual e o histórico recente nunca são removidos)
+ML_ARTIFACT_KEEP = int(os.getenv("ML_ARTIFACT_KEEP", "5"))
+
+MANIFEST_FILE = "manifest.json"
+POINTER_FILE = "current.json"
+
+
+def write_json_atomic(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, indent=2, default=str)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+class ArtifactStore:
+    """Diretórios versionados de artefatos + ponteiro da versão ativa."""
+
+    def __init__(self, root: str = ML_ARTIFACT_DIR):
+        self.root = root
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.root, POINTER_FILE)
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def create_version(self) -> str:
+        """Reserva um diretório novo (ainda sem manifest, logo não promovível)."""
+        os.makedirs(self.root, exist_ok=True)
+        base = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        version, suffix = base, 1
+        while os.path.exists(self.path(version)):
+            suffix += 1
+            version = f"{base}-{suffix}"
+        os.makedirs(self.path(version))
+        return version
+
+    def write_manifest(
+        self,
+        version: str,
+        data_fingerprint: str,
+        metrics: Dict[str, Any],
+        features: Dict[str, List[str]],
+        training: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Fecha a versão: o manifest é o último arquivo gravado."""
+        directory = self.path(version)
+        files = sorted(name for name in os.listdir(directory) if name.endswith(".pkl"))
+        manifest = {
+            "version": version,
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "dataFingerprint": data_fingerprint,
+            "metrics": metrics,
+            "features": features,
+            "files": {name: os.path.getsize(os.path.join(directory, name)) for name in files},
+        }
+        if training is not None:
+            manifest["training"] = training
+        write_json_atomic(os.path.join(directory, MANIFEST_FILE), manifest)
+        return manifest
+
+    def manifest(self, version: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.path(version), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Versões completas (com manifest), da mais recente para a mais antiga."""
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if os.path.isdir(self.path(name)):
+                manifest = self.manifest(name)
+                if manifest is not None:
+                    result.append(manifest)
+        return result
+
+    def pointer(self) -> Dict[str, Any]:
+        if not os.path.exists(self.pointer_path):
+            return {"version": None, "history": []}
+        with open(self.pointer_path, encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def current(self) -> Optional[str]:
+        return self.pointer().get("version")
+
+    def promote(self, version: str) -> Dict[str, Any]:
+        """Torna `version` a ativa; a anterior vai para o histórico de rollback."""
+        if self.manifest(version) is None:
+            raise ValueError(f"Versão {version} inexistente ou incompleta")
+        state = self.pointer()
+        history = list(state.get("history", []))
+        if state.get("version") and state["version"] != version:
+            history.append(state["version"])
+        state = {
+            "version": version,
+            "promotedAt": datetime.now(timezone.utc).isoformat(),
+            "history": history[-ML_ARTIFACT_KEEP:],
+        }
+        write_json_atomic(self.pointer_path, state)
+        return state
+
+    def rollback(self) -> Dict[str, Any]:
+        """Volta para a versão promovida anteriormente."""
+        state = self.pointer()
+        history = list(state.get("history", []))
+        while history:
+            previous = history.pop()
+            if self.manifest(previous) is not None:
+                state = {
+                    "version": previous,
+                    "promotedAt": datetime.now(timezone.utc).isoformat(),
+                    "history": history,
+                }
+                write_json_atomic(self.pointer_path, state)
+                return state
+        raise ValueError("Nenhuma versão anterior para rollback")
+
+    def prune(self, keep: int = ML_ARTIFACT_KEEP) -> List[str]:
+        """Remove versões antigas, preservando a ativa e o histórico de rollback."""
+        state = self.pointer()
+        protected = {state.get("version"), *state.get("history", [])}
+        removed = []
+        for manifest in self.versions()[keep:]:
+            version = manifest["version"]
+            if version not in protected:
+                shutil.rmtree(self.path(version), ignore_errors=True)
+                removed.append(version)
+        return removed
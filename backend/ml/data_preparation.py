@@ -6,6 +6,7 @@ ETL e Feature Engineering para todos os modelos de ML.
 Extrai dados do SQLite e prepara features prontas para uso.
 """
 
+import hashlib
 import sqlite3
 import pandas as pd
 import numpy as np
@@ -14,64 +15,161 @@ from typing import Dict, Tuple, List
 import warnings
 warnings.filterwarnings('ignore')
 
+from backend.ml.feature_graph import FeatureGraph
+from backend.ml.snapshots import ML_SNAPSHOT_DIR, ML_SNAPSHOTS, SnapshotStore, parse_table_dates
+
+BASE_TABLES = ('usuarios', 'equipes', 'cargos', 'materiais_fonte', 'matriculas', 'checkins_bio')
+
 
 class DataPreparation:
     """Classe para preparação de dados do banco SQLite"""
 
-    def __init__(self, db_path: str = "data/databases/real.db"):
+    def __init__(
+        self,
+        db_path: str = "data/databases/real.db",
+        snapshot_dir: str = ML_SNAPSHOT_DIR,
+        use_snapshots: bool = ML_SNAPSHOTS,
+    ):
         """
         Inicializa conexão com banco de dados.
 
         Args:
             db_path: Caminho para o banco SQLite
+            snapshot_dir: Diretório dos snapshots colunares das tabelas
+            use_snapshots: Usa o cache colunar com carga incremental
         """
         self.db_path = db_path
         self.conn = None
+        self.snapshots = SnapshotStore(db_path, snapshot_dir) if use_snapshots else None
+        # Conexões aninhadas (ex.: prepare_enrollment_features chamando
+        # prepare_user_features) compartilham a mesma execução e as tabelas
+        # já carregadas nela.
+        self._depth = 0
+        self._tables: Dict[str, pd.DataFrame] = {}
+        self.features = self._build_graph()
+
+    def _build_graph(self) -> FeatureGraph:
+        """
+        DAG de features: tabelas base → usuário/curso → matrícula; equipe e
+        padrões de check-in dependem só das tabelas. Cada nó é memoizado pelo
+        fingerprint das entradas e sobrevive entre execuções desta instância.
+        """
+        graph = FeatureGraph()
+        for table in BASE_TABLES:
+            graph.source(
+                table,
+                load=lambda table=table: self._table(table),
+                fingerprint=lambda table=table: self._table_fingerprint(table),
+            )
+        graph.node('user_features', ['usuarios', 'matriculas', 'checkins_bio'], self._build_user_features)
+        graph.node('course_features', ['materiais_fonte', 'matriculas'], self._build_course_features)
+        # dias até o prazo/desde o acesso dependem do relógio: recalcula a cada hora
+        graph.node(
+            'enrollment_features',
+            ['matriculas', 'user_features', 'course_features'],
+            self._build_enrollment_features,
+            salt=lambda: datetime.now().strftime('%Y-%m-%dT%H'),
+        )
+        graph.node(
+            'team_features',
+            ['usuarios', 'equipes', 'checkins_bio', 'matriculas'],
+            self._build_team_features,
+        )
+        graph.node(
+            'wellbeing_timeseries',
+            ['checkins_bio'],
+            lambda checkins: checkins.sort_values(['idUsuario', 'dataHora']).reset_index(drop=True),
+        )
+        graph.node('hourly_patterns', ['checkins_bio'], self._build_hourly_patterns)
+        graph.node('weekly_patterns', ['checkins_bio'], self._build_weekly_patterns)
+        return graph
 
     def connect(self):
-        """Estabelece conexão com o banco"""
-        self.conn = sqlite3.connect(self.db_path)
+        """Estabelece conexão com o banco (reaproveitada em chamadas aninhadas)"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path)
+        self._depth += 1
 
     def disconnect(self):
-        """Fecha conexão com o banco"""
-        if self.conn:
+        """Fecha conexão com o banco ao final da execução mais externa"""
+        self._depth = max(0, self._depth - 1)
+        if self._depth == 0 and self.conn:
             self.conn.close()
+            self.conn = None
+            self._tables = {}
+
+    def _table(self, name: str) -> pd.DataFrame:
+        """
+        Tabela completa da execução atual (compartilhada entre os prepare_*).
+        Não deve ser alterada in-place.
+        """
+        if self.conn is None:
+            # chamada avulsa de get_*_df sem connect(): execução de uma tabela só
+            self.connect()
+            try:
+                return self._table(name)
+            finally:
+                self.disconnect()
+        if name not in self._tables:
+            if self.snapshots is not None:
+                self._tables[name] = self.snapshots.load(self.conn, name)
+            else:
+                self._tables[name] = parse_table_dates(
+                    name, pd.read_sql_query(f"SELECT * FROM {name}", self.conn)
+                )
+        return self._tables[name]
+
+    def _table_fingerprint(self, name: str) -> str:
+        frame = self._table(name)
+        if self.snapshots is not None:
+            return f"v{self.snapshots.version(name)}"
+        # sem snapshots não há versão da tabela: usa o hash do conteúdo
+        return str(int(pd.util.hash_pandas_object(frame, index=False).sum()))
+
+    def data_fingerprint(self) -> str:
+        """Hash do conteúdo das tabelas base (identifica os dados de um treino)."""
+        digest = hashlib.sha1()
+        self.connect()
+        try:
+            for table in BASE_TABLES:
+                frame = self._table(table)
+                content = int(pd.util.hash_pandas_object(frame, index=False).sum()) if len(frame) else 0
+                digest.update(f"{table}:{len(frame)}:{content}|".encode("utf-8"))
+        finally:
+            self.disconnect()
+        return digest.hexdigest()
+
+    def _feature(self, name: str) -> pd.DataFrame:
+        """Valor de um nó do DAG (cópia: o cache não pode ser alterado)."""
+        self.connect()
+        try:
+            return self.features.get(name).copy()
+        finally:
+            self.disconnect()
 
     def get_usuarios_df(self) -> pd.DataFrame:
         """Retorna DataFrame de usuários"""
-        query = "SELECT * FROM usuarios"
-        return pd.read_sql_query(query, self.conn)
+        return self._table('usuarios').copy()
 
     def get_equipes_df(self) -> pd.DataFrame:
         """Retorna DataFrame de equipes"""
-        query = "SELECT * FROM equipes"
-        return pd.read_sql_query(query, self.conn)
+        return self._table('equipes').copy()
 
     def get_matriculas_df(self) -> pd.DataFrame:
-        """Retorna DataFrame de matrículas"""
-        query = "SELECT * FROM matriculas"
-        df = pd.read_sql_query(query, self.conn)
-        # Converter datas
-        for col in ['atribuidoEm', 'prazo', 'ultimoAcesso']:
-            df[col] = pd.to_datetime(df[col])
-        return df
+        """Retorna DataFrame de matrículas (datas já convertidas)"""
+        return self._table('matriculas').copy()
 
     def get_checkins_bio_df(self) -> pd.DataFrame:
-        """Retorna DataFrame de check-ins biométricos"""
-        query = "SELECT * FROM checkins_bio"
-        df = pd.read_sql_query(query, self.conn)
-        df['dataHora'] = pd.to_datetime(df['dataHora'])
-        return df
+        """Retorna DataFrame de check-ins biométricos (datas já convertidas)"""
+        return self._table('checkins_bio').copy()
 
     def get_materiais_fonte_df(self) -> pd.DataFrame:
         """Retorna DataFrame de materiais/cursos"""
-        query = "SELECT * FROM materiais_fonte"
-        return pd.read_sql_query(query, self.conn)
+        return self._table('materiais_fonte').copy()
 
     def get_cargos_df(self) -> pd.DataFrame:
         """Retorna DataFrame de cargos"""
-        query = "SELECT * FROM cargos"
-        return pd.read_sql_query(query, self.conn)
+        return self._table('cargos').copy()
 
     def prepare_user_features(self) -> pd.DataFrame:
         """
@@ -80,13 +178,12 @@ class DataPreparation:
         Returns:
             DataFrame com features agregadas por usuário
         """
-        self.connect()
-
-        # Dados base
-        usuarios = self.get_usuarios_df()
-        matriculas = self.get_matriculas_df()
-        checkins = self.get_checkins_bio_df()
+        return self._feature('user_features')
 
+    @staticmethod
+    def _build_user_features(usuarios: pd.DataFrame, matriculas: pd.DataFrame,
+                             checkins: pd.DataFrame) -> pd.DataFrame:
+        """Nó `user_features`: usuários + agregados de matrículas e check-ins."""
         # Features de usuário
         user_features = usuarios[[
             'id', 'papel', 'idEquipe', 'idCargo', 'cargo',
@@ -144,8 +241,6 @@ class DataPreparation:
         # Preencher NaN
         user_features = user_features.fillna(0)
 
-        self.disconnect()
-
         return user_features.reset_index().rename(columns={'index': 'id'})
 
     def prepare_wellbeing_timeseries(self, user_id: str = None) -> pd.DataFrame:
@@ -158,19 +253,17 @@ class DataPreparation:
         Returns:
             DataFrame com séries temporais
         """
-        self.connect()
+        if not user_id:
+            return self._feature('wellbeing_timeseries')
 
-        if user_id:
-            query = f"SELECT * FROM checkins_bio WHERE idUsuario = '{user_id}' ORDER BY dataHora"
-        else:
-            query = "SELECT * FROM checkins_bio ORDER BY idUsuario, dataHora"
-
-        df = pd.read_sql_query(query, self.conn)
-        df['dataHora'] = pd.to_datetime(df['dataHora'])
-
-        self.disconnect()
+        self.connect()
+        try:
+            checkins = self._table('checkins_bio')
+            df = checkins[checkins['idUsuario'] == user_id].sort_values('dataHora')
+        finally:
+            self.disconnect()
 
-        return df
+        return df.reset_index(drop=True)
 
     def prepare_course_features(self) -> pd.DataFrame:
         """
@@ -179,11 +272,11 @@ class DataPreparation:
         Returns:
             DataFrame com estatísticas por curso
         """
-        self.connect()
-
-        materiais = self.get_materiais_fonte_df()
-        matriculas = self.get_matriculas_df()
+        return self._feature('course_features')
 
+    @staticmethod
+    def _build_course_features(materiais: pd.DataFrame, matriculas: pd.DataFrame) -> pd.DataFrame:
+        """Nó `course_features`: cursos + estatísticas das matrículas."""
         # Estatísticas por curso
         course_stats = matriculas.groupby('idCurso').agg({
             'id': 'count',
@@ -199,8 +292,6 @@ class DataPreparation:
         # Merge com dados do curso
         course_features = materiais.set_index('id').join(course_stats, how='left')
 
-        self.disconnect()
-
         return course_features.reset_index()
 
     def prepare_enrollment_features(self) -> pd.DataFrame:
@@ -210,12 +301,12 @@ class DataPreparation:
         Returns:
             DataFrame com features combinadas
         """
-        self.connect()
-
-        matriculas = self.get_matriculas_df()
-        user_features = self.prepare_user_features()
-        course_features = self.prepare_course_features()
+        return self._feature('enrollment_features')
 
+    @staticmethod
+    def _build_enrollment_features(matriculas: pd.DataFrame, user_features: pd.DataFrame,
+                                   course_features: pd.DataFrame) -> pd.DataFrame:
+        """Nó `enrollment_features`: matrículas + features de usuário e curso."""
         # Merge
         enrollment_features = matriculas.copy()
         enrollment_features = enrollment_features.merge(
@@ -260,8 +351,6 @@ class DataPreparation:
             (enrollment_features['progresso'] < 70)
         ).astype(int)
 
-        self.disconnect()
-
         return enrollment_features
 
     def prepare_team_features(self) -> pd.DataFrame:
@@ -271,13 +360,12 @@ class DataPreparation:
         Returns:
             DataFrame com estatísticas por equipe
         """
-        self.connect()
-
-        usuarios = self.get_usuarios_df()
-        equipes = self.get_equipes_df()
-        checkins = self.get_checkins_bio_df()
-        matriculas = self.get_matriculas_df()
+        return self._feature('team_features')
 
+    @staticmethod
+    def _build_team_features(usuarios: pd.DataFrame, equipes: pd.DataFrame,
+                             checkins: pd.DataFrame, matriculas: pd.DataFrame) -> pd.DataFrame:
+        """Nó `team_features`: equipes + agregados de usuários, check-ins e matrículas."""
         # Merge usuários com equipes
         usuarios_equipes = usuarios.merge(equipes, left_on='idEquipe', right_on='id', suffixes=('', '_equipe'))
 
@@ -317,8 +405,6 @@ class DataPreparation:
         team_features = team_features.join(checkins_agg, how='left')
         team_features = team_features.join(matriculas_agg, how='left')
 
-        self.disconnect()
-
         return team_features.reset_index()
 
     def get_user_course_history(self, user_id: str) -> Dict:
@@ -332,20 +418,20 @@ class DataPreparation:
             Dicionário com histórico completo
         """
         self.connect()
+        try:
+            # Dados do usuário
+            user = self._table('usuarios')
+            user = user[user['id'] == user_id].iloc[0].to_dict() if len(user[user['id'] == user_id]) > 0 else {}
 
-        # Dados do usuário
-        user = self.get_usuarios_df()
-        user = user[user['id'] == user_id].iloc[0].to_dict() if len(user[user['id'] == user_id]) > 0 else {}
-
-        # Matrículas
-        matriculas = self.get_matriculas_df()
-        user_enrollments = matriculas[matriculas['idUsuario'] == user_id]
+            # Matrículas
+            matriculas = self._table('matriculas')
+            user_enrollments = matriculas[matriculas['idUsuario'] == user_id]
 
-        # Check-ins
-        checkins = self.get_checkins_bio_df()
-        user_checkins = checkins[checkins['idUsuario'] == user_id]
-
-        self.disconnect()
+            # Check-ins
+            checkins = self._table('checkins_bio')
+            user_checkins = checkins[checkins['idUsuario'] == user_id]
+        finally:
+            self.disconnect()
 
         return {
             'user': user,
@@ -367,16 +453,19 @@ class DataPreparation:
         Returns:
             DataFrame com padrões por hora
         """
-        self.connect()
-
-        if user_id:
-            checkins = pd.read_sql_query(
-                f"SELECT * FROM checkins_bio WHERE idUsuario = '{user_id}'",
-                self.conn
-            )
-        else:
-            checkins = self.get_checkins_bio_df()
+        if not user_id:
+            return self._feature('hourly_patterns')
 
+        self.connect()
+        try:
+            checkins = self._table('checkins_bio')
+            return self._build_hourly_patterns(checkins[checkins['idUsuario'] == user_id])
+        finally:
+            self.disconnect()
+
+    @staticmethod
+    def _build_hourly_patterns(checkins: pd.DataFrame) -> pd.DataFrame:
+        """Nó `hourly_patterns`: agregados de check-ins por hora do dia."""
         hourly = checkins.groupby('horaDoDia').agg({
             'nivelFoco': ['mean', 'std'],
             'nivelEstresse': ['mean', 'std'],
@@ -385,8 +474,6 @@ class DataPreparation:
 
         hourly.columns = ['_'.join(col).strip() for col in hourly.columns.values]
 
-        self.disconnect()
-
         return hourly.reset_index()
 
     def get_weekly_patterns(self, user_id: str = None) -> pd.DataFrame:
@@ -399,16 +486,19 @@ class DataPreparation:
         Returns:
             DataFrame com padrões semanais
         """
-        self.connect()
-
-        if user_id:
-            checkins = pd.read_sql_query(
-                f"SELECT * FROM checkins_bio WHERE idUsuario = '{user_id}'",
-                self.conn
-            )
-        else:
-            checkins = self.get_checkins_bio_df()
+        if not user_id:
+            return self._feature('weekly_patterns')
 
+        self.connect()
+        try:
+            checkins = self._table('checkins_bio')
+            return self._build_weekly_patterns(checkins[checkins['idUsuario'] == user_id])
+        finally:
+            self.disconnect()
+
+    @staticmethod
+    def _build_weekly_patterns(checkins: pd.DataFrame) -> pd.DataFrame:
+        """Nó `weekly_patterns`: agregados de check-ins por dia da semana."""
         weekly = checkins.groupby('diaDaSemana').agg({
             'nivelFoco': ['mean', 'std'],
             'nivelEstresse': ['mean', 'std'],
@@ -424,8 +514,6 @@ class DataPreparation:
         weekly = weekly.reset_index()
         weekly['dia_nome'] = weekly['diaDaSemana'].map(day_names)
 
-        self.disconnect()
-
         return weekly
 
 
@@ -0,0 +1,115 @@
+"""
+Feature Graph
+=============
+
+DAG de etapas de feature engineering nomeadas e memoizadas.
+
+Cada nó declara suas dependências; o fingerprint de um nó combina o das
+entradas (e um `salt` opcional, ex.: a hora atual para features relativas a
+"hoje"). Um nó só é recalculado quando o fingerprint muda, então uma execução
+de treino ou de inferência calcula cada intermediário uma única vez e, depois
+de uma alteração no banco, recalcula apenas os nós afetados.
+"""
+
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class FeatureNode:
+    name: str
+    deps: List[str] = field(default_factory=list)
+    compute: Optional[Callable[..., Any]] = None
+    # nós-fonte (tabelas) informam o próprio fingerprint
+    source_fingerprint: Optional[Callable[[], str]] = None
+    salt: Optional[Callable[[], str]] = None
+
+
+class FeatureGraph:
+    """DAG de features memoizadas por fingerprint das entradas."""
+
+    def __init__(self):
+        self._nodes: Dict[str, FeatureNode] = {}
+        self._cache: Dict[str, Tuple[str, Any]] = {}
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    def source(self, name: str, load: Callable[[], Any], fingerprint: Callable[[], str]) -> None:
+        """Registra uma tabela base (carregada por `load`, versionada por `fingerprint`)."""
+        self._nodes[name] = FeatureNode(name=name, compute=load, source_fingerprint=fingerprint)
+
+    def node(
+        self,
+        name: str,
+        deps: List[str],
+        compute: Callable[..., Any],
+        salt: Optional[Callable[[], str]] = None,
+    ) -> None:
+        """Registra um nó derivado; `compute` recebe as dependências na ordem de `deps`."""
+        missing = [dep for dep in deps if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Dependências não registradas para {name}: {missing}")
+        self._nodes[name] = FeatureNode(name=name, deps=list(deps), compute=compute, salt=salt)
+
+    def fingerprint(self, name: str, _memo: Optional[Dict[str, str]] = None) -> str:
+        memo = {} if _memo is None else _memo
+        if name in memo:
+            return memo[name]
+        node = self._nodes[name]
+        if node.source_fingerprint is not None:
+            value = f"{name}:{node.source_fingerprint()}"
+        else:
+            parts = [name] + [self.fingerprint(dep, memo) for dep in node.deps]
+            if node.salt is not None:
+                parts.append(node.salt())
+            value = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+        memo[name] = value
+        return value
+
+    def get(self, name: str, _memo: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Retorna o valor do nó, recalculando-o (e às dependências) só se o
+        fingerprint mudou. O valor é compartilhado: não altere in-place.
+        """
+        memo = {} if _memo is None else _memo
+        node = self._nodes[name]
+        if node.source_fingerprint is not None:
+            return node.compute()
+
+        fp = self.fingerprint(name, memo)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == fp:
+            self.hits[name] += 1
+            return cached[1]
+
+        inputs = [self.get(dep, memo) for dep in node.deps]
+        value = node.compute(*inputs)
+        self._cache[name] = (fp, value)
+        self.misses[name] += 1
+        return value
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Descarta o cache de um nó (ou de todos)."""
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+    def order(self) -> List[str]:
+        """Nós em ordem topológica (dependências primeiro)."""
+        ordered: List[str] = []
+        seen = set()
+
+        def visit(name: str) -> None:
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self._nodes[name].deps:
+                visit(dep)
+            ordered.append(name)
+
+        for name in self._nodes:
+            visit(name)
+        return ordered
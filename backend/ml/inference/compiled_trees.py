@@ -0,0 +1,457 @@
+"""
+Compiled Trees
+==============
+
+Avaliação vetorizada de ensembles de árvores sem passar pelo sklearn,
+XGBoost ou LightGBM na hora da predição.
+
+`compile_model` achata as árvores de um modelo treinado em arrays numpy
+(feature, threshold, filhos, valor da folha). Todas as árvores ficam em um
+único array de nós, e a avaliação desce todas elas ao mesmo tempo para todas
+as linhas: um passo por nível de profundidade, sem validação de entrada,
+DataFrames ou pools de threads. A predição de uma linha custa dezenas de
+microssegundos em vez de milissegundos.
+
+Suporta:
+    - RandomForestClassifier / RandomForestRegressor (sklearn)
+    - IsolationForest (sklearn): profundidade + c(n) da folha, subconjunto de
+      features de cada árvore
+    - XGBRegressor / Booster com objetivo de regressão (dump JSON + base_score)
+    - LGBMRegressor / Booster (dump_model, splits numéricos)
+
+Os objetos compilados expõem a mesma interface usada pelos preditores
+(`predict`, `predict_proba`, `score_samples`), então substituem o modelo
+original sem mudar o código que os chama. Lotes grandes seguem para o
+modelo original (ver `ML_COMPILED_BATCH_ROWS`).
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# "0" mantém os modelos originais na inferência
+ML_COMPILED_TREES = os.getenv("ML_COMPILED_TREES", "1") != "0"
+# acima deste número de linhas a predição usa o modelo original
+ML_COMPILED_BATCH_ROWS = int(os.getenv("ML_COMPILED_BATCH_ROWS", "256"))
+
+# LightGBM trata |x| <= kZeroThreshold como zero
+_LGBM_ZERO_THRESHOLD = 1e-35
+
+
+class TreeEnsemble:
+    """
+    Florestas achatadas: nós de todas as árvores em arrays paralelos.
+
+    Folhas têm `feature == -1`. `value` tem uma coluna por saída (classes no
+    classificador, 1 na regressão). Com `strict=True` a condição do filho
+    esquerdo é `x < threshold` (XGBoost); caso contrário `x <= threshold`.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        default_left: Optional[np.ndarray] = None,
+        zero_as_missing: Optional[np.ndarray] = None,
+        strict: bool = False,
+        float32_inputs: bool = False,
+    ):
+        self.feature = feature.astype(np.int32)
+        self.threshold = threshold.astype(np.float64)
+        self.left = left.astype(np.int32)
+        self.right = right.astype(np.int32)
+        self.value = value.astype(np.float64).reshape(len(feature), -1)
+        self.roots = roots.astype(np.int32)
+        self.max_depth = int(max_depth)
+        self.default_left = (
+            np.ones(len(feature), dtype=bool) if default_left is None else default_left.astype(bool)
+        )
+        self.zero_as_missing = zero_as_missing.astype(bool) if zero_as_missing is not None else None
+        self.strict = strict
+        # sklearn e XGBoost comparam as features em float32
+        self.float32_inputs = float32_inputs
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def _as_matrix(self, X: Any) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32 if self.float32_inputs else np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X.astype(np.float64, copy=False)
+
+    def leaves(self, X: Any) -> np.ndarray:
+        """Índice da folha alcançada em cada árvore: matriz (linhas, árvores)."""
+        X = self._as_matrix(X)
+        n_rows = X.shape[0]
+        # um par (linha, árvore) por posição; só os que ainda não chegaram
+        # a uma folha seguem para o próximo nível
+        nodes = np.tile(self.roots, n_rows)
+        rows = np.repeat(np.arange(n_rows), self.n_trees)
+        active = np.flatnonzero(self.feature[nodes] >= 0)
+        for _ in range(self.max_depth):
+            if not len(active):
+                break
+            current = nodes[active]
+            x = X[rows[active], self.feature[current]]
+            threshold = self.threshold[current]
+            go_left = x < threshold if self.strict else x <= threshold
+            missing = np.isnan(x)
+            if self.zero_as_missing is not None:
+                missing |= self.zero_as_missing[current] & (np.abs(x) <= _LGBM_ZERO_THRESHOLD)
+            if missing.any():
+                go_left = np.where(missing, self.default_left[current], go_left)
+            child = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = child
+            active = active[self.feature[child] >= 0]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def leaf_values(self, X: Any) -> np.ndarray:
+        """Valores das folhas: (linhas, árvores, saídas)."""
+        return self.value[self.leaves(X)]
+
+    @classmethod
+    def from_nodes(cls, trees: List[Dict[str, np.ndarray]], **options) -> "TreeEnsemble":
+        """Concatena árvores com índices locais em um único array de nós."""
+        offsets = np.cumsum([0] + [len(tree["feature"]) for tree in trees[:-1]])
+        arrays: Dict[str, List[np.ndarray]] = {key: [] for key in ("feature", "threshold", "left", "right", "value")}
+        default_left, zero_missing = [], []
+        for offset, tree in zip(offsets, trees):
+            leaf = tree["feature"] < 0
+            arrays["feature"].append(tree["feature"])
+            arrays["threshold"].append(tree["threshold"])
+            # folhas apontam para si mesmas
+            own = np.arange(len(leaf)) + offset
+            arrays["left"].append(np.where(leaf, own, tree["left"] + offset))
+            arrays["right"].append(np.where(leaf, own, tree["right"] + offset))
+            arrays["value"].append(tree["value"].reshape(len(leaf), -1))
+            default_left.append(tree.get("default_left", np.ones(len(leaf), dtype=bool)))
+            zero_missing.append(tree.get("zero_as_missing", np.zeros(len(leaf), dtype=bool)))
+        zero_as_missing = np.concatenate(zero_missing)
+        return cls(
+            feature=np.concatenate(arrays["feature"]),
+            threshold=np.concatenate(arrays["threshold"]),
+            left=np.concatenate(arrays["left"]),
+            right=np.concatenate(arrays["right"]),
+            value=np.concatenate(arrays["value"]),
+            roots=offsets,
+            max_depth=max(int(tree["depth"]) for tree in trees),
+            default_left=np.concatenate(default_left),
+            zero_as_missing=zero_as_missing if zero_as_missing.any() else None,
+            **options,
+        )
+
+
+# ===== MODELOS COMPILADOS =====
+
+class CompiledEnsemble:
+    """
+    Base dos modelos compilados. Lotes maiores que `ML_COMPILED_BATCH_ROWS`
+    vão para o modelo original (quando disponível): a avaliação nativa em C
+    amortiza o overhead por chamada e ganha em lotes grandes, enquanto o
+    caminho compilado ganha nas chamadas de poucas linhas.
+    """
+
+    def __init__(self, trees: TreeEnsemble, original: Any = None):
+        self.trees = trees
+        self.original = original
+
+    def _native(self, X: Any) -> bool:
+        return self.original is not None and len(X) > ML_COMPILED_BATCH_ROWS
+
+
+class CompiledForestRegressor(CompiledEnsemble):
+    """Média das folhas (RandomForestRegressor)."""
+
+    def predict(self, X: Any) -> np.ndarray:
+        if self._native(X):
+            return self.original.predict(X)
+        return self.trees.leaf_values(X)[:, :, 0].mean(axis=1)
+
+
+class CompiledForestClassifier(CompiledEnsemble):
+    """Média das probabilidades das folhas (RandomForestClassifier)."""
+
+    def __init__(self, trees: TreeEnsemble, classes: np.ndarray, original: Any = None):
+        super().__init__(trees, original)
+        self.classes_ = np.asarray(classes)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        if self._native(X):
+            return self.original.predict_proba(X)
+        return self.trees.leaf_values(X).mean(axis=1)
+
+    def predict(self, X: Any) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class CompiledBoostedRegressor(CompiledEnsemble):
+    """Soma das folhas + base_score (XGBoost / LightGBM, link identidade)."""
+
+    def __init__(self, trees: TreeEnsemble, base_score: float = 0.0, original: Any = None):
+        super().__init__(trees, original)
+        self.base_score = float(base_score)
+
+    def predict(self, X: Any) -> np.ndarray:
+        if self._native(X):
+            return self.original.predict(X)
+        return self.trees.leaf_values(X)[:, :, 0].sum(axis=1) + self.base_score
+
+
+class CompiledIsolationForest(CompiledEnsemble):
+    """
+    score_samples = -2 ** (-E[h(x)] / c(max_samples)), com h(x) = profundidade
+    da folha + c(n_amostras_na_folha) já gravado como valor da folha.
+    """
+
+    def __init__(self, trees: TreeEnsemble, max_samples: int, offset: float, original: Any = None):
+        super().__init__(trees, original)
+        self.max_samples = max_samples
+        self.offset_ = float(offset)
+        self._denominator = _average_path_length(np.array([max_samples]))[0]
+
+    def score_samples(self, X: Any) -> np.ndarray:
+        if self._native(X):
+            return self.original.score_samples(X)
+        depths = self.trees.leaf_values(X)[:, :, 0].mean(axis=1)
+        return -(2.0 ** (-depths / self._denominator))
+
+    def decision_function(self, X: Any) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X: Any) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+class CompiledScaler:
+    """StandardScaler.transform sem validação de entrada."""
+
+    def __init__(self, mean: Optional[np.ndarray], scale: Optional[np.ndarray]):
+        self.mean_ = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale_ = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X: Any) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean_ is not None:
+            X = X - self.mean_
+        if self.scale_ is not None:
+            X = X / self.scale_
+        return X
+
+
+# ===== EXPORTADORES =====
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """c(n) do IsolationForest: profundidade média de uma busca sem sucesso em BST."""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    mask_1 = n_samples <= 1
+    mask_2 = n_samples == 2
+    rest = ~(mask_1 | mask_2)
+    result[mask_2] = 1.0
+    result[rest] = 2.0 * (np.log(n_samples[rest] - 1.0) + np.euler_gamma) - 2.0 * (n_samples[rest] - 1.0) / n_samples[rest]
+    return result
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        # sklearn numera os nós em pré-ordem: pais antes dos filhos
+        if left[node] >= 0:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return depth
+
+
+def _sklearn_tree(estimator: Any, features: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    tree = estimator.tree_
+    feature = tree.feature.astype(np.int64)
+    if features is not None:
+        # IsolationForest: índices relativos ao subconjunto sorteado para a árvore
+        mapped = np.asarray(features)[np.maximum(feature, 0)]
+        feature = np.where(feature >= 0, mapped, -1)
+    feature = np.where(tree.children_left >= 0, feature, -1)
+    missing_left = getattr(tree, "missing_go_to_left", None)
+    depths = _node_depths(tree.children_left, tree.children_right)
+    return {
+        "feature": feature,
+        "threshold": tree.threshold,
+        "left": np.maximum(tree.children_left, 0),
+        "right": np.maximum(tree.children_right, 0),
+        "value": tree.value[:, 0, :].astype(np.float64),
+        "default_left": np.ones(len(feature), bool) if missing_left is None else np.asarray(missing_left, bool),
+        "depth": int(depths.max()) if len(depths) else 0,
+        "_depths": depths,
+        "_n_samples": tree.n_node_samples,
+    }
+
+
+def compile_random_forest(model: Any):
+    trees = [_sklearn_tree(estimator) for estimator in model.estimators_]
+    if hasattr(model, "classes_"):
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise NotImplementedError("RandomForestClassifier multi-saída não suportado")
+        for tree in trees:
+            totals = tree["value"].sum(axis=1, keepdims=True)
+            tree["value"] = tree["value"] / np.where(totals == 0, 1.0, totals)
+        return CompiledForestClassifier(TreeEnsemble.from_nodes(trees, float32_inputs=True), model.classes_, model)
+    return CompiledForestRegressor(TreeEnsemble.from_nodes(trees, float32_inputs=True), model)
+
+
+def compile_isolation_forest(model: Any) -> CompiledIsolationForest:
+    trees = []
+    for estimator, features in zip(model.estimators_, model.estimators_features_):
+        tree = _sklearn_tree(estimator, features)
+        leaf = tree["feature"] < 0
+        path = tree["_depths"] + _average_path_length(tree["_n_samples"])
+        tree["value"] = np.where(leaf, path, 0.0).reshape(-1, 1)
+        trees.append(tree)
+    return CompiledIsolationForest(
+        TreeEnsemble.from_nodes(trees, float32_inputs=True),
+        max_samples=int(model.max_samples_),
+        offset=model.offset_,
+        original=model,
+    )
+
+
+def _xgb_base_score(booster: Any) -> float:
+    config = json.loads(booster.save_config())
+    learner = config["learner"]
+    objective = learner["objective"]["name"]
+    if not objective.startswith("reg:squarederror") and objective not in {"reg:linear", "reg:pseudohubererror", "reg:absoluteerror"}:
+        raise NotImplementedError(f"Objetivo XGBoost não suportado: {objective}")
+    raw = learner["learner_model_param"]["base_score"]
+    # XGBoost >= 2 grava como "[5E-1]" (vetor)
+    return float(str(raw).strip("[]").split(",")[0])
+
+
+def compile_xgboost(model: Any) -> CompiledBoostedRegressor:
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    names = booster.feature_names
+    index = {name: i for i, name in enumerate(names)} if names else {}
+    trees = []
+    for dump in booster.get_dump(dump_format="json"):
+        nodes: Dict[int, Dict[str, Any]] = {}
+        depth = 0
+        stack = [(json.loads(dump), 0)]
+        while stack:
+            node, level = stack.pop()
+            nodes[node["nodeid"]] = node
+            depth = max(depth, level)
+            for child in node.get("children", []):
+                stack.append((child, level + 1))
+        size = max(nodes) + 1
+        tree = {
+            "feature": np.full(size, -1, dtype=np.int64),
+            "threshold": np.zeros(size),
+            "left": np.zeros(size, dtype=np.int64),
+            "right": np.zeros(size, dtype=np.int64),
+            "value": np.zeros(size),
+            "default_left": np.ones(size, dtype=bool),
+            "depth": depth,
+        }
+        for node_id, node in nodes.items():
+            if "leaf" in node:
+                tree["value"][node_id] = node["leaf"]
+                continue
+            split = node["split"]
+            tree["feature"][node_id] = index[split] if split in index else int(str(split).lstrip("f"))
+            tree["threshold"][node_id] = node["split_condition"]
+            tree["left"][node_id] = node["yes"]
+            tree["right"][node_id] = node["no"]
+            tree["default_left"][node_id] = node["missing"] == node["yes"]
+        trees.append(tree)
+    ensemble = TreeEnsemble.from_nodes(trees, strict=True, float32_inputs=True)
+    # thresholds do XGBoost são float32
+    ensemble.threshold = ensemble.threshold.astype(np.float32).astype(np.float64)
+    return CompiledBoostedRegressor(ensemble, _xgb_base_score(booster), model)
+
+
+def compile_lightgbm(model: Any) -> CompiledBoostedRegressor:
+    booster = model.booster_ if hasattr(model, "booster_") else model
+    dump = booster.dump_model()
+    objective = str(dump.get("objective", "regression")).split()[0]
+    if objective not in {"regression", "regression_l1", "huber", "fair", "quantile"}:
+        raise NotImplementedError(f"Objetivo LightGBM não suportado: {objective}")
+    trees = []
+    for info in dump["tree_info"]:
+        flat = {key: [] for key in ("feature", "threshold", "left", "right", "value", "default_left", "zero_as_missing")}
+        depth = 0
+
+        def add(node: Dict[str, Any], level: int) -> int:
+            nonlocal depth
+            depth = max(depth, level)
+            node_id = len(flat["feature"])
+            for key in flat:
+                flat[key].append(0)
+            if "leaf_value" in node or "split_feature" not in node:
+                flat["feature"][node_id] = -1
+                flat["value"][node_id] = node.get("leaf_value", 0.0)
+                flat["default_left"][node_id] = True
+                return node_id
+            if node.get("decision_type", "<=") != "<=":
+                raise NotImplementedError("Splits categóricos do LightGBM não suportados")
+            flat["feature"][node_id] = node["split_feature"]
+            flat["threshold"][node_id] = node["threshold"]
+            missing_type = node.get("missing_type", "None")
+            if missing_type == "None":
+                # sem faltantes no treino o LightGBM troca NaN por 0.0 antes de comparar
+                flat["default_left"][node_id] = 0.0 <= node["threshold"]
+            else:
+                flat["default_left"][node_id] = bool(node.get("default_left", True))
+            flat["zero_as_missing"][node_id] = missing_type == "Zero"
+            flat["left"][node_id] = add(node["left_child"], level + 1)
+            flat["right"][node_id] = add(node["right_child"], level + 1)
+            return node_id
+
+        add(info["tree_structure"], 0)
+        tree = {key: np.asarray(values) for key, values in flat.items()}
+        tree["default_left"] = tree["default_left"].astype(bool)
+        tree["zero_as_missing"] = tree["zero_as_missing"].astype(bool)
+        tree["depth"] = depth
+        trees.append(tree)
+    return CompiledBoostedRegressor(TreeEnsemble.from_nodes(trees), 0.0, model)
+
+
+def compile_model(model: Any):
+    """Compila um ensemble suportado; levanta NotImplementedError nos demais."""
+    kind = type(model).__name__
+    if kind in {"RandomForestClassifier", "RandomForestRegressor", "ExtraTreesClassifier", "ExtraTreesRegressor"}:
+        return compile_random_forest(model)
+    if kind == "IsolationForest":
+        return compile_isolation_forest(model)
+    if kind == "XGBRegressor" or (kind == "Booster" and hasattr(model, "get_dump")):
+        return compile_xgboost(model)
+    if kind == "LGBMRegressor" or (kind == "Booster" and hasattr(model, "dump_model")):
+        return compile_lightgbm(model)
+    if kind == "StandardScaler":
+        return CompiledScaler(
+            model.mean_ if model.with_mean else None,
+            model.scale_ if model.with_std else None,
+        )
+    raise NotImplementedError(f"Modelo não suportado pelo compilador: {kind}")
+
+
+def compiled_or_original(model: Any, enabled: bool = ML_COMPILED_TREES) -> Any:
+    """Versão compilada do modelo, ou o próprio modelo se desligado/não suportado."""
+    if model is None or not enabled:
+        return model
+    try:
+        return compile_model(model)
+    except NotImplementedError:
+        return model
+    except Exception as exc:
+        print(f"Falha ao compilar {type(model).__name__}, usando o modelo original: {exc}")
+        return model
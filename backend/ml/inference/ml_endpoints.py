@@ -5,106 +5,469 @@ ML API Endpoints
 Endpoints FastAPI para todos os modelos de Machine Learning.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-import joblib
+import asyncio
+import logging
+import multiprocessing
+import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
 import sys
 sys.path.append('.')
 
+from backend.ml.artifacts import ArtifactStore
 from backend.ml.data_preparation import DataPreparation
+from backend.ml.inference.compiled_trees import compiled_or_original
+from backend.ml.inference.model_registry import (
+    ML_VERSION_POLL_SECONDS, ModelRegistry, ModelUnavailable, warmup_targets
+)
 from backend.ml.models.burnout_predictor import BurnoutPredictor
 from backend.ml.models.all_models import (
     CourseRecommender, PerformancePredictor, ScheduleOptimizer,
     ProfileClusterer, ChurnDetector, WellbeingAnalyzer,
     GradePredictor, AnomalyDetector
 )
+from backend.services.admin_auth import require_admin
+from backend.services.cpu_budget import cpu_budget
+from backend.services.ml_executor import ExecutorSaturated, ExecutorTimeout, ml_executor
+from backend.services.timeutil import epoch_ms
 
 router = APIRouter(prefix="/api/ml", tags=["Machine Learning"])
 
-# Carregar modelos
 dp = DataPreparation()
 
-try:
-    # Modelo 1: Burnout
-    burnout_model = BurnoutPredictor()
-    burnout_model.load("backend/ml/models/burnout_model.pkl")
-
-    # Modelo 2: Recommender
-    recommender_data = joblib.load("backend/ml/models/recommender_model.pkl")
-    recommender = CourseRecommender()
-    recommender.user_similarity_df = recommender_data['user_similarity']
-    recommender.course_profiles = recommender_data['course_profiles']
-
-    # Modelo 3: Performance
-    perf_data = joblib.load("backend/ml/models/performance_model.pkl")
-    perf_predictor = PerformancePredictor()
-    perf_predictor.model = perf_data['model']
-    perf_predictor.scaler = perf_data['scaler']
-
-    # Modelo 4: Schedule
-    schedule_data = joblib.load("backend/ml/models/schedule_model.pkl")
-    scheduler = ScheduleOptimizer()
-    scheduler.patterns = schedule_data['patterns']
-
-    # Modelo 5: Clustering
-    cluster_data = joblib.load("backend/ml/models/clustering_model.pkl")
-    clusterer = ProfileClusterer()
-    clusterer.model = cluster_data['model']
-    clusterer.scaler = cluster_data['scaler']
-    clusterer.cluster_names = cluster_data['cluster_names']
-
-    # Modelo 6: Churn
-    churn_data = joblib.load("backend/ml/models/churn_model.pkl")
-    churn_detector = ChurnDetector()
-    churn_detector.model = churn_data['model']
-    churn_detector.scaler = churn_data['scaler']
-
-    # Modelo 7: Wellbeing
-    wellbeing_data = joblib.load("backend/ml/models/wellbeing_analysis.pkl")
-    wellbeing_analyzer = WellbeingAnalyzer()
-    wellbeing_analyzer.correlations = wellbeing_data['correlations']
-
-    # Modelo 8: Grade
-    grade_data = joblib.load("backend/ml/models/grade_model.pkl")
-    grade_predictor = GradePredictor()
-    grade_predictor.model = grade_data['model']
-    grade_predictor.scaler = grade_data['scaler']
-
-    # Modelo 9: Anomaly
-    anomaly_data = joblib.load("backend/ml/models/anomaly_model.pkl")
-    anomaly_detector = AnomalyDetector()
-    anomaly_detector.model = anomaly_data['model']
-
-    print("Todos os modelos ML carregados com sucesso!")
-
-except Exception as e:
-    print(f"Erro ao carregar modelos: {e}")
-    print("Execute o treinamento primeiro: python backend/ml/models/all_models.py")
+
+# ===== MODELOS (carregados sob demanda) =====
+# Ensembles de árvores e scalers são compilados para arrays numpy na carga
+# (ver compiled_trees); demais modelos seguem como estão.
+
+def _build_burnout(data):
+    model = BurnoutPredictor()
+    model.model = compiled_or_original(data['model'])
+    model.scaler = compiled_or_original(data['scaler'])
+    model.feature_names = data['feature_names']
+    return model
+
+
+def _build_recommender(data):
+    model = CourseRecommender()
+    model.course_profiles = data['course_profiles']
+    if 'item_ids' not in data:
+        # artefato antigo (similaridade densa U x U): só popularidade até o próximo treino
+        model.item_ids = np.asarray(model.course_profiles.index, dtype=object)
+        model.rank_popular()
+        return model
+    for key in ('item_ids', 'user_ids', 'neighbour_idx', 'neighbour_sim', 'candidate_idx',
+                'candidate_score', 'enrolled_indptr', 'enrolled_idx', 'popular_idx'):
+        setattr(model, key, data[key])
+    return model
+
+
+def _build_performance(data):
+    model = PerformancePredictor()
+    model.model = compiled_or_original(data['model'])
+    model.scaler = compiled_or_original(data['scaler'])
+    return model
+
+
+def _build_scheduler(data):
+    model = ScheduleOptimizer()
+    model.patterns = data['patterns']
+    return model
+
+
+def _build_clustering(data):
+    # centróides + normalização em arrays; atribuição sem sklearn
+    return ProfileClusterer.from_artifact(data)
+
+
+def _build_churn(data):
+    model = ChurnDetector()
+    model.model = compiled_or_original(data['model'])
+    model.scaler = compiled_or_original(data['scaler'])
+    return model
+
+
+def _build_wellbeing(data):
+    model = WellbeingAnalyzer()
+    model.correlations = data['correlations']
+    return model
+
+
+def _build_grade(data):
+    model = GradePredictor()
+    model.model = compiled_or_original(data['model'])
+    model.scaler = compiled_or_original(data['scaler'])
+    return model
+
+
+def _build_anomaly(data):
+    model = AnomalyDetector()
+    model.model = compiled_or_original(data['model'])
+    return model
+
+
+artifacts = ArtifactStore()
+registry = ModelRegistry(store=artifacts)
+registry.register("burnout", "burnout_model.pkl", _build_burnout)
+registry.register("recommender", "recommender_model.pkl", _build_recommender)
+registry.register("performance", "performance_model.pkl", _build_performance)
+registry.register("scheduler", "schedule_model.pkl", _build_scheduler)
+registry.register("clustering", "clustering_model.pkl", _build_clustering)
+registry.register("churn", "churn_model.pkl", _build_churn)
+registry.register("wellbeing", "wellbeing_analysis.pkl", _build_wellbeing)
+registry.register("grade", "grade_model.pkl", _build_grade)
+registry.register("anomaly", "anomaly_model.pkl", _build_anomaly)
+
+
+_version_watcher: Optional[asyncio.Task] = None
+
+
+async def _watch_versions() -> None:
+    """Troca os modelos quando outra versão é promovida (por outro worker ou pelo treino)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(ML_VERSION_POLL_SECONDS)
+        try:
+            await loop.run_in_executor(None, registry.sync)
+        except Exception as exc:
+            print(f"Erro ao verificar versão dos modelos ML: {exc}")
+
+
+@router.on_event("startup")
+async def warmup_models():
+    """Pré-carrega os modelos listados em ML_WARMUP ("all" ou nomes separados por vírgula)."""
+    global _version_watcher
+    if ML_VERSION_POLL_SECONDS > 0:
+        _version_watcher = asyncio.create_task(_watch_versions())
+    targets = warmup_targets()
+    if targets == []:
+        return
+    loop = asyncio.get_running_loop()
+    loaded = await loop.run_in_executor(None, registry.warmup, targets)
+    print(f"Warmup de modelos ML: {loaded}")
+
+
+@router.on_event("shutdown")
+async def stop_version_watcher():
+    if _version_watcher is not None:
+        _version_watcher.cancel()
 
 
 # ===== ENDPOINTS =====
 
 @router.get("/health")
 async def health_check():
-    """Health check dos modelos ML"""
+    """Health check dos modelos ML (não dispara carregamentos)"""
+    models = registry.status()
+    failed = [name for name, info in models.items() if info["status"] == "error"]
     return {
-        "status": "ok",
-        "models_loaded": {
-            "burnout": burnout_model.model is not None,
-            "recommender": recommender.course_profiles is not None,
-            "performance": perf_predictor.model is not None,
-            "scheduler": scheduler.patterns is not None,
-            "clustering": clusterer.model is not None,
-            "churn": churn_detector.model is not None,
-            "wellbeing": wellbeing_analyzer.correlations is not None,
-            "grade": grade_predictor.model is not None,
-            "anomaly": anomaly_detector.model is not None,
-        }
+        "status": "degraded" if failed else "ok",
+        "version": registry.version,
+        "models_loaded": {name: info["status"] == "loaded" for name, info in models.items()},
+        "models": models,
+        "executor": ml_executor.status(),
+        "cpu": cpu_budget.status(),
     }
 
 
+@router.post("/models/warmup", dependencies=[Depends(require_admin)])
+async def warmup(models: Optional[str] = None):
+    """Carrega os modelos informados (separados por vírgula) ou todos, tentando de novo os que falharam."""
+    targets = warmup_targets(models or "all")
+    loop = asyncio.get_running_loop()
+    loaded = await loop.run_in_executor(None, lambda: registry.warmup(targets, retry_failed=True))
+    return {"loaded": loaded, "models": registry.status()}
+
+
+@router.get("/models/versions", dependencies=[Depends(require_admin)])
+async def list_model_versions():
+    """Versões treinadas (manifest) e a versão servida por este processo."""
+    return {
+        "active": registry.version,
+        "pointer": artifacts.pointer(),
+        "versions": artifacts.versions(),
+    }
+
+
+async def _activate_pointer() -> Dict:
+    """Carrega a versão do ponteiro por completo e troca a geração deste processo."""
+    loop = asyncio.get_running_loop()
+    version = artifacts.current()
+    try:
+        loaded = await loop.run_in_executor(None, registry.activate, version)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return {"version": version, "loaded": loaded}
+
+
+def _assign_all_profiles() -> int:
+    clusterer = registry.get("clustering")
+    # instância própria: roda fora do event loop, em paralelo às rotas que usam `dp`
+    user_features = DataPreparation(dp.db_path).prepare_user_features()
+    conn = sqlite3.connect(dp.db_path)
+    try:
+        return clusterer.assign_all(conn, user_features)
+    finally:
+        conn.close()
+
+
+def _reassign_profiles_later() -> None:
+    """Após trocar de versão, regrava os perfis em background (nomes/centróides mudam)."""
+    def job():
+        try:
+            _assign_all_profiles()
+        except Exception as exc:
+            logging.warning("Falha ao regravar perfis de aprendizado: %s", exc)
+    asyncio.get_running_loop().run_in_executor(None, job)
+
+
+@router.post("/models/promote/{version}", dependencies=[Depends(require_admin)])
+async def promote_model_version(version: str):
+    """
+    Promove uma versão: valida que todos os modelos carregam, grava o
+    ponteiro e troca os modelos sem reiniciar. Outros workers trocam no
+    próximo ciclo de ML_VERSION_POLL_SECONDS.
+    """
+    previous = artifacts.pointer()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, registry.activate, version)
+        artifacts.promote(version)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    _reassign_profiles_later()
+    return {"promoted": version, "previous": previous.get("version"), "models": registry.status()}
+
+
+@router.post("/models/rollback", dependencies=[Depends(require_admin)])
+async def rollback_model_version():
+    """Volta para a versão promovida anteriormente."""
+    try:
+        state = artifacts.rollback()
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    result = await _activate_pointer()
+    _reassign_profiles_later()
+    return {"rolledBackTo": state["version"], **result}
+
+
+@router.post("/models/assign-profiles", dependencies=[Depends(require_admin)])
+async def assign_profiles():
+    """Regrava o perfil de aprendizado de todos os usuários com o clustering ativo."""
+    loop = asyncio.get_running_loop()
+    try:
+        assigned = await loop.run_in_executor(None, _assign_all_profiles)
+    except ModelUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return {"assigned": assigned, "version": registry.version}
+
+
+# ===== TRABALHO DE CPU =====
+# ETL em pandas e predições rodam no ml_executor (fora do event loop, com fila
+# limitada e tempo limite); as funções ficam no nível do módulo para servir
+# também ao ML_EXECUTOR=process.
+
+class RecordNotFound(Exception):
+    """Usuário, matrícula ou equipe inexistente (404)."""
+
+
+# DataPreparation guarda conexão, tabelas e cache de features por instância e
+# não é thread-safe: cada thread do ml_executor usa a sua, então os ETLs rodam
+# em paralelo (o snapshot em disco é compartilhado entre elas)
+_thread_dp = threading.local()
+_pool_synced_at = 0.0
+
+
+def _prepared(name: str) -> pd.DataFrame:
+    instance = getattr(_thread_dp, "dp", None)
+    if instance is None:
+        instance = _thread_dp.dp = DataPreparation(dp.db_path)
+    return getattr(instance, name)()
+
+
+def _user_row(user_id: str) -> pd.DataFrame:
+    user_features = _prepared('prepare_user_features')
+    user_data = user_features[user_features['id'] == user_id]
+    if len(user_data) == 0:
+        raise RecordNotFound("Usuario nao encontrado")
+    return user_data
+
+
+def _enrollment_row(enrollment_id: str) -> pd.DataFrame:
+    enrollment_features = _prepared('prepare_enrollment_features')
+    enrollment_data = enrollment_features[enrollment_features['id'] == enrollment_id]
+    if len(enrollment_data) == 0:
+        raise RecordNotFound("Matricula nao encontrada")
+    return enrollment_data
+
+
+def _follow_pointer() -> None:
+    """Nos processos do pool (sem o observador de versões) segue o ponteiro a cada ML_VERSION_POLL_SECONDS."""
+    global _pool_synced_at
+    if multiprocessing.parent_process() is None or ML_VERSION_POLL_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if now - _pool_synced_at >= ML_VERSION_POLL_SECONDS:
+        _pool_synced_at = now
+        registry.sync()
+
+
+def _pool_model(name: str):
+    _follow_pointer()
+    return registry.get(name)
+
+
+def _predict_burnout(user_id: str) -> Dict:
+    burnout_model = _pool_model("burnout")
+    return burnout_model.predict(_user_row(user_id))
+
+
+def _recommend_courses(user_id: str, n: int) -> Dict:
+    recommender = _pool_model("recommender")
+    return {
+        "user_id": user_id,
+        "recommendations": recommender.recommend(user_id, n=n)
+    }
+
+
+def _predict_performance(user_id: str) -> Dict:
+    perf_predictor = _pool_model("performance")
+    return perf_predictor.predict(_user_row(user_id))
+
+
+def _optimize_schedule(user_id: str) -> Dict:
+    scheduler = _pool_model("scheduler")
+    return scheduler.recommend_schedule(user_id)
+
+
+def _user_profile(user_id: str) -> Dict:
+    stored = _stored_profile(user_id)
+    if stored is not None:
+        return stored
+
+    # usuário ainda sem perfil gravado (criado depois do último assign_all)
+    clusterer = _pool_model("clustering")
+    result = clusterer.predict(_user_row(user_id))
+    _store_profile(user_id, result)
+    return result
+
+
+def _predict_churn(enrollment_id: str) -> Dict:
+    churn_detector = _pool_model("churn")
+    return churn_detector.predict(_enrollment_row(enrollment_id))
+
+
+def _wellbeing_insights(user_id: str) -> Dict:
+    wellbeing_analyzer = _pool_model("wellbeing")
+    return {
+        "user_id": user_id,
+        "insights": wellbeing_analyzer.get_insights(_user_row(user_id)),
+        "correlations": wellbeing_analyzer.correlations
+    }
+
+
+def _predict_grade(enrollment_id: str) -> Dict:
+    grade_predictor = _pool_model("grade")
+    return grade_predictor.predict(_enrollment_row(enrollment_id))
+
+
+def _detect_anomalies(user_id: str) -> Dict:
+    anomaly_detector = _pool_model("anomaly")
+    return anomaly_detector.predict(_user_row(user_id))
+
+
+def _team_dashboard(team_id: str) -> Dict:
+    burnout_model = _pool_model("burnout")
+    team_features = _prepared('prepare_team_features')
+    team_data = team_features[team_features['id'] == team_id]
+
+    if len(team_data) == 0:
+        raise RecordNotFound("Equipe nao encontrada")
+
+    # Métricas agregadas
+    team_stats = team_data.iloc[0].to_dict()
+
+    # Colaboradores em risco
+    user_features = _prepared('prepare_user_features')
+    team_users = user_features[user_features['idEquipe'] == team_id]
+
+    at_risk = []
+    for _, user in team_users.iterrows():
+        burnout_result = burnout_model.predict(pd.DataFrame([user]))
+        if burnout_result['risk_level'] in ['alto', 'critico']:
+            at_risk.append({
+                'user_id': user['id'],
+                'risk_level': burnout_result['risk_level'],
+                'risk_score': burnout_result['risk_score']
+            })
+
+    return {
+        "team_id": team_id,
+        "team_name": team_stats.get('nome', 'Unknown'),
+        "total_members": int(team_stats.get('total_colaboradores', 0)),
+        "avg_xp": float(team_stats.get('totalXp_mean', 0)),
+        "avg_focus": float(team_stats.get('team_nivelFoco', 0)),
+        "avg_stress": float(team_stats.get('team_nivelEstresse', 0)),
+        "members_at_risk": at_risk,
+        "risk_count": len(at_risk)
+    }
+
+
+def _comprehensive_analysis(user_id: str) -> Dict:
+    user_data = _user_row(user_id)
+
+    # Executar todos os modelos da mesma versão; um modelo indisponível
+    # não derruba os demais
+    _follow_pointer()
+    models = registry.generation()
+
+    def run(name, call):
+        try:
+            return call(models.get(name))
+        except ModelUnavailable as exc:
+            unavailable.append(name)
+            return {"error": str(exc)}
+
+    unavailable = []
+    analysis = {
+        "user_id": user_id,
+        "burnout": run("burnout", lambda m: m.predict(user_data)),
+        "performance": run("performance", lambda m: m.predict(user_data)),
+        "profile": run("clustering", lambda m: m.predict(user_data)),
+        "schedule": run("scheduler", lambda m: m.recommend_schedule(user_id)),
+        "anomaly": run("anomaly", lambda m: m.predict(user_data)),
+        "wellbeing": run("wellbeing", lambda m: {"insights": m.get_insights(user_data)}),
+        "courses": run("recommender", lambda m: m.recommend(user_id, n=3)),
+    }
+    analysis["unavailable_models"] = unavailable
+    return analysis
+
+
+async def _offload(fn, *args):
+    """
+    Executa `fn` no ml_executor. Fila cheia e tempo esgotado sobem para os
+    handlers do app (503 com Retry-After / 504); o resto vira 503/404/500.
+    """
+    try:
+        return await ml_executor.run(fn, *args)
+    except (ExecutorSaturated, ExecutorTimeout):
+        raise
+    except ModelUnavailable as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{exc}. Execute o treinamento: python backend/ml/models/all_models.py",
+        )
+    except RecordNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/predict-burnout/{user_id}")
 async def predict_burnout(user_id: str):
     """
@@ -116,18 +479,7 @@ async def predict_burnout(user_id: str):
         - probabilities: Probabilidades de cada nível
         - recommendations: Recomendações personalizadas
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
-
-        result = burnout_model.predict(user_data)
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_predict_burnout, user_id)
 
 
 @router.post("/recommend-courses/{user_id}")
@@ -141,14 +493,7 @@ async def recommend_courses(user_id: str, n: int = 5):
     Returns:
         Lista de cursos recomendados com score
     """
-    try:
-        recommendations = recommender.recommend(user_id, n=n)
-        return {
-            "user_id": user_id,
-            "recommendations": recommendations
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_recommend_courses, user_id, n)
 
 
 @router.post("/predict-performance/{user_id}")
@@ -161,18 +506,7 @@ async def predict_performance(user_id: str):
         - predicted_xp_next_month: XP previsto
         - growth_estimate: Crescimento estimado
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
-
-        result = perf_predictor.predict(user_data)
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_predict_performance, user_id)
 
 
 @router.post("/optimize-schedule/{user_id}")
@@ -185,11 +519,7 @@ async def optimize_schedule(user_id: str):
         - worst_study_hour: Pior hora
         - recommendation: Texto explicativo
     """
-    try:
-        result = scheduler.recommend_schedule(user_id)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_optimize_schedule, user_id)
 
 
 @router.get("/user-profile/{user_id}")
@@ -201,18 +531,40 @@ async def get_user_profile(user_id: str):
         - profile_cluster: ID do cluster
         - profile_name: Nome do perfil (ex: "High Performer Consistente")
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
+    return await _offload(_user_profile, user_id)
 
-        result = clusterer.predict(user_data)
-        return result
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def _stored_profile(user_id: str) -> Optional[Dict]:
+    """Perfil gravado em `usuarios` (None se ausente ou coluna ainda não migrada)."""
+    try:
+        conn = sqlite3.connect(dp.db_path)
+        try:
+            row = conn.execute(
+                "SELECT perfilAprendizado, perfilCluster FROM usuarios WHERE id = ?", (user_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if row is None or row[0] is None:
+        return None
+    return {'user_id': user_id, 'profile_cluster': row[1], 'profile_name': row[0]}
+
+
+def _store_profile(user_id: str, result: Dict) -> None:
+    try:
+        conn = sqlite3.connect(dp.db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE usuarios SET perfilAprendizado = ?, perfilCluster = ?, perfilAtualizadoEm = ? "
+                    "WHERE id = ?",
+                    (result['profile_name'], result['profile_cluster'], epoch_ms(), user_id),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
 
 
 @router.post("/predict-churn/{enrollment_id}")
@@ -224,18 +576,7 @@ async def predict_churn(enrollment_id: str):
         - churn_probability: Probabilidade de 0-1
         - risk_level: baixo/medio/alto
     """
-    try:
-        enrollment_features = dp.prepare_enrollment_features()
-        enrollment_data = enrollment_features[enrollment_features['id'] == enrollment_id]
-
-        if len(enrollment_data) == 0:
-            raise HTTPException(status_code=404, detail="Matricula nao encontrada")
-
-        result = churn_detector.predict(enrollment_data)
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_predict_churn, enrollment_id)
 
 
 @router.get("/wellbeing-insights/{user_id}")
@@ -246,22 +587,7 @@ async def get_wellbeing_insights(user_id: str):
     Returns:
         Lista de insights personalizados
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
-
-        insights = wellbeing_analyzer.get_insights(user_data)
-        return {
-            "user_id": user_id,
-            "insights": insights,
-            "correlations": wellbeing_analyzer.correlations
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_wellbeing_insights, user_id)
 
 
 @router.post("/predict-grade/{enrollment_id}")
@@ -273,18 +599,7 @@ async def predict_grade(enrollment_id: str):
         - predicted_grade: Nota prevista (0-100)
         - confidence: Nível de confiança
     """
-    try:
-        enrollment_features = dp.prepare_enrollment_features()
-        enrollment_data = enrollment_features[enrollment_features['id'] == enrollment_id]
-
-        if len(enrollment_data) == 0:
-            raise HTTPException(status_code=404, detail="Matricula nao encontrada")
-
-        result = grade_predictor.predict(enrollment_data)
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_predict_grade, enrollment_id)
 
 
 @router.get("/anomalies/{user_id}")
@@ -297,18 +612,7 @@ async def detect_anomalies(user_id: str):
         - anomaly_score: Score de anomalia
         - warning: Mensagem de alerta
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
-
-        result = anomaly_detector.predict(user_data)
-        return result
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_detect_anomalies, user_id)
 
 
 @router.get("/team-dashboard/{team_id}")
@@ -319,43 +623,7 @@ async def get_team_dashboard(team_id: str):
     Returns:
         Estatísticas agregadas da equipe
     """
-    try:
-        team_features = dp.prepare_team_features()
-        team_data = team_features[team_features['id'] == team_id]
-
-        if len(team_data) == 0:
-            raise HTTPException(status_code=404, detail="Equipe nao encontrada")
-
-        # Métricas agregadas
-        team_stats = team_data.iloc[0].to_dict()
-
-        # Colaboradores em risco
-        user_features = dp.prepare_user_features()
-        team_users = user_features[user_features['idEquipe'] == team_id]
-
-        at_risk = []
-        for _, user in team_users.iterrows():
-            burnout_result = burnout_model.predict(pd.DataFrame([user]))
-            if burnout_result['risk_level'] in ['alto', 'critico']:
-                at_risk.append({
-                    'user_id': user['id'],
-                    'risk_level': burnout_result['risk_level'],
-                    'risk_score': burnout_result['risk_score']
-                })
-
-        return {
-            "team_id": team_id,
-            "team_name": team_stats.get('nome', 'Unknown'),
-            "total_members": int(team_stats.get('total_colaboradores', 0)),
-            "avg_xp": float(team_stats.get('totalXp_mean', 0)),
-            "avg_focus": float(team_stats.get('team_nivelFoco', 0)),
-            "avg_stress": float(team_stats.get('team_nivelEstresse', 0)),
-            "members_at_risk": at_risk,
-            "risk_count": len(at_risk)
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_team_dashboard, team_id)
 
 
 @router.post("/comprehensive-analysis/{user_id}")
@@ -366,31 +634,7 @@ async def comprehensive_analysis(user_id: str):
     Returns:
         Todos os insights agregados
     """
-    try:
-        user_features = dp.prepare_user_features()
-        user_data = user_features[user_features['id'] == user_id]
-
-        if len(user_data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario nao encontrado")
-
-        # Executar todos os modelos
-        analysis = {
-            "user_id": user_id,
-            "burnout": burnout_model.predict(user_data),
-            "performance": perf_predictor.predict(user_data),
-            "profile": clusterer.predict(user_data),
-            "schedule": scheduler.recommend_schedule(user_id),
-            "anomaly": anomaly_detector.predict(user_data),
-            "wellbeing": {
-                "insights": wellbeing_analyzer.get_insights(user_data)
-            },
-            "courses": recommender.recommend(user_id, n=3)
-        }
-
-        return analysis
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _offload(_comprehensive_analysis, user_id)
 
 
 # Exportar router
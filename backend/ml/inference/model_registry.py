@@ -0,0 +1,277 @@
+"""
+Model Registry
+==============
+
+Carregamento preguiçoso dos artefatos de ML servidos pela API.
+
+Cada modelo é registrado com o caminho do pickle e uma função que monta o
+objeto a partir do conteúdo carregado. Nada é lido no import: o primeiro
+acesso (ou um `warmup`) carrega o artefato, e uma falha afeta apenas aquele
+modelo, que passa a responder como indisponível.
+
+Os pickles são lidos com `joblib.load(mmap_mode='r')`: os arrays numpy
+guardados diretamente no artefato (matriz de similaridade, centróides,
+médias/escalas dos scalers) ficam mapeados do disco, e essas páginas são
+compartilhadas entre workers do uvicorn. As árvores não: o `__setstate__`
+das árvores do sklearn copia os nós para memória própria e os ensembles
+compilados (`compiled_trees`) alocam arrays novos, então cada processo tem
+a sua cópia das florestas e dos boosters.
+
+Os modelos vêm da versão ativa do `ArtifactStore` (ver `backend/ml/artifacts.py`)
+e são trocados em bloco quando outra versão é promovida.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import joblib
+
+from backend.ml.artifacts import ArtifactStore
+
+ML_MODEL_DIR = os.getenv("ML_MODEL_DIR", "backend/ml/models")
+# "0" desliga o mmap (ex.: sistemas de arquivos que não suportam)
+ML_MMAP = os.getenv("ML_MMAP", "1") != "0"
+# "all", lista separada por vírgula ou vazio (sem warmup)
+ML_WARMUP = os.getenv("ML_WARMUP", "")
+# intervalo para checar se outra versão foi promovida (0 desliga)
+ML_VERSION_POLL_SECONDS = float(os.getenv("ML_VERSION_POLL_SECONDS", "30"))
+
+
+class ModelUnavailable(RuntimeError):
+    """O modelo não pôde ser carregado (arquivo ausente ou inválido)."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"Modelo '{name}' indisponível: {reason}")
+        self.name = name
+        self.reason = reason
+
+    def __reduce__(self):
+        # atravessa o pool de processos do ML_EXECUTOR com os mesmos argumentos
+        return (ModelUnavailable, (self.name, self.reason))
+
+
+@dataclass
+class ModelEntry:
+    name: str
+    filename: str
+    build: Callable[[Any], Any]
+    instance: Any = None
+    error: Optional[str] = None
+    loaded_at: Optional[datetime] = None
+    load_seconds: Optional[float] = None
+    size_bytes: Optional[int] = None
+    version: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+def file_version(path: str) -> str:
+    """Hash curto do conteúdo do artefato (muda a cada novo treino)."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelGeneration:
+    """
+    Conjunto de modelos de um diretório de artefatos (uma versão).
+
+    Uma geração nunca muda de diretório: a troca de versão cria outra
+    geração, então uma requisição que segura uma referência vê sempre os
+    modelos de uma única versão.
+    """
+
+    def __init__(self, model_dir: str, version: Optional[str], mmap: bool,
+                 specs: Dict[str, Tuple[str, Callable[[Any], Any]]]):
+        self.model_dir = model_dir
+        self.version = version
+        self.mmap = mmap
+        self._entries: Dict[str, ModelEntry] = {
+            name: ModelEntry(name=name, filename=filename, build=build)
+            for name, (filename, build) in specs.items()
+        }
+
+    def _load(self, entry: ModelEntry) -> None:
+        path = os.path.join(self.model_dir, entry.filename)
+        started = time.perf_counter()
+        try:
+            data = joblib.load(path, mmap_mode="r" if self.mmap else None)
+            instance = entry.build(data)
+        except Exception as exc:
+            entry.error = f"{type(exc).__name__}: {exc}"
+            print(f"Erro ao carregar modelo {entry.name} ({path}): {entry.error}")
+            return
+        entry.instance = instance
+        entry.error = None
+        entry.load_seconds = round(time.perf_counter() - started, 4)
+        entry.loaded_at = datetime.now(timezone.utc)
+        entry.size_bytes = os.path.getsize(path)
+        entry.version = self.version or file_version(path)
+
+    def get(self, name: str) -> Any:
+        """Retorna o modelo, carregando-o no primeiro acesso."""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ModelUnavailable(name, "não registrado")
+        if entry.instance is None and entry.error is None:
+            with entry.lock:
+                if entry.instance is None and entry.error is None:
+                    self._load(entry)
+        if entry.instance is None:
+            raise ModelUnavailable(name, entry.error or "não carregado")
+        return entry.instance
+
+    def reset(self, name: Optional[str] = None) -> None:
+        for entry in self._select([name] if name else None):
+            with entry.lock:
+                entry.instance = None
+                entry.error = None
+
+    def warmup(self, names: Optional[Iterable[str]] = None, retry_failed: bool = False) -> Dict[str, bool]:
+        result = {}
+        for entry in self._select(names):
+            if retry_failed and entry.error is not None:
+                self.reset(entry.name)
+            try:
+                self.get(entry.name)
+                result[entry.name] = True
+            except ModelUnavailable:
+                result[entry.name] = False
+        return result
+
+    def _select(self, names: Optional[Iterable[str]]) -> List[ModelEntry]:
+        if names is None:
+            return list(self._entries.values())
+        return [self._entries[name] for name in names if name in self._entries]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for entry in self._entries.values():
+            if entry.instance is not None:
+                state = "loaded"
+            elif entry.error is not None:
+                state = "error"
+            else:
+                state = "not_loaded"
+            report[entry.name] = {
+                "status": state,
+                "file": os.path.join(self.model_dir, entry.filename),
+                "version": entry.version,
+                "sizeBytes": entry.size_bytes,
+                "loadSeconds": entry.load_seconds,
+                "loadedAt": entry.loaded_at.isoformat() if entry.loaded_at else None,
+                "error": entry.error,
+            }
+        return report
+
+
+class ModelRegistry:
+    """
+    Registro de modelos carregados sob demanda, com status por modelo.
+
+    Com um `ArtifactStore`, serve a versão apontada por `current.json`;
+    sem versões promovidas, usa os pickles soltos de `model_dir`. A troca de
+    versão (`activate`) carrega todos os modelos da nova geração antes de
+    substituir a referência, então requisições em andamento nunca veem uma
+    versão carregada pela metade nem pagam o cold start.
+    """
+
+    def __init__(self, model_dir: str = ML_MODEL_DIR, mmap: bool = ML_MMAP,
+                 store: Optional[ArtifactStore] = None):
+        self.model_dir = model_dir
+        self.mmap = mmap
+        self.store = store
+        self._specs: Dict[str, Tuple[str, Callable[[Any], Any]]] = {}
+        self._generation: Optional[ModelGeneration] = None
+        self._swap_lock = threading.Lock()
+        # versão do ponteiro que falhou ao carregar (não é tentada de novo no sync)
+        self._rejected: Optional[str] = None
+
+    def register(self, name: str, filename: str, build: Callable[[Any], Any]) -> None:
+        """`build` recebe o conteúdo do pickle e devolve o objeto pronto para uso."""
+        self._specs[name] = (filename, build)
+        self._generation = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def _new_generation(self, version: Optional[str]) -> ModelGeneration:
+        model_dir = self.store.path(version) if version else self.model_dir
+        return ModelGeneration(model_dir, version, self.mmap, self._specs)
+
+    def generation(self) -> ModelGeneration:
+        """Geração ativa; segure a referência para usar vários modelos da mesma versão."""
+        generation = self._generation
+        if generation is None:
+            with self._swap_lock:
+                if self._generation is None:
+                    version = self.store.current() if self.store else None
+                    self._generation = self._new_generation(version)
+                generation = self._generation
+        return generation
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.generation().version
+
+    def get(self, name: str) -> Any:
+        return self.generation().get(name)
+
+    def activate(self, version: Optional[str]) -> Dict[str, bool]:
+        """
+        Carrega a versão por completo e só então a torna ativa. Se algum
+        modelo falhar, a geração atual continua servindo e levanta ValueError.
+        """
+        with self._swap_lock:
+            candidate = self._new_generation(version)
+            loaded = candidate.warmup()
+            failed = [name for name, ok in loaded.items() if not ok]
+            if failed:
+                raise ValueError(f"Versão {version} não carregou: {failed}")
+            self._generation = candidate
+        return loaded
+
+    def sync(self) -> bool:
+        """Ativa a versão do ponteiro se ela mudou (ex.: promovida por outro processo)."""
+        if self.store is None:
+            return False
+        version = self.store.current()
+        if version == self.generation().version or version == self._rejected:
+            return False
+        try:
+            self.activate(version)
+        except ValueError as exc:
+            self._rejected = version
+            print(f"Erro ao trocar modelos ML: {exc}")
+            return False
+        print(f"Modelos ML trocados para a versão {version}")
+        return True
+
+    def reload(self, name: Optional[str] = None) -> None:
+        """Descarta o(s) modelo(s) carregado(s) e erros; o próximo acesso relê do disco."""
+        self.generation().reset(name)
+
+    def warmup(self, names: Optional[Iterable[str]] = None, retry_failed: bool = False) -> Dict[str, bool]:
+        """Carrega antecipadamente os modelos pedidos (todos por padrão)."""
+        return self.generation().warmup(names, retry_failed)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de cada modelo, sem disparar carregamentos."""
+        return self.generation().status()
+
+
+def warmup_targets(setting: str = ML_WARMUP) -> Optional[List[str]]:
+    """Interpreta ML_WARMUP: [] sem warmup, None para todos, ou a lista informada."""
+    value = setting.strip()
+    if not value:
+        return []
+    if value.lower() == "all":
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
@@ -19,27 +19,77 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, accuracy_score
-from sklearn.cluster import KMeans, DBSCAN
+from sklearn.cluster import MiniBatchKMeans, DBSCAN
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, IsolationForest
 import xgboost as xgb
 import lightgbm as lgb
 from scipy import stats
 from scipy.stats import pearsonr
 import joblib
+import os
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
 import sys
 sys.path.append('.')
-from backend.ml.data_preparation import DataPreparation
+
+# diretório padrão dos pickles; o treino completo grava em uma versão nova
+MODEL_DIR = "backend/ml/models"
 
 
 class CourseRecommender:
-    """2. Sistema de Recomendação de Cursos"""
+    """
+    2. Sistema de Recomendação de Cursos
+
+    Filtragem colaborativa item-item com feedback implícito sobre uma matriz
+    esparsa (CSR) usuários x cursos. Guarda só os `ITEM_NEIGHBOURS` vizinhos
+    mais similares de cada curso e os `USER_CANDIDATES` melhores candidatos
+    por usuário, já sem os cursos em que ele está matriculado. Memória
+    O(usuários + cursos), sem matriz densa U x U.
+    """
+
+    output_dir = MODEL_DIR
+
+    ITEM_NEIGHBOURS = 50
+    USER_CANDIDATES = 20
+    # usuários processados por bloco no cálculo dos candidatos
+    BATCH_USERS = 10000
 
     def __init__(self):
         self.user_profiles = None
         self.course_profiles = None
+        self.item_ids = np.array([], dtype=object)
+        self.user_ids = np.array([], dtype=object)
+        self.neighbour_idx = np.zeros((0, 0), dtype=np.int32)
+        self.neighbour_sim = np.zeros((0, 0), dtype=np.float32)
+        self.candidate_idx = np.zeros((0, 0), dtype=np.int32)
+        self.candidate_score = np.zeros((0, 0), dtype=np.float32)
+        self.enrolled_indptr = np.zeros(1, dtype=np.int64)
+        self.enrolled_idx = np.array([], dtype=np.int32)
+        self.popular_idx = np.array([], dtype=np.int32)
+        self._user_rows = None
+        self._item_rows = None
+
+    @staticmethod
+    def _top_k(matrix, k: int):
+        """Top-k por linha de uma matriz CSR: (índices, valores) com -1/0 de preenchimento."""
+        n_rows = matrix.shape[0]
+        idx = np.full((n_rows, k), -1, dtype=np.int32)
+        val = np.zeros((n_rows, k), dtype=np.float32)
+        for row in range(n_rows):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == end:
+                continue
+            cols = matrix.indices[start:end]
+            data = matrix.data[start:end]
+            if len(data) > k:
+                keep = np.argpartition(-data, k - 1)[:k]
+                cols, data = cols[keep], data[keep]
+            order = np.argsort(-data, kind='stable')
+            idx[row, :len(order)] = cols[order]
+            val[row, :len(order)] = data[order]
+        return idx, val
 
     def train(self, enrollment_df: pd.DataFrame):
         """Treina sistema de recomendação usando Collaborative Filtering"""
@@ -47,61 +97,161 @@ class CourseRecommender:
         print("MODELO 2: COURSE RECOMMENDER")
         print("="*60)
 
-        # Criar matriz user-course
-        pivot = enrollment_df.pivot_table(
-            index='idUsuario',
-            columns='idCurso',
-            values='progresso',
-            fill_value=0
-        )
+        from scipy import sparse
 
-        # Similaridade entre usuários (cosine similarity)
-        from sklearn.metrics.pairwise import cosine_similarity
-        user_sim = cosine_similarity(pivot)
-        self.user_similarity_df = pd.DataFrame(
-            user_sim,
-            index=pivot.index,
-            columns=pivot.index
+        # Matriz esparsa user-course; peso implícito cresce com o progresso
+        users = pd.Categorical(enrollment_df['idUsuario'])
+        courses = pd.Categorical(enrollment_df['idCurso'])
+        weights = 1.0 + enrollment_df['progresso'].fillna(0).clip(0, 100).to_numpy(dtype=np.float32) / 100.0
+        matrix = sparse.csr_matrix(
+            (weights, (users.codes, courses.codes)),
+            shape=(len(users.categories), len(courses.categories)),
+            dtype=np.float32,
+        )
+        # matrículas repetidas do mesmo par somam: volta ao maior peso possível
+        matrix.data = np.minimum(matrix.data, 2.0)
+
+        self.user_ids = np.asarray(users.categories, dtype=object)
+        self.item_ids = np.asarray(courses.categories, dtype=object)
+
+        # Similaridade cosseno item-item: colunas normalizadas, X^T X esparso
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = matrix.multiply(1.0 / norms).tocsr()
+        item_sim = (normalized.T @ normalized).tocsr()
+        item_sim.setdiag(0)
+        item_sim.eliminate_zeros()
+        k_items = min(self.ITEM_NEIGHBOURS, max(1, len(self.item_ids) - 1))
+        self.neighbour_idx, self.neighbour_sim = self._top_k(item_sim, k_items)
+
+        # Candidatos por usuário: soma das similaridades dos vizinhos dos cursos
+        # matriculados, sem os próprios cursos matriculados
+        rows = np.repeat(np.arange(len(self.item_ids)), k_items)
+        valid = self.neighbour_idx.ravel() >= 0
+        neighbours = sparse.csr_matrix(
+            (self.neighbour_sim.ravel()[valid], (rows[valid], self.neighbour_idx.ravel()[valid])),
+            shape=(len(self.item_ids), len(self.item_ids)),
         )
+        binary = matrix.copy()
+        binary.data[:] = 1.0
+        k_users = min(self.USER_CANDIDATES, len(self.item_ids))
+        idx_blocks, score_blocks = [], []
+        for start in range(0, binary.shape[0], self.BATCH_USERS):
+            block = binary[start:start + self.BATCH_USERS]
+            scores = (block @ neighbours).tocsr()
+            # zera os cursos já matriculados
+            scores = scores - scores.multiply(block)
+            scores.eliminate_zeros()
+            idx, val = self._top_k(scores, k_users)
+            idx_blocks.append(idx)
+            score_blocks.append(val)
+        self.candidate_idx = np.vstack(idx_blocks) if idx_blocks else np.zeros((0, k_users), dtype=np.int32)
+        self.candidate_score = np.vstack(score_blocks) if score_blocks else np.zeros((0, k_users), dtype=np.float32)
+        self.enrolled_indptr = binary.indptr.astype(np.int64)
+        self.enrolled_idx = binary.indices.astype(np.int32)
 
         # Perfis de curso (média de progresso)
         self.course_profiles = enrollment_df.groupby('idCurso').agg({
             'progresso': 'mean',
             'notaFinal': 'mean',
             'status': lambda x: (x == 'CONCLUIDO').sum()
-        }).rename(columns={'status': 'conclusoes'})
+        }).rename(columns={'status': 'conclusoes'}).reindex(self.item_ids)
+        self.rank_popular()
 
-        print(f"Users: {len(pivot)}")
-        print(f"Courses: {len(pivot.columns)}")
-        print(f"Sparsity: {(pivot == 0).sum().sum() / pivot.size:.2%}")
+        density = matrix.nnz / max(1, matrix.shape[0] * matrix.shape[1])
+        print(f"Users: {matrix.shape[0]}")
+        print(f"Courses: {matrix.shape[1]}")
+        print(f"Sparsity: {1 - density:.2%}")
+        print(f"Vizinhos por curso: {k_items} | candidatos por usuário: {k_users}")
 
         self.save()
-        return {'users': len(pivot), 'courses': len(pivot.columns)}
-
-    def recommend(self, user_id: str, n=5) -> list:
-        """Recomenda cursos para um usuário"""
-        if user_id not in self.user_similarity_df.index:
-            return []
-
-        # Usuários similares
-        similar_users = self.user_similarity_df[user_id].sort_values(ascending=False)[1:6]
-
-        recommendations = []
-        for course_id, stats in self.course_profiles.iterrows():
-            recommendations.append({
-                'course_id': course_id,
-                'score': float(stats['progresso']),
-                'avg_grade': float(stats.get('notaFinal', 0)),
-                'popularity': int(stats['conclusoes'])
-            })
+        return {'users': int(matrix.shape[0]), 'courses': int(matrix.shape[1])}
+
+    def rank_popular(self):
+        """Ranking de fallback (usuários sem histórico / poucos candidatos)."""
+        progress = self.course_profiles['progresso'].reindex(self.item_ids).fillna(0).to_numpy()
+        self.popular_idx = np.argsort(-progress, kind='stable').astype(np.int32)
+        self._user_rows = None
+        self._item_rows = None
+
+    def _rows(self):
+        if self._user_rows is None:
+            self._user_rows = {user_id: row for row, user_id in enumerate(self.user_ids)}
+            self._item_rows = {course_id: row for row, course_id in enumerate(self.item_ids)}
+        return self._user_rows, self._item_rows
+
+    def _course(self, item: int, score: float, source: str) -> dict:
+        course_id = self.item_ids[item]
+        stats = self.course_profiles.loc[course_id]
+        avg_grade = stats.get('notaFinal', 0)
+        return {
+            'course_id': course_id,
+            'score': float(score),
+            'avg_grade': float(avg_grade) if pd.notna(avg_grade) else 0.0,
+            'popularity': int(stats['conclusoes']) if pd.notna(stats['conclusoes']) else 0,
+            'source': source,
+        }
 
-        # Ordenar por score
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return recommendations[:n]
+    def _complete(self, picked: list, excluded: set, n: int) -> list:
+        """Completa com os cursos mais populares ainda não escolhidos/matriculados."""
+        chosen = {entry['course_id'] for entry in picked}
+        for item in self.popular_idx:
+            if len(picked) >= n:
+                break
+            course_id = self.item_ids[item]
+            if item in excluded or course_id in chosen:
+                continue
+            picked.append(self._course(item, self.course_profiles.loc[course_id, 'progresso'], 'popular'))
+        return picked
 
-    def save(self, filepath="backend/ml/models/recommender_model.pkl"):
+    def recommend(self, user_id: str, n=5) -> list:
+        """Recomenda cursos para um usuário (sem os que ele já cursa)"""
+        user_rows, _ = self._rows()
+        row = user_rows.get(user_id)
+        if row is None:
+            return self._complete([], set(), n)
+
+        excluded = set(self.enrolled_idx[self.enrolled_indptr[row]:self.enrolled_indptr[row + 1]].tolist())
+        picked = []
+        for item, score in zip(self.candidate_idx[row], self.candidate_score[row]):
+            if item < 0 or len(picked) >= n:
+                break
+            picked.append(self._course(int(item), score, 'similar'))
+        return self._complete(picked, excluded, n)
+
+    def recommend_for_items(self, enrolled_ids, n=5) -> list:
+        """
+        Recomenda a partir de uma lista de cursos matriculados (ex.: matrículas
+        atuais, mais novas que o treino), usando as listas de vizinhos.
+        """
+        _, item_rows = self._rows()
+        enrolled = {item_rows[course_id] for course_id in enrolled_ids if course_id in item_rows}
+        if len(self.neighbour_idx) == 0:
+            # artefato antigo (sem listas de vizinhos): só popularidade
+            return self._complete([], enrolled, n)
+        scores = {}
+        for item in enrolled:
+            for neighbour, sim in zip(self.neighbour_idx[item], self.neighbour_sim[item]):
+                if neighbour < 0:
+                    break
+                if neighbour not in enrolled:
+                    scores[int(neighbour)] = scores.get(int(neighbour), 0.0) + float(sim)
+        best = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))[:n]
+        picked = [self._course(item, score, 'similar') for item, score in best]
+        return self._complete(picked, enrolled, n)
+
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "recommender_model.pkl")
         joblib.dump({
-            'user_similarity': self.user_similarity_df,
+            'item_ids': self.item_ids,
+            'user_ids': self.user_ids,
+            'neighbour_idx': self.neighbour_idx,
+            'neighbour_sim': self.neighbour_sim,
+            'candidate_idx': self.candidate_idx,
+            'candidate_score': self.candidate_score,
+            'enrolled_indptr': self.enrolled_indptr,
+            'enrolled_idx': self.enrolled_idx,
+            'popular_idx': self.popular_idx,
             'course_profiles': self.course_profiles
         }, filepath)
         print(f"Modelo salvo em {filepath}")
@@ -110,6 +260,8 @@ class CourseRecommender:
 class PerformancePredictor:
     """3. Preditor de Performance Futura"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
@@ -176,7 +328,8 @@ class PerformancePredictor:
             'growth_estimate': int(xp_predicted[0] - user_features.iloc[0]['totalXp'])
         }
 
-    def save(self, filepath="backend/ml/models/performance_model.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "performance_model.pkl")
         joblib.dump({'model': self.model, 'scaler': self.scaler}, filepath)
         print(f"Modelo salvo em {filepath}")
 
@@ -184,6 +337,8 @@ class PerformancePredictor:
 class ScheduleOptimizer:
     """4. Otimizador de Horários de Estudo"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.patterns = None
 
@@ -222,18 +377,53 @@ class ScheduleOptimizer:
             'avoid': f"Evite estudar às {int(worst_hour)}h"
         }
 
-    def save(self, filepath="backend/ml/models/schedule_model.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "schedule_model.pkl")
         joblib.dump({'patterns': self.patterns}, filepath)
         print(f"Modelo salvo em {filepath}")
 
 
 class ProfileClusterer:
-    """5. Clustering de Perfis de Aprendizado"""
+    """
+    5. Clustering de Perfis de Aprendizado
+
+    MiniBatchKMeans sobre as features de usuário. Centróides e normalização
+    ficam em arrays simples, então a atribuição é O(k·d) por usuário sem
+    sklearn no caminho quente; `partial_fit` incorpora linhas novas sem
+    retreinar do zero. O perfil de cada usuário é gravado em lote na tabela
+    `usuarios` (`assign_all`), e a consulta vira leitura de coluna.
+    """
+
+    output_dir = MODEL_DIR
+
+    FEATURES = ['totalXp', 'nivel', 'diasSequencia', 'progresso_medio',
+                'nivelFoco_mean', 'nivelEstresse_mean']
+    BATCH_SIZE = 1024
+    # usuários por lote de UPDATE em assign_all
+    ASSIGN_BATCH = 5000
 
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
         self.labels = None
+        self.features = []
+        self.centroids = None       # (k, d) no espaço normalizado
+        self.scaler_mean = None     # (d,)
+        self.scaler_scale = None    # (d,)
+        self.cluster_names = []
+
+    def _matrix(self, df: pd.DataFrame) -> np.ndarray:
+        X = df.reindex(columns=self.features).fillna(0).to_numpy(dtype=np.float64)
+        return (X - self.scaler_mean) / self.scaler_scale
+
+    def _sync_centroids(self):
+        """Copia centróides do MiniBatchKMeans e renomeia os clusters."""
+        self.centroids = np.asarray(self.model.cluster_centers_, dtype=np.float64)
+        # centróide no espaço original = média dos membros do cluster
+        profiles = pd.DataFrame(self.centroids * self.scaler_scale + self.scaler_mean, columns=self.features)
+        profiles.index.name = 'cluster'
+        self.cluster_names = self.name_clusters(profiles)
+        return profiles
 
     def train(self, user_features_df: pd.DataFrame, n_clusters=5):
         """Identifica perfis de aprendizado"""
@@ -241,33 +431,29 @@ class ProfileClusterer:
         print("MODELO 5: PROFILE CLUSTERER")
         print("="*60)
 
-        # Features para clustering
-        features = ['totalXp', 'nivel', 'diasSequencia', 'progresso_medio',
-                   'nivelFoco_mean', 'nivelEstresse_mean']
-        features = [f for f in features if f in user_features_df.columns]
-
-        X = user_features_df[features].fillna(0)
-
-        # Normalizar
-        X_scaled = self.scaler.fit_transform(X)
+        self.features = [f for f in self.FEATURES if f in user_features_df.columns]
+        X = user_features_df[self.features].fillna(0)
 
-        # K-Means
-        self.model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        self.labels = self.model.fit_predict(X_scaled)
+        # Normalizar (congelada depois do treino: partial_fit usa a mesma escala)
+        self.scaler.fit(X)
+        self.scaler_mean = np.asarray(self.scaler.mean_, dtype=np.float64)
+        self.scaler_scale = np.asarray(self.scaler.scale_, dtype=np.float64)
+        X_scaled = self._matrix(user_features_df)
 
-        # Análise dos clusters
-        user_features_df['cluster'] = self.labels
+        # Mini-batch K-Means
+        self.model = MiniBatchKMeans(
+            n_clusters=n_clusters, random_state=42, n_init=3, batch_size=self.BATCH_SIZE
+        )
+        self.model.fit(X_scaled)
+        profiles = self._sync_centroids()
+        self.labels = self.assign(X_scaled)
 
         print(f"\nDistribuicao de clusters:")
-        print(user_features_df['cluster'].value_counts().sort_index())
+        print(pd.Series(self.labels).value_counts().sort_index())
 
-        # Perfis
-        profiles = user_features_df.groupby('cluster')[features].mean()
         print("\nPerfis dos clusters:")
         print(profiles)
 
-        # Nomear clusters
-        self.cluster_names = self.name_clusters(profiles)
         print("\nNomes dos clusters:")
         for i, name in enumerate(self.cluster_names):
             print(f"  Cluster {i}: {name}")
@@ -275,6 +461,30 @@ class ProfileClusterer:
         self.save()
         return {'n_clusters': n_clusters, 'profiles': profiles.to_dict()}
 
+    def partial_fit(self, user_features_df: pd.DataFrame):
+        """
+        Atualiza os centróides com linhas novas (ex.: usuários criados após o
+        treino), para uso offline antes de salvar/promover uma versão: o
+        serving usa o artefato ativo sem alterá-lo. Só artefatos treinados com
+        MiniBatchKMeans; os antigos (KMeans) precisam ser retreinados.
+        """
+        if not hasattr(self.model, 'partial_fit'):
+            raise ValueError("partial_fit exige um clustering treinado com MiniBatchKMeans; retreine o modelo")
+        if len(user_features_df) == 0:
+            return self
+        self.model.partial_fit(self._matrix(user_features_df))
+        self._sync_centroids()
+        return self
+
+    def assign(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Cluster mais próximo de cada linha já normalizada."""
+        # ||x - c||² = ||x||² - 2x·c + ||c||²; ||x||² não muda o argmin
+        distances = (self.centroids ** 2).sum(axis=1) - 2.0 * (X_scaled @ self.centroids.T)
+        return distances.argmin(axis=1)
+
+    def profile_name(self, cluster: int) -> str:
+        return self.cluster_names[cluster] if self.cluster_names else f"Cluster {cluster}"
+
     def name_clusters(self, profiles: pd.DataFrame) -> list:
         """Dá nomes interpretativos aos clusters"""
         names = []
@@ -293,33 +503,78 @@ class ProfileClusterer:
 
     def predict(self, user_features: pd.DataFrame) -> dict:
         """Classifica usuário em perfil"""
-        features = ['totalXp', 'nivel', 'diasSequencia', 'progresso_medio',
-                   'nivelFoco_mean', 'nivelEstresse_mean']
-        features = [f for f in features if f in user_features.columns]
-
-        X = user_features[features].fillna(0)
-        X_scaled = self.scaler.transform(X)
-
-        cluster = self.model.predict(X_scaled)[0]
+        cluster = int(self.assign(self._matrix(user_features))[0])
 
         return {
             'user_id': user_features.iloc[0]['id'] if 'id' in user_features.columns else 0,
-            'profile_cluster': int(cluster),
-            'profile_name': self.cluster_names[cluster] if self.cluster_names else f"Cluster {cluster}"
+            'profile_cluster': cluster,
+            'profile_name': self.profile_name(cluster)
         }
 
-    def save(self, filepath="backend/ml/models/clustering_model.pkl"):
+    def assign_all(self, conn, user_features: pd.DataFrame) -> int:
+        """
+        Grava o perfil de todos os usuários em `usuarios.perfilAprendizado`
+        (colunas da migração, aplicadas também no startup do app).
+
+        Args:
+            conn: Conexão sqlite3 de escrita
+            user_features: Saída de DataPreparation.prepare_user_features()
+        """
+        clusters = self.assign(self._matrix(user_features))
+        now = int(time.time() * 1000)
+        rows = [
+            (self.profile_name(int(cluster)), int(cluster), now, user_id)
+            for user_id, cluster in zip(user_features['id'], clusters)
+        ]
+        for start in range(0, len(rows), self.ASSIGN_BATCH):
+            with conn:
+                conn.executemany(
+                    "UPDATE usuarios SET perfilAprendizado = ?, perfilCluster = ?, perfilAtualizadoEm = ? "
+                    "WHERE id = ?",
+                    rows[start:start + self.ASSIGN_BATCH],
+                )
+        return len(rows)
+
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "clustering_model.pkl")
         joblib.dump({
             'model': self.model,
-            'scaler': self.scaler,
-            'cluster_names': self.cluster_names if hasattr(self, 'cluster_names') else []
+            'features': self.features,
+            'centroids': self.centroids,
+            'scaler_mean': self.scaler_mean,
+            'scaler_scale': self.scaler_scale,
+            'cluster_names': self.cluster_names,
         }, filepath)
         print(f"Modelo salvo em {filepath}")
 
+    @classmethod
+    def from_artifact(cls, data: dict) -> "ProfileClusterer":
+        """Reconstrói a partir do pickle (aceita o formato antigo com KMeans + StandardScaler)."""
+        clusterer = cls()
+        clusterer.model = data['model']
+        clusterer.cluster_names = data.get('cluster_names') or []
+        if 'centroids' in data:
+            clusterer.features = data['features']
+            clusterer.centroids = np.asarray(data['centroids'], dtype=np.float64)
+            clusterer.scaler_mean = np.asarray(data['scaler_mean'], dtype=np.float64)
+            clusterer.scaler_scale = np.asarray(data['scaler_scale'], dtype=np.float64)
+        else:
+            scaler = data['scaler']
+            clusterer.scaler = scaler
+            clusterer.features = list(getattr(scaler, 'feature_names_in_', []))
+            if not clusterer.features:
+                clusterer.features = cls.FEATURES[:scaler.n_features_in_]
+            clusterer.centroids = np.asarray(data['model'].cluster_centers_, dtype=np.float64)
+            clusterer.scaler_mean = np.asarray(scaler.mean_, dtype=np.float64)
+            clusterer.scaler_scale = np.asarray(scaler.scale_, dtype=np.float64)
+        return clusterer
+
 
 class ChurnDetector:
     """6. Detector de Abandono de Cursos"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
@@ -389,7 +644,8 @@ class ChurnDetector:
             'risk_level': 'alto' if proba > 0.7 else 'medio' if proba > 0.4 else 'baixo'
         }
 
-    def save(self, filepath="backend/ml/models/churn_model.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "churn_model.pkl")
         joblib.dump({'model': self.model, 'scaler': self.scaler}, filepath)
         print(f"Modelo salvo em {filepath}")
 
@@ -397,6 +653,8 @@ class ChurnDetector:
 class WellbeingAnalyzer:
     """7. Análise de Correlação Bem-Estar x Performance"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.correlations = None
 
@@ -454,7 +712,8 @@ class WellbeingAnalyzer:
 
         return insights
 
-    def save(self, filepath="backend/ml/models/wellbeing_analysis.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "wellbeing_analysis.pkl")
         joblib.dump({'correlations': self.correlations}, filepath)
         print(f"Analise salva em {filepath}")
 
@@ -462,6 +721,8 @@ class WellbeingAnalyzer:
 class GradePredictor:
     """8. Preditor de Notas em Cursos"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
@@ -528,7 +789,8 @@ class GradePredictor:
             'confidence': 'medium'
         }
 
-    def save(self, filepath="backend/ml/models/grade_model.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "grade_model.pkl")
         joblib.dump({'model': self.model, 'scaler': self.scaler}, filepath)
         print(f"Modelo salvo em {filepath}")
 
@@ -536,6 +798,8 @@ class GradePredictor:
 class AnomalyDetector:
     """9. Detector de Anomalias"""
 
+    output_dir = MODEL_DIR
+
     def __init__(self):
         self.model = None
 
@@ -579,7 +843,8 @@ class AnomalyDetector:
             'warning': "Comportamento atipico detectado" if pred == -1 else "Comportamento normal"
         }
 
-    def save(self, filepath="backend/ml/models/anomaly_model.pkl"):
+    def save(self, filepath=None):
+        filepath = filepath or os.path.join(self.output_dir, "anomaly_model.pkl")
         joblib.dump({'model': self.model}, filepath)
         print(f"Modelo salvo em {filepath}")
 
@@ -635,67 +900,25 @@ class InterventionSystem:
         }
 
 
-def train_all_models():
-    """Treina todos os modelos"""
-    print("="*60)
-    print("TREINAMENTO DE TODOS OS MODELOS - SYNAPSE ML")
-    print("="*60)
-
-    # Preparar dados
-    dp = DataPreparation()
-    user_features = dp.prepare_user_features()  # Já faz connect/disconnect
-    enrollment_features = dp.prepare_enrollment_features()  # Já faz connect/disconnect
+def train_all_models(promote: bool = False):
+    """
+    Treina todos os modelos em uma versão nova de artefatos.
 
-    dp.connect()
-    checkins = dp.get_checkins_bio_df()
-    dp.disconnect()
+    Delega ao orquestrador (`backend.ml.training`): features calculadas uma
+    vez, modelos em paralelo e progresso retomável. A API só passa a servir
+    a versão quando ela é promovida (`promote=True` ou
+    POST /api/ml/models/promote/{versão}).
+    """
+    from backend.ml.training import run_training
 
-    results = {}
-
-    # Modelo 2: Course Recommender
-    recommender = CourseRecommender()
-    results['recommender'] = recommender.train(enrollment_features)
-
-    # Modelo 3: Performance Predictor
-    perf_predictor = PerformancePredictor()
-    results['performance'] = perf_predictor.train(user_features)
-
-    # Modelo 4: Schedule Optimizer
-    scheduler = ScheduleOptimizer()
-    results['scheduler'] = scheduler.train(checkins)
-
-    # Modelo 5: Profile Clusterer
-    clusterer = ProfileClusterer()
-    results['clustering'] = clusterer.train(user_features)
-
-    # Modelo 6: Churn Detector
-    churn = ChurnDetector()
-    results['churn'] = churn.train(enrollment_features)
-
-    # Modelo 7: Wellbeing Analyzer
-    wellbeing = WellbeingAnalyzer()
-    results['wellbeing'] = wellbeing.train(user_features)
-
-    # Modelo 8: Grade Predictor
-    grade = GradePredictor()
-    results['grade'] = grade.train(enrollment_features)
-
-    # Modelo 9: Anomaly Detector
-    anomaly = AnomalyDetector()
-    results['anomaly'] = anomaly.train(user_features)
-
-    # Modelo 10: Intervention System (usa outros modelos)
-    print("\n" + "="*60)
-    print("MODELO 10: INTERVENTION SYSTEM")
-    print("="*60)
-    print("Sistema integrado - usa outputs dos outros modelos")
-
-    print("\n" + "="*60)
-    print("TODOS OS MODELOS TREINADOS COM SUCESSO!")
-    print("="*60)
-
-    return results
+    result = run_training(promote=promote)
+    if result['failed']:
+        raise RuntimeError(f"Falha no treino da versão {result['version']}: {list(result['failed'])}")
+    results = {name: entry.get('metrics') for name, entry in result['models'].items()}
+    return result['version'], results
 
 
 if __name__ == "__main__":
-    train_all_models()
+    from backend.ml.training import main
+
+    sys.exit(main())
@@ -0,0 +1,347 @@
+"""
+Snapshot Store
+==============
+
+Cache colunar das tabelas usadas pelo ML, com carga incremental.
+
+Cada tabela fica em disco como Parquet (quando o pyarrow está instalado) ou
+`.npz`, junto de um arquivo de metadados com a marca d'água (high-water
+mark) da tabela: maior rowid, total de linhas, id da última linha e, quando a
+tabela tem `@updatedAt`, o maior `atualizadoEm`. Uma nova carga só relê as
+linhas inseridas ou atualizadas depois da marca, sem triggers nem tabelas
+auxiliares no banco: as escritas do app não pagam nada pelo cache.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+ML_SNAPSHOT_DIR = os.getenv("ML_SNAPSHOT_DIR", "data/ml_snapshots")
+ML_SNAPSHOTS = os.getenv("ML_SNAPSHOTS", "true").lower() in {"1", "true", "yes"}
+
+# Tabelas com snapshot e suas colunas de data (gravadas em epoch ms pelo Prisma)
+SNAPSHOT_TABLES: Dict[str, List[str]] = {
+    "usuarios": [],
+    "equipes": [],
+    "cargos": [],
+    "materiais_fonte": [],
+    "matriculas": ["atribuidoEm", "prazo", "ultimoAcesso"],
+    "checkins_bio": ["dataHora"],
+}
+
+# Coluna `@updatedAt` (o Prisma a atualiza em toda escrita): marca das atualizações.
+# Escritas por SQL cru que não a tocam só aparecem quando a linha muda de novo.
+UPDATED_AT_COLUMNS: Dict[str, str] = {
+    "usuarios": "atualizadoEm",
+    "equipes": "atualizadoEm",
+    "cargos": "atualizadoEm",
+    "materiais_fonte": "atualizadoEm",
+}
+# Sem `@updatedAt`, mas o app só insere e apaga: o rowid basta
+APPEND_ONLY_TABLES = {"checkins_bio"}
+# As demais (matriculas) são relidas inteiras a cada carga
+
+# Log por triggers da versão anterior (cada escrita gravava também no log)
+LEGACY_LOG_TABLE = "ml_snapshot_alteracoes"
+
+# Acima desta fração de linhas alteradas é mais barato reler a tabela inteira
+FULL_RELOAD_RATIO = 0.5
+
+
+def parse_datetime_column(series: pd.Series) -> pd.Series:
+    """Converte datas em epoch ms (Prisma) ou texto ISO para datetime64."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit='ms', errors='coerce')
+    numeric = pd.to_numeric(series, errors='coerce')
+    parsed = pd.to_datetime(numeric, unit='ms', errors='coerce')
+    text = series[numeric.isna() & series.notna()]
+    if len(text) > 0:
+        parsed.loc[text.index] = pd.to_datetime(text, errors='coerce', utc=True).dt.tz_localize(None)
+    return parsed
+
+
+def parse_table_dates(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas de data conhecidas da tabela (in-place)."""
+    for col in SNAPSHOT_TABLES.get(table, []):
+        if col in df.columns:
+            df[col] = parse_datetime_column(df[col])
+    return df
+
+
+def _writer_id() -> str:
+    # vários SnapshotStore (threads/processos) podem gravar a mesma tabela
+    return f"{os.getpid()}-{threading.get_ident()}"
+
+
+class SnapshotStore:
+    """Mantém snapshots colunares de tabelas SQLite com carga por delta."""
+
+    def __init__(self, db_path: str, cache_dir: str = ML_SNAPSHOT_DIR):
+        """
+        Args:
+            db_path: Caminho para o banco SQLite
+            cache_dir: Diretório raiz dos snapshots (um subdiretório por banco)
+        """
+        self.db_path = db_path
+        self.cache_dir = Path(cache_dir) / Path(db_path).stem
+        self.format = "parquet" if HAS_PYARROW else "npz"
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._marks: Dict[str, Dict] = {}
+        # incrementada a cada alteração real de cada tabela
+        self._versions: Dict[str, int] = {}
+        self._legacy_checked = False
+
+    # --- Marca d'água ---
+
+    def drop_legacy_change_log(self, conn: sqlite3.Connection) -> None:
+        """Remove os triggers e o log da versão anterior, se o banco ainda os tiver."""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        triggers = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name GLOB ?",
+                (f"trg_{LEGACY_LOG_TABLE}_*",),
+            )
+        ]
+        has_log = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_LOG_TABLE,)
+        ).fetchone()
+        if not triggers and not has_log:
+            return
+        try:
+            for name in triggers:
+                conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+            conn.execute(f"DROP TABLE IF EXISTS {LEGACY_LOG_TABLE}")
+            conn.commit()
+        except sqlite3.Error as exc:
+            print(f"Aviso: não foi possível remover o log de alterações antigo: {exc}")
+
+    @staticmethod
+    def _current_mark(conn: sqlite3.Connection, table: str) -> Dict:
+        """Marca d'água atual da tabela (agregados calculados no SQLite, sem trazer as linhas)."""
+        updated_col = UPDATED_AT_COLUMNS.get(table)
+        updated_sql = f", MAX({updated_col})" if updated_col else ""
+        rowid, rows, *updated = conn.execute(f"SELECT MAX(rowid), COUNT(*){updated_sql} FROM {table}").fetchone()
+        last = conn.execute(f"SELECT id FROM {table} WHERE rowid = ?", (rowid,)).fetchone() if rowid else None
+        return {
+            "rowid": rowid or 0,
+            "rows": rows,
+            "lastId": last[0] if last else None,
+            "updated": updated[0] if updated else None,
+        }
+
+    @staticmethod
+    def _tail_intact(conn: sqlite3.Connection, table: str, mark: Dict) -> bool:
+        """
+        A última linha da marca continua no banco. Se ela foi apagada, o SQLite
+        pode reusar rowids abaixo da marca e o delta por rowid perderia linhas.
+        """
+        if mark["lastId"] is None:
+            return True
+        row = conn.execute(f"SELECT id FROM {table} WHERE rowid = ?", (mark["rowid"],)).fetchone()
+        return row is not None and row[0] == mark["lastId"]
+
+    # --- Leitura do banco ---
+
+    def _read_full(self, conn: sqlite3.Connection, table: str) -> pd.DataFrame:
+        return parse_table_dates(table, pd.read_sql_query(f"SELECT * FROM {table}", conn))
+
+    def _read_delta(self, conn: sqlite3.Connection, table: str, mark: Dict) -> pd.DataFrame:
+        """Linhas inseridas (rowid acima da marca) ou atualizadas (`@updatedAt` desde a marca)."""
+        where, params = "rowid > ?", [mark["rowid"]]
+        updated_col = UPDATED_AT_COLUMNS.get(table)
+        if updated_col and mark["updated"] is not None:
+            # >=: escritas no mesmo milissegundo da marca são relidas (a mescla é idempotente)
+            where += f" OR {updated_col} >= ?"
+            params.append(mark["updated"])
+        return parse_table_dates(
+            table, pd.read_sql_query(f"SELECT * FROM {table} WHERE {where}", conn, params=params)
+        )
+
+    @staticmethod
+    def _align_dtypes(delta: pd.DataFrame, frame: pd.DataFrame) -> pd.DataFrame:
+        # poucas linhas alteradas podem vir com dtype object (ex.: só NULLs);
+        # alinha ao snapshot para o concat não degradar a coluna inteira
+        for col, dtype in frame.dtypes.items():
+            if col in delta.columns and delta[col].dtype != dtype:
+                try:
+                    delta[col] = delta[col].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return delta
+
+    # --- Persistência ---
+
+    def _meta_path(self, table: str) -> Path:
+        return self.cache_dir / f"{table}.json"
+
+    def _read_meta(self, table: str) -> Optional[Dict]:
+        meta_path = self._meta_path(table)
+        if not meta_path.exists():
+            return None
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _read_disk(self, table: str) -> Tuple[Optional[pd.DataFrame], Optional[Dict]]:
+        meta = self._read_meta(table)
+        # snapshots da versão com log (marca = seq do log) são refeitos
+        if meta is None or not isinstance(meta.get("mark"), dict):
+            return None, None
+        try:
+            data_path = self.cache_dir / meta["file"]
+            if meta["format"] == "parquet":
+                if not HAS_PYARROW:
+                    return None, None
+                frame = pd.read_parquet(data_path)
+            else:
+                with np.load(data_path, allow_pickle=True) as data:
+                    frame = pd.DataFrame(
+                        {col: data[f"c{i}"] for i, col in enumerate(meta["columns"])},
+                        columns=meta["columns"],
+                    )
+            self._versions[table] = int(meta["version"])
+            return frame, meta["mark"]
+        except Exception as exc:
+            print(f"Aviso: snapshot de {table} ilegível ({exc}); recarregando do banco")
+            return None, None
+
+    def _write_disk(self, table: str, frame: pd.DataFrame, mark: Dict, version: int) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # o nome inclui a versão: metadados e dados nunca ficam dessincronizados
+        file_name = f"{table}.{version}.{self.format}"
+        data_path = self.cache_dir / file_name
+        tmp_path = data_path.with_name(f"{data_path.name}.{_writer_id()}.tmp")
+        if self.format == "parquet":
+            frame.to_parquet(tmp_path, index=False)
+        else:
+            with open(tmp_path, "wb") as fh:
+                np.savez(fh, **{f"c{i}": frame[col].to_numpy() for i, col in enumerate(frame.columns)})
+        os.replace(tmp_path, data_path)
+
+        self._write_meta(table, {
+            "table": table,
+            "mark": mark,
+            "version": version,
+            "format": self.format,
+            "file": file_name,
+            "columns": list(frame.columns),
+            "rows": int(len(frame)),
+            "writtenAt": datetime.utcnow().isoformat(),
+        })
+
+        for old in self.cache_dir.glob(f"{table}.*.{self.format}"):
+            if old.name != file_name:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+
+    def _write_meta(self, table: str, meta: Dict) -> None:
+        meta_path = self._meta_path(table)
+        tmp_meta = meta_path.with_name(f"{meta_path.name}.{_writer_id()}.tmp")
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+
+    def _advance_mark(self, table: str, mark: Dict) -> None:
+        """Avança a marca do snapshot em disco quando o conteúdo não mudou."""
+        meta = self._read_meta(table)
+        if meta is None or meta.get("version") != self._versions.get(table):
+            return
+        meta["mark"] = mark
+        self._write_meta(table, meta)
+
+    # --- API ---
+
+    def load(self, conn: sqlite3.Connection, table: str) -> pd.DataFrame:
+        """
+        Retorna a tabela atualizada. Usa o frame em memória ou o snapshot em
+        disco e aplica só as linhas alteradas desde a marca d'água.
+        O DataFrame retornado é compartilhado: não deve ser alterado in-place.
+        """
+        self.drop_legacy_change_log(conn)
+        current = self._current_mark(conn, table)
+
+        frame = self._frames.get(table)
+        mark = self._marks.get(table)
+        if frame is None:
+            frame, mark = self._read_disk(table)
+        # última linha apagada (rowids podem ser reusados) ou snapshot de outra
+        # cópia do banco: recarrega tudo
+        if frame is not None and not self._tail_intact(conn, table, mark):
+            frame = None
+
+        if frame is None:
+            self._store(table, self._read_full(conn, table), current, changed=True)
+            return self._frames[table]
+
+        if table not in UPDATED_AT_COLUMNS and table not in APPEND_ONLY_TABLES:
+            # atualizações não mexem na marca: relê e só troca a versão se o conteúdo mudou
+            fresh = self._read_full(conn, table)
+            if fresh.equals(frame):
+                self._store(table, frame, current, changed=False)
+                return frame
+            self._store(table, fresh, current, changed=True)
+            return fresh
+
+        if current == mark:
+            self._store(table, frame, mark, changed=False)
+            return frame
+
+        changed = self._read_delta(conn, table, mark)
+        if len(changed) > FULL_RELOAD_RATIO * max(len(frame), 1):
+            frame = self._read_full(conn, table)
+        else:
+            if len(changed):
+                changed = self._align_dtypes(changed, frame)
+                kept = frame[~frame["id"].isin(changed["id"])]
+                frame = pd.concat([kept, changed], ignore_index=True)
+            if len(frame) != current["rows"]:
+                # linhas apagadas desde a marca: mantém só os ids ainda no banco
+                ids = [row[0] for row in conn.execute(f"SELECT id FROM {table}")]
+                frame = frame[frame["id"].isin(ids)].reset_index(drop=True)
+                if len(frame) != current["rows"]:
+                    frame = self._read_full(conn, table)
+        self._store(table, frame, current, changed=True)
+        return frame
+
+    def _store(self, table: str, frame: pd.DataFrame, mark: Dict, changed: bool) -> None:
+        previous = self._marks.get(table)
+        self._frames[table] = frame
+        self._marks[table] = mark
+        if changed:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            try:
+                self._write_disk(table, frame, mark, self._versions[table])
+            except Exception as exc:
+                print(f"Aviso: não foi possível gravar snapshot de {table}: {exc}")
+        elif mark != previous:
+            try:
+                self._advance_mark(table, mark)
+            except OSError:
+                pass
+
+    def version(self, table: str) -> int:
+        """
+        Versão da tabela carregada por `load`: só muda quando a própria
+        tabela muda (serve de fingerprint para features derivadas).
+        """
+        return self._versions.get(table, -1)
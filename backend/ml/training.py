@@ -0,0 +1,361 @@
+"""
+Training Orchestrator
+=====================
+
+Treino paralelo e retomável dos modelos 1-9.
+
+As features compartilhadas (usuário, matrícula, check-ins) são calculadas uma
+vez no processo principal e gravadas na própria versão (`features.joblib`).
+Cada modelo treina em um processo novo do pool (`max_tasks_per_child=1`: a
+memória de pico medida é a do modelo, e nada vaza entre treinos), com as
+threads nativas de XGBoost/LightGBM/BLAS limitadas para não disputar CPU
+entre workers. O log de cada modelo vai para `logs/<modelo>.log`.
+
+O progresso fica em `training.json` dentro da versão: um modelo que falha
+não derruba os outros, e `--resume <versão>` treina só o que falta. Com
+`--models`, os demais pickles são herdados da versão ativa, de modo que a
+versão nova continua completa e promovível.
+
+Uso (na raiz do repositório):
+  python -m backend.ml.training                              # todos, sem promover
+  python -m backend.ml.training --models churn,grade --promote
+  python -m backend.ml.training --workers 2
+  python -m backend.ml.training --resume 20251120T030000Z
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import joblib
+
+sys.path.append('.')
+from backend.ml.artifacts import ArtifactStore, write_json_atomic
+from backend.ml.data_preparation import DataPreparation
+from backend.services.cpu_budget import THREAD_ENV_VARS, cpu_budget
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CHECKPOINT_FILE = "training.json"
+FEATURES_FILE = "features.joblib"
+LOG_DIR = "logs"
+
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    module: str
+    cls: str
+    data: str       # chave das features compartilhadas
+    filename: str
+    save_after_train: bool = False  # BurnoutPredictor não grava no train()
+
+
+MODEL_SPECS: Dict[str, ModelSpec] = {spec.name: spec for spec in (
+    ModelSpec("burnout", "backend.ml.models.burnout_predictor", "BurnoutPredictor",
+              "user_features", "burnout_model.pkl", save_after_train=True),
+    ModelSpec("recommender", "backend.ml.models.all_models", "CourseRecommender",
+              "enrollment_features", "recommender_model.pkl"),
+    ModelSpec("performance", "backend.ml.models.all_models", "PerformancePredictor",
+              "user_features", "performance_model.pkl"),
+    ModelSpec("scheduler", "backend.ml.models.all_models", "ScheduleOptimizer",
+              "checkins", "schedule_model.pkl"),
+    ModelSpec("clustering", "backend.ml.models.all_models", "ProfileClusterer",
+              "user_features", "clustering_model.pkl"),
+    ModelSpec("churn", "backend.ml.models.all_models", "ChurnDetector",
+              "enrollment_features", "churn_model.pkl"),
+    ModelSpec("wellbeing", "backend.ml.models.all_models", "WellbeingAnalyzer",
+              "user_features", "wellbeing_analysis.pkl"),
+    ModelSpec("grade", "backend.ml.models.all_models", "GradePredictor",
+              "enrollment_features", "grade_model.pkl"),
+    ModelSpec("anomaly", "backend.ml.models.all_models", "AnomalyDetector",
+              "user_features", "anomaly_model.pkl"),
+)}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _peak_memory_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KiB, macOS em bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _train_one(name: str, output_dir: str) -> Dict[str, Any]:
+    """Executado no worker: treina um modelo e grava o pickle em `output_dir`."""
+    import importlib
+
+    spec = MODEL_SPECS[name]
+    started = time.perf_counter()
+    log_path = os.path.join(output_dir, LOG_DIR, f"{name}.log")
+    with open(log_path, "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        data = joblib.load(os.path.join(output_dir, FEATURES_FILE))[spec.data]
+        model = getattr(importlib.import_module(spec.module), spec.cls)()
+        model.output_dir = output_dir
+        metrics = model.train(data)
+        if spec.save_after_train:
+            model.save(os.path.join(output_dir, spec.filename))
+    return {
+        "metrics": metrics,
+        "wallSeconds": round(time.perf_counter() - started, 3),
+        "peakMemoryMb": _peak_memory_mb(),
+    }
+
+
+def _thread_env(workers: int) -> Dict[str, str]:
+    """Divide os núcleos entre os workers; valores já definidos no ambiente prevalecem."""
+    per_worker = str(max(1, cpu_budget.cores // max(1, workers)))
+    return {var: os.environ.get(var, per_worker) for var in THREAD_ENV_VARS}
+
+
+class TrainingRun:
+    """Uma execução de treino sobre uma versão do ArtifactStore."""
+
+    def __init__(self, store: ArtifactStore, version: str):
+        self.store = store
+        self.version = version
+        self.output_dir = store.path(version)
+        self.checkpoint_path = os.path.join(self.output_dir, CHECKPOINT_FILE)
+        self.state = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as handle:
+                return json.load(handle)
+        return {"version": self.version, "startedAt": _now(), "models": {}}
+
+    def _save_checkpoint(self) -> None:
+        write_json_atomic(self.checkpoint_path, self.state)
+
+    def _record(self, name: str, **entry: Any) -> None:
+        self.state["models"][name] = {"updatedAt": _now(), **entry}
+        self._save_checkpoint()
+
+    def done(self) -> List[str]:
+        return [name for name, entry in self.state["models"].items()
+                if entry["status"] in ("done", "inherited")]
+
+    def prepare_features(self, names: Sequence[str], refresh: bool = False) -> None:
+        """Calcula as features compartilhadas uma vez (retomadas reaproveitam as gravadas)."""
+        path = os.path.join(self.output_dir, FEATURES_FILE)
+        needed = {MODEL_SPECS[name].data for name in names}
+        if os.path.exists(path) and not refresh:
+            missing = needed - set(self.state.get("features", {}))
+            if missing:
+                raise ValueError(f"Features gravadas na versão não cobrem {sorted(missing)}; treine em uma versão nova")
+            print(f"Features reaproveitadas de {path}")
+            return
+        # recálculo cobre também as features já gravadas nesta versão
+        needed |= set(self.state.get("features", {}))
+        dp = DataPreparation()
+        dp.connect()
+        try:
+            features: Dict[str, Any] = {}
+            if needed & {"user_features", "enrollment_features"}:
+                features["user_features"] = dp.prepare_user_features()
+            if "enrollment_features" in needed:
+                features["enrollment_features"] = dp.prepare_enrollment_features()
+            if "checkins" in needed:
+                features["checkins"] = dp.get_checkins_bio_df()
+            self.state["dataFingerprint"] = dp.data_fingerprint()
+        finally:
+            dp.disconnect()
+        print(f"Features calculadas: {dict(dp.features.misses)} | reaproveitadas: {dict(dp.features.hits)}")
+        self.state["features"] = {key: list(frame.columns) for key, frame in features.items()}
+        joblib.dump(features, path)
+        self._save_checkpoint()
+
+    def inherit(self, names: Sequence[str], base_version: Optional[str]) -> None:
+        """Copia da versão base os pickles dos modelos fora da seleção."""
+        base_dir = self.store.path(base_version) if base_version else None
+        base_manifest = self.store.manifest(base_version) if base_version else None
+        for name in names:
+            spec = MODEL_SPECS[name]
+            source = os.path.join(base_dir, spec.filename) if base_dir else None
+            if source is None or not os.path.exists(source):
+                raise ValueError(f"Versão base sem {spec.filename}; treine {name} também")
+            shutil.copy2(source, os.path.join(self.output_dir, spec.filename))
+            metrics = (base_manifest or {}).get("metrics", {}).get(name)
+            self._record(name, status="inherited", source=base_version, metrics=metrics)
+
+    def train(self, names: Sequence[str], workers: int) -> Dict[str, str]:
+        """Treina `names` no pool; retorna {modelo: erro} dos que falharam."""
+        os.makedirs(os.path.join(self.output_dir, LOG_DIR), exist_ok=True)
+        workers = max(1, min(workers, len(names)))
+        thread_env = _thread_env(workers)
+        print(f"Treinando {list(names)} com {workers} workers | threads por worker: {thread_env}")
+
+        # os workers (spawn) herdam o ambiente no momento da criação do pool
+        previous_env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+        os.environ.update(thread_env)
+        failures: Dict[str, str] = {}
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=1,
+            ) as pool:
+                futures = {pool.submit(_train_one, name, self.output_dir): name for name in names}
+                for name in names:
+                    self._record(name, status="running")
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as exc:
+                        error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+                        failures[name] = error
+                        self._record(name, status="failed", error=error)
+                        print(f"  {name:12} FALHOU: {error}")
+                        continue
+                    self._record(name, status="done", **result)
+                    print(f"  {name:12} ok em {result['wallSeconds']:.1f}s | pico {result['peakMemoryMb']} MB")
+        finally:
+            for var, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+        return failures
+
+    def finish(self) -> Dict[str, Any]:
+        """Grava o manifest (versão promovível) e remove as features intermediárias."""
+        models = self.state["models"]
+        manifest = self.store.write_manifest(
+            self.version,
+            data_fingerprint=self.state.get("dataFingerprint", ""),
+            metrics={name: entry.get("metrics") for name, entry in models.items()},
+            features=self.state.get("features", {}),
+            training={
+                name: {key: entry.get(key) for key in ("status", "source", "wallSeconds", "peakMemoryMb")}
+                for name, entry in models.items()
+            },
+        )
+        self.state["finishedAt"] = _now()
+        self._save_checkpoint()
+        features_path = os.path.join(self.output_dir, FEATURES_FILE)
+        if os.path.exists(features_path):
+            os.remove(features_path)
+        return manifest
+
+
+def _assign_profiles(output_dir: str) -> int:
+    """Grava os perfis de aprendizado com o clustering recém-promovido."""
+    from backend.ml.models.all_models import ProfileClusterer
+
+    clusterer = ProfileClusterer.from_artifact(joblib.load(os.path.join(output_dir, "clustering_model.pkl")))
+    dp = DataPreparation()
+    dp.connect()
+    try:
+        return clusterer.assign_all(dp.conn, dp.prepare_user_features())
+    finally:
+        dp.disconnect()
+
+
+def run_training(
+    models: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    resume: Optional[str] = None,
+    promote: bool = False,
+    store: Optional[ArtifactStore] = None,
+    refresh_features: bool = False,
+) -> Dict[str, Any]:
+    """
+    Treina os modelos selecionados (todos por padrão) em uma versão nova, ou
+    retoma `resume`. Retorna {'version', 'failed', 'models'}; a versão só
+    ganha manifest (e pode ser promovida) quando nenhum modelo falhou.
+    `refresh_features` recalcula as features de uma retomada (ex.: a falha
+    veio dos dados) em vez de reaproveitar as gravadas.
+    """
+    store = store or ArtifactStore()
+    selected = list(models or MODEL_SPECS)
+    unknown = [name for name in selected if name not in MODEL_SPECS]
+    if unknown:
+        raise ValueError(f"Modelos desconhecidos: {unknown} (disponíveis: {list(MODEL_SPECS)})")
+
+    if resume:
+        if not os.path.isdir(store.path(resume)):
+            raise ValueError(f"Versão {resume} inexistente")
+        if store.manifest(resume) is not None:
+            raise ValueError(f"Versão {resume} já concluída")
+        run = TrainingRun(store, resume)
+        if models is None and run.state.get("selected"):
+            selected = run.state["selected"]
+    else:
+        run = TrainingRun(store, store.create_version())
+        run.state["selected"] = selected
+        run.state["baseVersion"] = store.current()
+    print("=" * 60)
+    print(f"TREINAMENTO - versão {run.version} ({run.output_dir})")
+    print("=" * 60)
+
+    pending = [name for name in selected if name not in run.done()]
+    others = [name for name in MODEL_SPECS if name not in selected and name not in run.done()]
+    if others:
+        run.inherit(others, run.state.get("baseVersion"))
+        print(f"Herdados de {run.state.get('baseVersion')}: {others}")
+
+    failures: Dict[str, str] = {}
+    if pending:
+        run.prepare_features(pending, refresh=refresh_features)
+        failures = run.train(pending, workers or os.cpu_count() or 1)
+    else:
+        print("Nada a treinar: todos os modelos já concluídos")
+
+    if failures:
+        print(f"\n{len(failures)} modelo(s) falharam: {list(failures)}")
+        print(f"Corrija e retome com: python -m backend.ml.training --resume {run.version}")
+        return {"version": run.version, "failed": failures, "models": run.state["models"]}
+
+    run.finish()
+    if promote:
+        store.promote(run.version)
+        print(f"Versão {run.version} promovida")
+        print(f"Perfis de aprendizado atribuídos: {_assign_profiles(run.output_dir)} usuários")
+    removed = store.prune()
+    if removed:
+        print(f"Versões antigas removidas: {removed}")
+    return {"version": run.version, "failed": {}, "models": run.state["models"]}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default=None,
+                        help=f"subconjunto separado por vírgula ({','.join(MODEL_SPECS)})")
+    parser.add_argument("--workers", type=int, default=None, help="processos em paralelo (padrão: núcleos)")
+    parser.add_argument("--resume", default=None, metavar="VERSAO", help="retoma uma versão que falhou")
+    parser.add_argument("--promote", action="store_true", help="promove a versão ao final do treino")
+    parser.add_argument("--refresh-features", action="store_true",
+                        help="na retomada, recalcula as features em vez de reaproveitar as gravadas")
+    args = parser.parse_args(argv)
+    models = [name.strip() for name in args.models.split(",") if name.strip()] if args.models else None
+    try:
+        result = run_training(models, args.workers, args.resume, args.promote,
+                              refresh_features=args.refresh_features)
+    except ValueError as exc:
+        print(f"Erro: {exc}")
+        return 2
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
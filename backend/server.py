@@ -0,0 +1,389 @@
+"""
+Servidor de produção com workers pré-forkados.
+
+O processo mestre abre o socket, importa o app e carrega os modelos de ML uma
+única vez, congela o heap (`gc.freeze`) e então faz `fork` de N workers que
+rodam o uvicorn sobre o mesmo socket. As páginas com o código e os modelos
+ficam compartilhadas copy-on-write entre os workers. O rate limit, as leases
+e os modelos publicados do BioDigital Twin ficam no estado compartilhado
+(`backend/services/shared_state.py`), que o launcher aponta para um SQLite
+em `data/runtime/`; métricas, profiling e os jobs de background continuam
+por processo — ver a seção "Produção com Vários Workers" em
+backend/ml/README.md.
+
+Sinais aceitos pelo mestre:
+  TERM/INT  desligamento gracioso (workers terminam as requisições em curso)
+  HUP       reload gracioso: valida o código novo, reexecuta o mestre e troca
+            os workers sem fechar o socket
+  TTIN/TTOU mais um / menos um worker
+
+Uso (na raiz do repositório):
+  python -m backend.server --workers 4 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", os.getenv("PORT", "8000")))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))  # 0 = um por CPU
+WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+WEB_GRACEFUL_TIMEOUT = float(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+WEB_PRELOAD = os.getenv("WEB_PRELOAD", "1").lower() in {"1", "true", "yes"}
+
+# passados ao mestre reexecutado no reload
+_LISTEN_FD_ENV = "SYNAPSE_LISTEN_FD"
+_OLD_WORKERS_ENV = "SYNAPSE_OLD_WORKERS"
+
+# worker que morre antes disso conta como falha de boot (respawn com espera)
+_MIN_WORKER_LIFETIME = 5.0
+_MAX_RESPAWN_DELAY = 30.0
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+log = logging.getLogger("backend.server")
+
+
+def default_workers() -> int:
+    return WEB_WORKERS or os.cpu_count() or 1
+
+
+def event_loop() -> str:
+    return "uvloop" if find_spec("uvloop") is not None else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if find_spec("httptools") is not None else "h11"
+
+
+def _listen(host: str, port: int, backlog: int) -> socket.socket:
+    inherited = os.environ.pop(_LISTEN_FD_ENV, None)
+    if inherited is not None:
+        sock = socket.socket(fileno=int(inherited))
+    else:
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload() -> Any:
+    """
+    Importa o app no mestre com o ML montado e todos os modelos carregados, para
+    que os workers herdem tudo pronto. `gc.freeze` tira esses objetos das
+    varreduras do coletor, que senão tocariam cada página e desfariam o
+    compartilhamento copy-on-write.
+    """
+    os.environ.setdefault("ML_STARTUP_MODE", "eager")
+    from backend.app import app
+    from backend.experiments import ml_models
+    from backend.services.ml_loader import ml_loader
+
+    started = time.perf_counter()
+    if ml_loader.registry is not None:
+        loaded = ml_loader.registry.warmup()
+        log.info("Modelos carregados no mestre: %s", loaded)
+    ml_models.preload()
+    gc.collect()
+    gc.freeze()
+    log.info("Pré-carga concluída em %.1fs", time.perf_counter() - started)
+    return app
+
+
+def _watch_master(master: int, server: Any, ready_fd: int) -> None:
+    """Thread do worker: avisa o mestre quando o startup termina e sai se o mestre morrer."""
+    notified = False
+    while not server.should_exit:
+        if not notified and server.started:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+            notified = True
+        if os.getppid() != master:
+            log.warning("Mestre %d sumiu; encerrando worker %d", master, os.getpid())
+            server.should_exit = True
+            return
+        time.sleep(0.5)
+
+
+def _run_worker(
+    app: Optional[Any], sock: socket.socket, args: argparse.Namespace, worker_id: int, ready_fd: int
+) -> None:
+    import uvicorn
+
+    os.environ["WEB_WORKER_ID"] = str(worker_id)
+    if app is None:
+        os.environ.setdefault("ML_STARTUP_MODE", "background")
+        from backend.app import app
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    config = uvicorn.Config(
+        app,
+        loop=args.loop,
+        http=args.http,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(
+        target=_watch_master, args=(os.getppid(), server, ready_fd), name="master-watch", daemon=True
+    ).start()
+    server.run(sockets=[sock])
+
+
+class Arbiter:
+    """Mantém N workers vivos, repassa sinais e faz o reload sem derrubar o socket."""
+
+    def __init__(self, app: Optional[Any], sock: socket.socket, args: argparse.Namespace) -> None:
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.target = args.workers
+        self.workers: Dict[int, Dict[str, Any]] = {}  # pid -> {id, started, ready_fd, ready}
+        self.retiring: Dict[int, float] = {}  # pid -> prazo para SIGKILL
+        self.stopping = False
+        self.failures = 0
+        self.respawn_at = 0.0
+        self._signals: List[int] = []
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+
+    # --- sinais ---
+
+    def _on_signal(self, signum: int, frame: Any) -> None:
+        self._signals.append(signum)
+
+    def _install_signals(self) -> None:
+        signal.set_wakeup_fd(self._wakeup_w)
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+
+    def _handle_signals(self) -> None:
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGINT, signal.SIGTERM):
+                self.stop()
+            elif signum == signal.SIGHUP:
+                self.reload()
+            elif signum == signal.SIGTTIN:
+                self.target += 1
+                log.info("Workers: %d", self.target)
+            elif signum == signal.SIGTTOU and self.target > 1:
+                self.target -= 1
+                log.info("Workers: %d", self.target)
+
+    # --- workers ---
+
+    def _free_id(self) -> int:
+        used = {info["id"] for info in self.workers.values()}
+        return next(i for i in range(len(used) + 1) if i not in used)
+
+    def spawn(self) -> int:
+        worker_id = self._free_id()
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            for fd in (ready_r, self._wakeup_r, self._wakeup_w):
+                os.close(fd)
+            code = 0
+            try:
+                _run_worker(self.app, self.sock, self.args, worker_id, ready_w)
+            except BaseException:
+                log.exception("Worker %d falhou", worker_id)
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = {"id": worker_id, "started": time.monotonic(), "ready_fd": ready_r, "ready": False}
+        log.info("Worker %d iniciado (pid %d)", worker_id, pid)
+        return pid
+
+    def retire(self, pid: int) -> None:
+        info = self.workers.pop(pid, None)
+        if info is not None and not info["ready"]:
+            os.close(info["ready_fd"])
+        self.retiring[pid] = time.monotonic() + self.args.graceful_timeout + 5
+        self._kill(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _kill(pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.retiring.pop(pid, None)
+            info = self.workers.pop(pid, None)
+            if info is None:
+                continue
+            if not info["ready"]:
+                os.close(info["ready_fd"])
+            code = os.waitstatus_to_exitcode(status)
+            lifetime = time.monotonic() - info["started"]
+            log.warning("Worker %d (pid %d) saiu com código %d após %.1fs", info["id"], pid, code, lifetime)
+            if lifetime < _MIN_WORKER_LIFETIME:
+                self.failures += 1
+                delay = min(_MAX_RESPAWN_DELAY, 2 ** (self.failures - 1))
+                self.respawn_at = time.monotonic() + delay
+                log.warning("Próximo worker em %.0fs (%d falhas seguidas no boot)", delay, self.failures)
+            else:
+                self.failures = 0
+
+    def _collect_ready(self, readable: Sequence[int]) -> None:
+        for pid, info in self.workers.items():
+            if not info["ready"] and info["ready_fd"] in readable:
+                os.read(info["ready_fd"], 1)
+                os.close(info["ready_fd"])
+                info["ready"] = True
+                self.failures = 0
+                log.info("Worker %d pronto (pid %d)", info["id"], pid)
+
+    def _manage(self) -> None:
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                log.warning("Worker pid %d não terminou a tempo; SIGKILL", pid)
+                self._kill(pid, signal.SIGKILL)
+                self.retiring[pid] = now + 5
+        if self.stopping:
+            return
+        if len(self.workers) > self.target:
+            newest = max(self.workers, key=lambda pid: self.workers[pid]["started"])
+            self.retire(newest)
+        while len(self.workers) < self.target and now >= self.respawn_at:
+            self.spawn()
+
+    def _wait(self, timeout: float) -> None:
+        fds = [self._wakeup_r] + [info["ready_fd"] for info in self.workers.values() if not info["ready"]]
+        try:
+            readable, _, _ = select.select(fds, [], [], timeout)
+        except InterruptedError:
+            return
+        if self._wakeup_r in readable:
+            os.read(self._wakeup_r, 512)
+        self._collect_ready(readable)
+
+    # --- ciclo de vida ---
+
+    def adopt(self, pids: Sequence[int]) -> None:
+        """Após o reload: aposenta os workers do código antigo quando os novos estiverem prontos."""
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while any(not info["ready"] for info in self.workers.values()) and time.monotonic() < deadline:
+            self._wait(0.5)
+            self._reap()
+        for pid in pids:
+            self.retiring[pid] = time.monotonic() + self.args.graceful_timeout + 5
+            self._kill(pid, signal.SIGTERM)
+        log.info("Reload concluído; %d workers antigos em desligamento", len(pids))
+
+    def reload(self) -> None:
+        """
+        Confere se o código novo importa e reexecuta o mestre no mesmo pid: o
+        socket continua aberto (herdado pelo fd) e os workers antigos seguem
+        atendendo até os novos ficarem prontos.
+        """
+        log.info("Reload: validando o código novo")
+        check = subprocess.run(
+            [sys.executable, "-c", "import backend.app"], capture_output=True, text=True, cwd=PROJECT_ROOT,
+            env={**os.environ, "ML_STARTUP_MODE": "off"},
+        )
+        if check.returncode != 0:
+            tail = check.stderr.strip().splitlines()[-1:] or ["?"]
+            log.error("Reload cancelado; o código novo não importa: %s", tail[0])
+            return
+        for info in self.workers.values():
+            if not info["ready"]:
+                os.close(info["ready_fd"])
+        os.environ[_LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[_OLD_WORKERS_ENV] = ",".join(str(pid) for pid in [*self.workers, *self.retiring])
+        signal.set_wakeup_fd(-1)
+        os.execv(sys.executable, [sys.executable, "-m", "backend.server", *sys.argv[1:]])
+
+    def stop(self) -> None:
+        if self.stopping:
+            return
+        log.info("Desligando %d workers", len(self.workers))
+        self.stopping = True
+        for pid in list(self.workers):
+            self.retire(pid)
+
+    def run(self) -> int:
+        self._install_signals()
+        old = [int(pid) for pid in os.environ.pop(_OLD_WORKERS_ENV, "").split(",") if pid]
+        self._manage()
+        if old:
+            self.adopt(old)
+        while not self.stopping or self.retiring:
+            self._wait(1.0)
+            self._handle_signals()
+            self._reap()
+            self._manage()
+        self.sock.close()
+        return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--backlog", type=int, default=WEB_BACKLOG)
+    parser.add_argument("--graceful-timeout", type=float, default=WEB_GRACEFUL_TIMEOUT,
+                        help="segundos para um worker terminar as requisições ao desligar")
+    parser.add_argument("--loop", default=event_loop(), help="uvloop quando instalado")
+    parser.add_argument("--http", default=http_protocol(), help="httptools quando instalado")
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=WEB_PRELOAD,
+                        help="cada worker importa o app por conta própria")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(message)s")
+
+    # rate limit, leases e versões do treino compartilhados pelos workers
+    os.environ.setdefault("SHARED_STATE_URL", "sqlite:data/runtime/shared_state.db")
+    # chave dos valores assinados (modelos publicados): aleatória por execução, herdada pelos workers
+    os.environ.setdefault("SHARED_STATE_SECRET", os.urandom(32).hex())
+    # threads nativas divididas entre os workers, antes de numpy/sklearn/torch carregarem
+    os.environ["WEB_WORKERS"] = str(args.workers)
+    from backend.services.cpu_budget import cpu_budget
+    cpu_budget.configure_environment()
+    log.info("Orçamento de CPU: %s", cpu_budget.status())
+    if not hasattr(os, "fork"):
+        # Windows: sem fork não há copy-on-write; o uvicorn sobe os workers por spawn
+        import uvicorn
+        uvicorn.run("backend:app", host=args.host, port=args.port, workers=args.workers,
+                    loop=args.loop, http=args.http, access_log=args.access_log)
+        return 0
+
+    sock = _listen(args.host, args.port, args.backlog)
+    app = preload() if args.preload else None
+    log.info("Escutando em %s:%d com %d workers (%s/%s)", args.host, args.port, args.workers, args.loop, args.http)
+    return Arbiter(app, sock, args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from prisma import Prisma
+
+from backend.services.timeutil import epoch_ms
+
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("ACTIVITY_SKETCH_ACCURACY", "0.01"))
+# intervalo da reconciliação com `interacoes` (0 desliga; o startup sempre confere)
+ACTIVITY_STATS_RECONCILE_MINUTES = float(os.getenv("ACTIVITY_STATS_RECONCILE_MINUTES", "60"))
+# espera antes de confirmar uma divergência (incrementos de commits em curso)
+ACTIVITY_STATS_SETTLE_SECONDS = float(os.getenv("ACTIVITY_STATS_SETTLE_SECONDS", "2"))
+ATTEMPTS_HISTOGRAM_CAP = 10
+
+# tipo de bucket na tabela de buckets
+_KIND_RESPONSE_TIME = "t"
+_KIND_ATTEMPTS = "a"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS estatisticas_atividades ("
+    "idAtividade TEXT PRIMARY KEY, "
+    "interacoes INTEGER NOT NULL DEFAULT 0, "
+    "respondidas INTEGER NOT NULL DEFAULT 0, "
+    "corretas INTEGER NOT NULL DEFAULT 0, "
+    "somaTempoMs INTEGER NOT NULL DEFAULT 0, "
+    "atualizadoEm INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS estatisticas_atividades_buckets ("
+    "idAtividade TEXT NOT NULL, tipo TEXT NOT NULL, bucket INTEGER NOT NULL, "
+    "contagem INTEGER NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (idAtividade, tipo, bucket))",
+)
+
+_UPSERT_COUNTERS = (
+    "INSERT INTO estatisticas_atividades "
+    "(idAtividade, interacoes, respondidas, corretas, somaTempoMs, atualizadoEm) VALUES {values} "
+    "ON CONFLICT(idAtividade) DO UPDATE SET "
+    "interacoes = interacoes + excluded.interacoes, "
+    "respondidas = respondidas + excluded.respondidas, "
+    "corretas = corretas + excluded.corretas, "
+    "somaTempoMs = somaTempoMs + excluded.somaTempoMs, "
+    "atualizadoEm = excluded.atualizadoEm"
+)
+
+_UPSERT_BUCKETS = (
+    "INSERT INTO estatisticas_atividades_buckets (idAtividade, tipo, bucket, contagem) VALUES {values} "
+    "ON CONFLICT(idAtividade, tipo, bucket) DO UPDATE SET contagem = contagem + excluded.contagem"
+)
+
+# SQLite aceita até 32766 parâmetros por statement; 4-6 por linha
+_ROWS_PER_STATEMENT = 1000
+
+# atividades cujo contador não bate com as linhas de `interacoes` (marca d'água
+# por atividade): faltando, com total diferente ou sem interações
+_DRIFTED = (
+    "SELECT i.idAtividade AS idAtividade FROM "
+    "(SELECT idAtividade, COUNT(*) AS n FROM interacoes GROUP BY idAtividade) i "
+    "LEFT JOIN estatisticas_atividades s ON s.idAtividade = i.idAtividade "
+    "WHERE s.interacoes IS NULL OR s.interacoes <> i.n "
+    "UNION "
+    "SELECT s.idAtividade FROM estatisticas_atividades s "
+    "WHERE NOT EXISTS (SELECT 1 FROM interacoes i WHERE i.idAtividade = s.idAtividade)"
+)
+
+
+class QuantileSketch:
+    """
+    Sketch de quantis com erro relativo garantido (estilo DDSketch).
+
+    Valores positivos caem em buckets logarítmicos de razão `gamma`, então o
+    quantil estimado fica a no máximo `relative_accuracy` do valor real.
+    Dois sketches com a mesma precisão se fundem somando as contagens dos
+    buckets, o que permite manter contadores incrementais no banco.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+
+    def key(self, value: float) -> int:
+        # bucket 0 guarda valores <= 1ms (inclusive zeros); os demais são log-indexados
+        if value <= 1:
+            return 0
+        return max(1, math.ceil(math.log(value) / self._log_gamma))
+
+    def value(self, key: int) -> float:
+        if key <= 0:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        self.buckets[self.key(value)] += count
+        self.count += count
+
+    def add_bucket(self, key: int, count: int) -> None:
+        self.buckets[key] += count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches com precisões diferentes não podem ser combinados")
+        for key, count in other.buckets.items():
+            self.add_bucket(key, count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.buckets))
+
+
+def _attempts_bucket(attempts: Optional[int]) -> int:
+    return max(1, min(int(attempts or 1), ATTEMPTS_HISTOGRAM_CAP))
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ActivityStatsStore:
+    """
+    Estatísticas por atividade mantidas incrementalmente a cada interação.
+
+    Os contadores e os buckets do sketch são atualizados com upserts aditivos,
+    então workers concorrentes nunca sobrescrevem o trabalho uns dos outros e a
+    leitura custa duas consultas por chave primária, qualquer que seja o volume
+    de interações. Incrementos perdidos (queda entre o insert e o upsert,
+    linhas gravadas fora do group commit) são corrigidos por `reconcile`, no
+    startup e a cada ACTIVITY_STATS_RECONCILE_MINUTES: só as atividades cujo
+    total diverge de `interacoes` são recalculadas.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = SKETCH_RELATIVE_ACCURACY,
+        reconcile_minutes: float = ACTIVITY_STATS_RECONCILE_MINUTES,
+        settle_seconds: float = ACTIVITY_STATS_SETTLE_SECONDS,
+    ) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.reconcile_seconds = max(0.0, reconcile_minutes) * 60
+        self.settle_seconds = max(0.0, settle_seconds)
+        self._task: Optional[asyncio.Task] = None
+
+    def _sketch(self) -> QuantileSketch:
+        return QuantileSketch(self.relative_accuracy)
+
+    async def ensure_schema(self, db: Prisma) -> None:
+        for statement in _SCHEMA:
+            await db.execute_raw(statement)
+        await self.reconcile(db)
+
+    async def start(self, db: Prisma) -> None:
+        if self.reconcile_seconds:
+            self._task = asyncio.create_task(self._periodic(db))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _periodic(self, db: Prisma) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_seconds)
+            try:
+                await self.reconcile(db)
+            except Exception:
+                logging.exception("Reconciliação das estatísticas de atividades falhou")
+
+    async def drifted(self, db: Prisma) -> List[str]:
+        """Atividades cujo contador diverge do número de linhas em `interacoes`."""
+        return [row["idAtividade"] for row in await db.query_raw(_DRIFTED)]
+
+    async def reconcile(self, db: Prisma) -> int:
+        """
+        Recalcula as atividades divergentes. A divergência é conferida de novo
+        após `settle_seconds` para não reconstruir por causa de um commit que
+        ainda vai notificar o listener; o que escapar disso (outro worker
+        gravando durante o rebuild) aparece na próxima rodada.
+        """
+        candidates = await self.drifted(db)
+        if candidates and self.settle_seconds:
+            await asyncio.sleep(self.settle_seconds)
+            still = set(await self.drifted(db))
+            candidates = [activity_id for activity_id in candidates if activity_id in still]
+        if not candidates:
+            return 0
+        logging.warning("Estatísticas divergentes de interacoes em %s atividade(s); recalculando", len(candidates))
+        rebuilt = 0
+        for chunk in _chunks(candidates, _ROWS_PER_STATEMENT):
+            rebuilt += await self.rebuild(db, list(chunk))
+        return rebuilt
+
+    async def record(self, db: Prisma, rows: List[Dict[str, Any]]) -> None:
+        """Incorpora interações recém-gravadas (listener do group commit)."""
+        if not rows:
+            return
+        sketch = self._sketch()
+        counters: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        buckets: Dict[tuple, int] = defaultdict(int)
+        for row in rows:
+            activity_id = row["idAtividade"]
+            entry = counters[activity_id]
+            entry[0] += 1
+            if row.get("estaCorreto") is not None:
+                entry[1] += 1
+                if row["estaCorreto"]:
+                    entry[2] += 1
+            response_ms = int(row.get("tempoRespostaMs") or 0)
+            entry[3] += response_ms
+            buckets[(activity_id, _KIND_RESPONSE_TIME, sketch.key(response_ms))] += 1
+            buckets[(activity_id, _KIND_ATTEMPTS, _attempts_bucket(row.get("tentativas")))] += 1
+        await self._apply(db, counters, buckets)
+
+    @staticmethod
+    def _statements(counters: Dict[str, List[int]], buckets: Dict[tuple, int]) -> List[tuple]:
+        """Upserts aditivos dos contadores e buckets: lista de (sql, parâmetros)."""
+        now = epoch_ms()
+        statements = []
+        counter_rows = [(activity_id, *values, now) for activity_id, values in counters.items()]
+        for chunk in _chunks(counter_rows, _ROWS_PER_STATEMENT):
+            values = ", ".join(["(?, ?, ?, ?, ?, ?)"] * len(chunk))
+            statements.append((_UPSERT_COUNTERS.format(values=values), [v for row in chunk for v in row]))
+
+        bucket_rows = [(*key, count) for key, count in buckets.items()]
+        for chunk in _chunks(bucket_rows, _ROWS_PER_STATEMENT):
+            values = ", ".join(["(?, ?, ?, ?)"] * len(chunk))
+            statements.append((_UPSERT_BUCKETS.format(values=values), [v for row in chunk for v in row]))
+        return statements
+
+    async def _apply(self, db: Prisma, counters: Dict[str, List[int]], buckets: Dict[tuple, int]) -> None:
+        for sql, params in self._statements(counters, buckets):
+            await db.execute_raw(sql, *params)
+
+    async def rebuild(self, db: Prisma, activity_ids: Optional[List[str]] = None) -> int:
+        """Recalcula as estatísticas a partir de `interacoes` (backfill/reconciliação)."""
+        where = ""
+        params: List[Any] = []
+        if activity_ids:
+            where = f" WHERE idAtividade IN ({', '.join(['?'] * len(activity_ids))})"
+            params = list(activity_ids)
+        sketch = self._sketch()
+        counters: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        buckets: Dict[tuple, int] = defaultdict(int)
+        # agrega no SQLite por (atividade, tempo, tentativas, acerto) para não trazer linha a linha
+        rows = await db.query_raw(
+            "SELECT idAtividade, tempoRespostaMs, tentativas, estaCorreto, COUNT(*) AS n "
+            f"FROM interacoes{where} GROUP BY idAtividade, tempoRespostaMs, tentativas, estaCorreto",
+            *params,
+        )
+        for row in rows:
+            activity_id = row["idAtividade"]
+            n = int(row["n"])
+            entry = counters[activity_id]
+            entry[0] += n
+            if row["estaCorreto"] is not None:
+                entry[1] += n
+                if row["estaCorreto"] in (1, True, "1", "true"):
+                    entry[2] += n
+            response_ms = int(row["tempoRespostaMs"] or 0)
+            entry[3] += response_ms * n
+            buckets[(activity_id, _KIND_RESPONSE_TIME, sketch.key(response_ms))] += n
+            buckets[(activity_id, _KIND_ATTEMPTS, _attempts_bucket(row["tentativas"]))] += n
+        # troca as linhas antigas pelas recalculadas numa transação só: leitores
+        # nunca veem a atividade zerada no meio do rebuild
+        async with db.batch_() as batcher:
+            batcher.execute_raw(f"DELETE FROM estatisticas_atividades{where}", *params)
+            batcher.execute_raw(f"DELETE FROM estatisticas_atividades_buckets{where}", *params)
+            for sql, statement_params in self._statements(counters, buckets):
+                batcher.execute_raw(sql, *statement_params)
+        return len(counters)
+
+    async def get_many(self, db: Prisma, activity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not activity_ids:
+            return {}
+        placeholders = ", ".join(["?"] * len(activity_ids))
+        counter_rows = await db.query_raw(
+            f"SELECT * FROM estatisticas_atividades WHERE idAtividade IN ({placeholders})",
+            *activity_ids,
+        )
+        bucket_rows = await db.query_raw(
+            "SELECT idAtividade, tipo, bucket, contagem FROM estatisticas_atividades_buckets "
+            f"WHERE idAtividade IN ({placeholders})",
+            *activity_ids,
+        )
+        sketches: Dict[str, QuantileSketch] = defaultdict(self._sketch)
+        histograms: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for row in bucket_rows:
+            if row["tipo"] == _KIND_RESPONSE_TIME:
+                sketches[row["idAtividade"]].add_bucket(int(row["bucket"]), int(row["contagem"]))
+            else:
+                histograms[row["idAtividade"]][int(row["bucket"])] = int(row["contagem"])
+
+        by_id = {row["idAtividade"]: row for row in counter_rows}
+        return {
+            activity_id: self._format(
+                activity_id,
+                by_id.get(activity_id),
+                sketches.get(activity_id) or self._sketch(),
+                histograms.get(activity_id, {}),
+            )
+            for activity_id in activity_ids
+        }
+
+    async def get(self, db: Prisma, activity_id: str) -> Dict[str, Any]:
+        return (await self.get_many(db, [activity_id]))[activity_id]
+
+    def summarize(self, stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combina estatísticas de várias atividades (ex.: um curso inteiro)."""
+        merged = self._sketch()
+        for item in stats:
+            merged.merge(item["_sketch"])
+        totals = {
+            "interacoes": sum(item["attempts"] for item in stats),
+            "respondidas": sum(item["answered"] for item in stats),
+            "corretas": sum(item["correct"] for item in stats),
+            "somaTempoMs": sum(item["_responseTimeSumMs"] for item in stats),
+            "atualizadoEm": None,
+        }
+        histogram: Dict[int, int] = defaultdict(int)
+        for item in stats:
+            for label, count in item["attemptsHistogram"].items():
+                histogram[int(label.rstrip("+"))] += count
+        return self._format(None, totals, merged, histogram)
+
+    def _format(
+        self,
+        activity_id: Optional[str],
+        counters: Optional[Dict[str, Any]],
+        sketch: QuantileSketch,
+        histogram: Dict[int, int],
+    ) -> Dict[str, Any]:
+        counters = counters or {}
+        total = int(counters.get("interacoes") or 0)
+        answered = int(counters.get("respondidas") or 0)
+        correct = int(counters.get("corretas") or 0)
+        response_sum = int(counters.get("somaTempoMs") or 0)
+        updated_at = counters.get("atualizadoEm")
+
+        def _round(value: Optional[float]) -> Optional[float]:
+            return round(value, 1) if value is not None else None
+
+        result = {
+            "attempts": total,
+            "answered": answered,
+            "correct": correct,
+            "correctRate": round(correct / answered, 4) if answered else None,
+            "avgResponseTimeMs": round(response_sum / total, 1) if total else None,
+            "responseTimeMs": {
+                "p50": _round(sketch.quantile(0.5)),
+                "p90": _round(sketch.quantile(0.9)),
+                "p99": _round(sketch.quantile(0.99)),
+                "relativeAccuracy": sketch.relative_accuracy,
+            },
+            "attemptsHistogram": {
+                (f"{bucket}+" if bucket >= ATTEMPTS_HISTOGRAM_CAP else str(bucket)): count
+                for bucket, count in sorted(histogram.items())
+            },
+            "updatedAt": datetime.utcfromtimestamp(updated_at / 1000).isoformat() if updated_at else None,
+            "_responseTimeSumMs": response_sum,
+            "_sketch": sketch,
+        }
+        if activity_id is not None:
+            result = {"activityId": activity_id, **result}
+        return result
+
+
+def public_view(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Remove os campos internos usados para combinar estatísticas."""
+    return {key: value for key, value in stats.items() if not key.startswith("_")}
+
+
+activity_stats = ActivityStatsStore()
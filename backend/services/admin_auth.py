@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Sem ADMIN_TOKEN configurado as rotas administrativas ficam desativadas.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Dependência das rotas operacionais: exige o header `X-Admin-Token`."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desativadas (defina ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from prisma import Prisma
+
+from backend.services.timeutil import epoch_ms
+
+# peso da leitura nova na média/variância exponencial
+ANOMALY_EW_ALPHA = float(os.getenv("ANOMALY_EW_ALPHA", "0.1"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+# CUSUM bilateral em unidades de desvio: folga k e limiar h
+ANOMALY_CUSUM_K = float(os.getenv("ANOMALY_CUSUM_K", "0.5"))
+ANOMALY_CUSUM_H = float(os.getenv("ANOMALY_CUSUM_H", "5.0"))
+# leituras necessárias antes de alertar (estado ainda instável)
+ANOMALY_MIN_OBSERVATIONS = int(os.getenv("ANOMALY_MIN_OBSERVATIONS", "5"))
+# janela de check-ins reprocessada ao subir o processo
+ANOMALY_REPLAY_DAYS = int(os.getenv("ANOMALY_REPLAY_DAYS", "30"))
+
+# (coluna de checkins_bio, desvio mínimo na escala da métrica)
+METRICS: Tuple[Tuple[str, float], ...] = (
+    ("nivelFoco", 5.0),
+    ("nivelEstresse", 5.0),
+    ("nivelFadiga", 5.0),
+    ("horasSono", 0.5),
+)
+
+# por métrica: média, variância, CUSUM+, CUSUM-, leituras
+_FIELDS = 5
+_STRIDE = len(METRICS) * _FIELDS
+_MEAN, _VAR, _POS, _NEG, _COUNT = range(_FIELDS)
+
+_REPLAY_BATCH = 5000
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS alertas_bem_estar ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "idUsuario TEXT NOT NULL, idCheckin TEXT, metrica TEXT NOT NULL, "
+    "valor REAL NOT NULL, media REAL NOT NULL, desvio REAL NOT NULL, "
+    "zScore REAL NOT NULL, tipo TEXT NOT NULL, direcao TEXT NOT NULL, "
+    "criadoEm INTEGER NOT NULL, resolvido INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS alertas_bem_estar_abertos "
+    "ON alertas_bem_estar (resolvido, criadoEm DESC)",
+    "CREATE INDEX IF NOT EXISTS alertas_bem_estar_usuario "
+    "ON alertas_bem_estar (idUsuario, criadoEm DESC)",
+)
+
+_INSERT = (
+    "INSERT INTO alertas_bem_estar "
+    "(idUsuario, idCheckin, metrica, valor, media, desvio, zScore, tipo, direcao, criadoEm) VALUES {values}"
+)
+
+_REPLAY_SQL = """
+SELECT id, idUsuario, dataHora, nivelFoco, nivelEstresse, nivelFadiga, horasSono
+FROM checkins_bio
+WHERE (dataHora, id) > (?, ?)
+ORDER BY dataHora, id
+LIMIT ?
+"""
+
+# Dashboard do gestor: alertas abertos mais recentes (índice resolvido, criadoEm)
+OPEN_ALERTS_SQL = """
+SELECT a.id AS id, a.idUsuario AS idUsuario, u.nome AS nomeUsuario, u.avatarUrl AS avatarUrl,
+       a.metrica AS metrica, a.valor AS valor, a.media AS media, a.zScore AS zScore,
+       a.tipo AS tipo, a.direcao AS direcao, a.criadoEm AS criadoEm
+FROM alertas_bem_estar a
+JOIN usuarios u ON u.id = a.idUsuario
+WHERE a.resolvido = 0 AND a.criadoEm >= ?
+ORDER BY a.criadoEm DESC
+LIMIT ?
+"""
+
+
+class CheckinAnomalyDetector:
+    """
+    Detecção de anomalias no fluxo de check-ins, no próprio caminho de ingestão.
+
+    Para cada usuário e métrica mantém média e variância com peso exponencial
+    e um CUSUM bilateral sobre o z-score, todos num único `array('d')` (um
+    bloco fixo por usuário). Cada check-in é comparado com o estado *anterior*
+    a ele: desvio maior que ANOMALY_Z_THRESHOLD ou CUSUM acima de
+    ANOMALY_CUSUM_H gera alerta na hora, sem esperar o retreino do
+    IsolationForest. O estado é reconstruído ao subir o processo a partir dos
+    últimos ANOMALY_REPLAY_DAYS dias de check-ins.
+    """
+
+    def __init__(self, alpha: float = ANOMALY_EW_ALPHA) -> None:
+        self.alpha = alpha
+        self._slots: Dict[str, int] = {}
+        self._state = array("d")
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _slot(self, user_id: str) -> int:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = len(self._slots) * _STRIDE
+            self._slots[user_id] = slot
+            self._state.extend(0.0 for _ in range(_STRIDE))
+        return slot
+
+    def observe(self, user_id: str, values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Atualiza o estado do usuário e devolve as métricas que dispararam."""
+        state = self._state
+        base = self._slot(user_id)
+        breaches: List[Dict[str, Any]] = []
+        for index, (metric, min_std) in enumerate(METRICS):
+            value = values.get(metric)
+            if value is None:
+                continue
+            value = float(value)
+            at = base + index * _FIELDS
+            count = state[at + _COUNT]
+            if count == 0:
+                state[at + _MEAN] = value
+                state[at + _COUNT] = 1
+                continue
+
+            mean = state[at + _MEAN]
+            std = max(math.sqrt(state[at + _VAR]), min_std)
+            z = (value - mean) / std
+            pos = max(0.0, state[at + _POS] + z - ANOMALY_CUSUM_K)
+            neg = max(0.0, state[at + _NEG] - z - ANOMALY_CUSUM_K)
+            if count >= ANOMALY_MIN_OBSERVATIONS:
+                kind = direction = None
+                if abs(z) >= ANOMALY_Z_THRESHOLD:
+                    kind, direction = "zscore", "alta" if z > 0 else "queda"
+                elif pos >= ANOMALY_CUSUM_H or neg >= ANOMALY_CUSUM_H:
+                    # deriva sustentada, sem nenhuma leitura extrema isolada
+                    kind, direction = "cusum", "alta" if pos >= neg else "queda"
+                if kind is not None:
+                    breaches.append({
+                        "metrica": metric,
+                        "valor": value,
+                        "media": mean,
+                        "desvio": std,
+                        "zScore": z,
+                        "tipo": kind,
+                        "direcao": direction,
+                    })
+                    # reinicia a soma depois do alarme
+                    pos = neg = 0.0
+            state[at + _POS] = pos
+            state[at + _NEG] = neg
+
+            delta = value - mean
+            state[at + _MEAN] = mean + self.alpha * delta
+            state[at + _VAR] = (1 - self.alpha) * (state[at + _VAR] + self.alpha * delta * delta)
+            state[at + _COUNT] = count + 1
+        return breaches
+
+    async def ensure_schema(self, db: Prisma) -> None:
+        for statement in _SCHEMA:
+            await db.execute_raw(statement)
+
+    async def start(self, db: Prisma) -> None:
+        self._task = asyncio.create_task(self._replay(db))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _replay(self, db: Prisma) -> None:
+        """Reconstrói o estado com o histórico recente (sem gravar alertas)."""
+        started = time.perf_counter()
+        cursor: Tuple[int, str] = (epoch_ms() - ANOMALY_REPLAY_DAYS * 86400 * 1000, "")
+        replayed = 0
+        try:
+            while True:
+                rows = await db.query_raw(_REPLAY_SQL, cursor[0], cursor[1], _REPLAY_BATCH)
+                for row in rows:
+                    self.observe(row["idUsuario"], row)
+                replayed += len(rows)
+                if len(rows) < _REPLAY_BATCH:
+                    break
+                cursor = (rows[-1]["dataHora"], rows[-1]["id"])
+                # cede o loop entre lotes
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.warning("Falha ao reconstruir estado de anomalias dos check-ins: %s", exc)
+        self.ready = True
+        logging.info(
+            "Estado de anomalias: %d check-ins, %d usuários em %.1fs",
+            replayed, len(self._slots), time.perf_counter() - started,
+        )
+
+    async def ingest(self, db: Prisma, user_id: str, checkin_id: str, values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Chamado a cada check-in gravado. Enquanto o estado é reconstruído as
+        leituras novas não são avaliadas (a reconstrução já as alcança).
+        """
+        if not self.ready:
+            return []
+        breaches = self.observe(user_id, values)
+        if breaches:
+            now = epoch_ms()
+            params: List[Any] = []
+            for breach in breaches:
+                params.extend((
+                    user_id, checkin_id, breach["metrica"], breach["valor"], breach["media"],
+                    breach["desvio"], breach["zScore"], breach["tipo"], breach["direcao"], now,
+                ))
+            values_sql = ", ".join("(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" for _ in breaches)
+            try:
+                await db.execute_raw(_INSERT.format(values=values_sql), *params)
+            except Exception as exc:
+                logging.warning("Falha ao gravar alerta de bem-estar: %s", exc)
+        return breaches
+
+    async def open_alerts(self, db: Prisma, since_ms: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return await db.query_raw(OPEN_ALERTS_SQL, since_ms, limit)
+
+    async def resolve(self, db: Prisma, alert_id: int) -> int:
+        return await db.execute_raw("UPDATE alertas_bem_estar SET resolvido = 1 WHERE id = ?", alert_id)
+
+
+checkin_anomalies = CheckinAnomalyDetector()
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from prisma import Prisma
+
+from backend.services.timeutil import epoch_ms
+
+RECOMMENDATIONS_PER_USER = int(os.getenv("RECOMMENDATIONS_PER_USER", "6"))
+RECOMMENDATIONS_REFRESH_MINUTES = int(os.getenv("RECOMMENDATIONS_REFRESH_MINUTES", "360"))
+# intervalo entre drenagens da fila de usuários com matrículas alteradas
+RECOMMENDATIONS_FLUSH_SECONDS = float(os.getenv("RECOMMENDATIONS_FLUSH_SECONDS", "2"))
+# usuários recalculados por lote (leitura das matrículas + escrita)
+_USERS_PER_BATCH = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS recomendacoes_cursos ("
+    "idUsuario TEXT NOT NULL, posicao INTEGER NOT NULL, idCurso TEXT NOT NULL, "
+    "score REAL NOT NULL, origem TEXT NOT NULL, geradoEm INTEGER NOT NULL, "
+    "PRIMARY KEY (idUsuario, posicao))"
+)
+
+_UPSERT = (
+    "INSERT INTO recomendacoes_cursos (idUsuario, posicao, idCurso, score, origem, geradoEm) VALUES {values} "
+    "ON CONFLICT(idUsuario, posicao) DO UPDATE SET "
+    "idCurso = excluded.idCurso, score = excluded.score, origem = excluded.origem, geradoEm = excluded.geradoEm"
+)
+
+# Leitura do dashboard: uma consulta pela PK (idUsuario, posicao). O NOT EXISTS
+# cobre a janela entre uma matrícula nova e o recálculo do usuário.
+USER_RECOMMENDATIONS_SQL = """
+SELECT r.idCurso AS id, r.score AS score, r.origem AS origem,
+       m.titulo AS titulo, m.descricao AS descricao, m.categoria AS categoria,
+       m.thumbnailUrl AS thumbnailUrl, m.tipoCurso AS tipoCurso
+FROM recomendacoes_cursos r
+JOIN materiais_fonte m ON m.id = r.idCurso
+WHERE r.idUsuario = ?
+  AND NOT EXISTS (
+      SELECT 1 FROM matriculas x WHERE x.idUsuario = r.idUsuario AND x.idCurso = r.idCurso
+  )
+ORDER BY r.posicao
+"""
+
+_POPULARITY_SQL = """
+SELECT m.id AS idCurso, COALESCE(AVG(x.progresso), 0) AS score
+FROM materiais_fonte m
+LEFT JOIN matriculas x ON x.idCurso = m.id
+GROUP BY m.id
+ORDER BY score DESC, m.id
+"""
+
+# Até 6 parâmetros por linha; SQLite aceita 32766 por statement
+_ROWS_PER_STATEMENT = 1000
+
+Recommendation = Tuple[str, float, str]  # (idCurso, score, origem)
+ModelProvider = Callable[[], Any]
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class CourseRecommendationStore:
+    """
+    Mantém a tabela `recomendacoes_cursos` com o top-N de cada usuário.
+
+    Um job em background recalcula todos os usuários periodicamente e, entre
+    um ciclo e outro, só os usuários cujas matrículas mudaram (`mark_stale`).
+    O score vem do recomendador item-item do módulo de ML quando disponível
+    (vizinhos dos cursos matriculados *atuais*); sem ele, da popularidade.
+    """
+
+    def __init__(self, per_user: int = RECOMMENDATIONS_PER_USER) -> None:
+        self.per_user = per_user
+        self._model_provider: Optional[ModelProvider] = None
+        self._stale: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # None = nenhum recálculo completo ainda (tabela vazia no startup)
+        self._last_full: Optional[float] = None
+        # recomendador usado no último recálculo completo (fraca: não segura versões antigas)
+        self._last_model: Optional[weakref.ref] = None
+
+    def use_model(self, provider: ModelProvider) -> None:
+        """`provider()` devolve o CourseRecommender atual (ou levanta se indisponível)."""
+        self._model_provider = provider
+
+    async def ensure_schema(self, db: Prisma) -> None:
+        await db.execute_raw(_SCHEMA)
+
+    async def start(self, db: Prisma) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def mark_stale(self, user_id: str) -> None:
+        """Agenda o recálculo do usuário (matrícula criada ou removida)."""
+        self._stale.add(user_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, db: Prisma) -> None:
+        rows = await db.query_raw("SELECT COUNT(*) AS total FROM recomendacoes_cursos")
+        if rows and rows[0]["total"]:
+            # tabela já populada: o próximo recálculo completo segue o intervalo
+            self._last_full = time.monotonic()
+            self._remember(await asyncio.to_thread(self._model))
+        while True:
+            try:
+                model = await asyncio.to_thread(self._model)
+                due = (
+                    self._last_full is None
+                    or time.monotonic() - self._last_full >= RECOMMENDATIONS_REFRESH_MINUTES * 60
+                )
+                # nova versão do recomendador promovida: recalcula todos
+                if due or model is not self._previous_model():
+                    await self.refresh_all(db)
+                elif self._stale:
+                    stale, self._stale = self._stale, set()
+                    await self.refresh_users(db, sorted(stale))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logging.warning("Falha ao atualizar recomendações de cursos: %s", exc)
+            self._wakeup.clear()
+            if not self._stale:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), 60)
+                except asyncio.TimeoutError:
+                    pass
+            # agrupa as marcações que chegarem logo em seguida
+            await asyncio.sleep(RECOMMENDATIONS_FLUSH_SECONDS)
+
+    def _remember(self, model: Any) -> None:
+        self._last_model = weakref.ref(model) if model is not None else None
+
+    def _previous_model(self) -> Any:
+        return self._last_model() if self._last_model is not None else None
+
+    def _model(self) -> Any:
+        if self._model_provider is None:
+            return None
+        try:
+            return self._model_provider()
+        except Exception:
+            return None
+
+    async def _popular(self, db: Prisma) -> List[Tuple[str, float]]:
+        return [(row["idCurso"], float(row["score"] or 0)) for row in await db.query_raw(_POPULARITY_SQL)]
+
+    def _recommend(self, model: Any, popular: List[Tuple[str, float]], enrolled: Set[str]) -> List[Recommendation]:
+        picked: List[Recommendation] = []
+        if model is not None:
+            picked = [
+                (entry["course_id"], entry["score"], entry["source"])
+                for entry in model.recommend_for_items(sorted(enrolled), n=self.per_user)
+            ]
+        # completa com o catálogo atual (inclui cursos criados depois do treino)
+        chosen = {course_id for course_id, _, _ in picked}
+        for course_id, score in popular:
+            if len(picked) >= self.per_user:
+                break
+            if course_id not in enrolled and course_id not in chosen:
+                picked.append((course_id, score, "popular"))
+        return picked
+
+    async def _enrollments(self, db: Prisma, user_ids: Sequence[str]) -> Dict[str, Set[str]]:
+        placeholders = ", ".join("?" for _ in user_ids)
+        rows = await db.query_raw(
+            f"SELECT idUsuario, idCurso FROM matriculas WHERE idUsuario IN ({placeholders})",
+            *user_ids,
+        )
+        enrolled: Dict[str, Set[str]] = {user_id: set() for user_id in user_ids}
+        for row in rows:
+            enrolled[row["idUsuario"]].add(row["idCurso"])
+        return enrolled
+
+    async def _write(self, db: Prisma, results: Dict[str, List[Recommendation]]) -> None:
+        now = epoch_ms()
+        rows: List[Any] = []
+        for user_id, recommendations in results.items():
+            for position, (course_id, score, origin) in enumerate(recommendations):
+                rows.append((user_id, position, course_id, float(score), origin, now))
+        for chunk in _chunks(rows, _ROWS_PER_STATEMENT):
+            values = ", ".join("(?, ?, ?, ?, ?, ?)" for _ in chunk)
+            await db.execute_raw(_UPSERT.format(values=values), *[value for row in chunk for value in row])
+        # remove posições que sobraram de um top-N maior
+        for user_id, recommendations in results.items():
+            if len(recommendations) < self.per_user:
+                await db.execute_raw(
+                    "DELETE FROM recomendacoes_cursos WHERE idUsuario = ? AND posicao >= ?",
+                    user_id,
+                    len(recommendations),
+                )
+
+    async def refresh_users(self, db: Prisma, user_ids: Sequence[str]) -> int:
+        """Recalcula o top-N dos usuários informados a partir das matrículas atuais."""
+        model = await asyncio.to_thread(self._model)
+        popular = await self._popular(db)
+        for batch in _chunks(list(user_ids), _USERS_PER_BATCH):
+            enrolled = await self._enrollments(db, batch)
+            results = await asyncio.to_thread(
+                lambda: {user_id: self._recommend(model, popular, courses) for user_id, courses in enrolled.items()}
+            )
+            await self._write(db, results)
+        return len(user_ids)
+
+    async def refresh_all(self, db: Prisma) -> int:
+        """Recalcula todos os usuários (ex.: após um novo treino do recomendador)."""
+        self._last_full = time.monotonic()
+        self._remember(await asyncio.to_thread(self._model))
+        rows = await db.query_raw("SELECT id FROM usuarios ORDER BY id")
+        user_ids = [row["id"] for row in rows]
+        await self.refresh_users(db, user_ids)
+        await db.execute_raw(
+            "DELETE FROM recomendacoes_cursos WHERE idUsuario NOT IN (SELECT id FROM usuarios)"
+        )
+        return len(user_ids)
+
+    async def for_user(self, db: Prisma, user_id: str) -> List[Dict[str, Any]]:
+        """Top-N gravado para o usuário (lista vazia se ainda não calculado)."""
+        return await db.query_raw(USER_RECOMMENDATIONS_SQL, user_id)
+
+
+course_recommendations = CourseRecommendationStore()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from threadpoolctl import ThreadpoolController
+except ImportError:  # vem com o scikit-learn; sem ele só as variáveis de ambiente valem
+    ThreadpoolController = None
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# núcleos que a aplicação pode usar nesta máquina, divididos entre os workers
+CPU_BUDGET = int(os.getenv("CPU_BUDGET", "0")) or _available_cpus()
+WEB_WORKERS = max(1, int(os.getenv("WEB_WORKERS", "0")) or 1)
+# chamadas de ML simultâneas por worker (tamanho do ml_executor)
+ML_EXECUTOR_WORKERS = int(os.getenv("ML_EXECUTOR_WORKERS", "0"))
+# threads nativas (OpenMP/BLAS/torch) por chamada; 0 = núcleos do worker / chamadas simultâneas
+ML_INFERENCE_THREADS = int(os.getenv("ML_INFERENCE_THREADS", "0"))
+# threads nativas do treino feito pelo app (PredictiveLab); 0 = núcleos do worker
+ML_TRAINING_THREADS = int(os.getenv("ML_TRAINING_THREADS", "0"))
+
+# lidas pelas bibliotecas ao carregar (e herdadas por processos spawn)
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+class CPUBudget:
+    """
+    Orçamento de núcleos por worker para os pools nativos (OpenMP do XGBoost,
+    LightGBM e sklearn; MKL/OpenBLAS do numpy; intra-op do torch). Sem limite,
+    cada biblioteca abre uma thread por núcleo em cada worker e em cada chamada
+    simultânea, e a latência desaba com N workers x M chamadas disputando os
+    mesmos núcleos.
+
+    `configure_environment` grava os limites antes de as bibliotecas
+    carregarem; `limits` envolve cada chamada do ml_executor: aplica o padrão
+    de inferência na thread (de novo quando um import novo carrega outra
+    biblioteca) e, para o treino, sobe o limite durante a chamada.
+    """
+
+    def __init__(
+        self,
+        cores: int = CPU_BUDGET,
+        workers: int = WEB_WORKERS,
+        executor_workers: int = ML_EXECUTOR_WORKERS,
+        inference_threads: int = ML_INFERENCE_THREADS,
+        training_threads: int = ML_TRAINING_THREADS,
+    ) -> None:
+        self.cores = max(1, cores)
+        self.workers = max(1, workers)
+        self.worker_cores = max(1, self.cores // self.workers)
+        self.executor_workers = executor_workers or min(4, self.worker_cores)
+        self.inference_threads = inference_threads or max(1, self.worker_cores // self.executor_workers)
+        self.training_threads = training_threads or self.worker_cores
+        self._local = threading.local()
+        # o treino muda limites globais (BLAS, torch): um de cada vez
+        self._raise_lock = threading.Lock()
+
+    def environment(self, threads: Optional[int] = None) -> Dict[str, str]:
+        """Variáveis de limite; valores já definidos no ambiente prevalecem."""
+        value = str(threads or self.inference_threads)
+        return {var: os.environ.get(var, value) for var in THREAD_ENV_VARS}
+
+    def configure_environment(self) -> None:
+        """Antes de importar numpy/sklearn/torch (no mestre do launcher, antes da pré-carga)."""
+        os.environ.update(self.environment())
+
+    def _set(self, threads: int) -> None:
+        if ThreadpoolController is not None:
+            # BLAS vale para o processo; OpenMP para a thread que chama
+            ThreadpoolController().limit(limits=threads)
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(threads)
+
+    def apply(self) -> None:
+        """Limites de inferência na thread atual e nos pools globais já carregados."""
+        self._set(self.inference_threads)
+        self._local.modules = len(sys.modules)
+
+    def _ensure_applied(self) -> None:
+        # bibliotecas importadas depois (ex.: pickle que carrega o xgboost) entram no limite
+        if getattr(self._local, "modules", None) != len(sys.modules):
+            self.apply()
+
+    @contextmanager
+    def limits(self, threads: Optional[int] = None) -> Iterator[None]:
+        """Executa o bloco com `threads` threads nativas (padrão: as de inferência)."""
+        self._ensure_applied()
+        if threads is None or threads == self.inference_threads:
+            yield
+            return
+        # durante o treino as chamadas de inferência em paralelo também veem o
+        # limite maior de BLAS/torch (são globais); o OpenMP é só desta thread
+        with self._raise_lock:
+            self._set(threads)
+            try:
+                yield
+            finally:
+                self._set(self.inference_threads)
+
+    def pools(self) -> List[Dict[str, Any]]:
+        """Pools nativos carregados e o limite visto pela thread atual (varre as libs: ~dezenas de ms)."""
+        if ThreadpoolController is None:
+            return []
+        return [
+            {"api": info["user_api"], "library": info["internal_api"], "threads": info["num_threads"]}
+            for info in ThreadpoolController().info()
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        torch = sys.modules.get("torch")
+        return {
+            "cpuBudget": self.cores,
+            "webWorkers": self.workers,
+            "workerCores": self.worker_cores,
+            "executorWorkers": self.executor_workers,
+            "inferenceThreads": self.inference_threads,
+            "trainingThreads": self.training_threads,
+            "threadpoolctl": ThreadpoolController is not None,
+            "torchThreads": torch.get_num_threads() if torch is not None else None,
+        }
+
+
+def run_limited(threads: Optional[int], fn, *args: Any) -> Any:
+    """`fn(*args)` dentro dos limites (função de módulo: serve ao pool de processos)."""
+    with cpu_budget.limits(threads):
+        return fn(*args)
+
+
+cpu_budget = CPUBudget()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from prisma import Prisma
+
+from backend.services.timeutil import epoch_ms
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chaves_idempotencia ("
+    "chave TEXT PRIMARY KEY, rota TEXT NOT NULL, resposta TEXT NOT NULL, criadoEm INTEGER NOT NULL)"
+)
+
+
+class IdempotencyStore:
+    """
+    Guarda a resposta de requisições identificadas por `Idempotency-Key`
+    para que um retry do cliente receba exatamente o mesmo resultado.
+    """
+
+    def __init__(self, ttl_hours: int = IDEMPOTENCY_TTL_HOURS) -> None:
+        self.ttl = timedelta(hours=ttl_hours)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def ensure_schema(self, db: Prisma) -> None:
+        await db.execute_raw(_SCHEMA)
+        await self.purge_expired(db)
+
+    async def purge_expired(self, db: Prisma) -> None:
+        cutoff = epoch_ms(datetime.utcnow() - self.ttl)
+        await db.execute_raw("DELETE FROM chaves_idempotencia WHERE criadoEm < ?", cutoff)
+
+    async def get(self, db: Prisma, key: str, route: str) -> Optional[Dict[str, Any]]:
+        rows = await db.query_raw(
+            "SELECT resposta, criadoEm FROM chaves_idempotencia WHERE chave = ? AND rota = ?",
+            key,
+            route,
+        )
+        if not rows:
+            return None
+        if rows[0]["criadoEm"] < epoch_ms(datetime.utcnow() - self.ttl):
+            return None
+        return json.loads(rows[0]["resposta"])
+
+    async def put(self, db: Prisma, key: str, route: str, response: Dict[str, Any]) -> None:
+        await db.execute_raw(
+            "INSERT OR REPLACE INTO chaves_idempotencia (chave, rota, resposta, criadoEm) VALUES (?, ?, ?, ?)",
+            key,
+            route,
+            json.dumps(response, ensure_ascii=False),
+            epoch_ms(),
+        )
+
+    async def run_once(
+        self,
+        db: Prisma,
+        key: Optional[str],
+        route: str,
+        handler: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> tuple[Dict[str, Any], bool]:
+        """
+        Executa `handler` uma única vez por chave. Retorna (resposta, replay),
+        onde `replay` indica que a resposta veio do armazenamento.
+        Retries concorrentes com a mesma chave aguardam a primeira execução.
+        """
+        if not key:
+            return await handler(), False
+
+        stored = await self.get(db, key, route)
+        if stored is not None:
+            return stored, True
+
+        inflight_key = f"{route}:{key}"
+        pending = self._inflight.get(inflight_key)
+        if pending is not None:
+            return await asyncio.shield(pending), True
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            response = await handler()
+            await self.put(db, key, route, response)
+            future.set_result(response)
+            return response, False
+        except BaseException as exc:
+            future.set_exception(exc)
+            # evita "exception was never retrieved" quando não há concorrentes
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(inflight_key, None)
+
+
+idempotency_store = IdempotencyStore()
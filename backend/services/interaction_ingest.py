@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from prisma import Prisma
+
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "500"))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "5"))
+
+CommitListener = Callable[[Prisma, List[Dict[str, Any]]], Awaitable[None]]
+
+
+@dataclass
+class _Submission:
+    rows: List[Dict[str, Any]]
+    future: asyncio.Future = field(repr=False)
+
+
+class GroupCommitQueue:
+    """
+    Fila de escrita que agrupa inserções concorrentes de interações em uma
+    única transação SQLite (group commit).
+
+    Cada chamador enfileira suas linhas e aguarda o commit do lote em que
+    elas entraram. O escritor drena a fila por até `max_wait_ms` ou até
+    juntar `max_rows` linhas, o que troca milhares de transações pequenas
+    disputando o lock de escrita por poucas transações multi-linha.
+    """
+
+    def __init__(self, max_rows: int = GROUP_COMMIT_MAX_ROWS, max_wait_ms: float = GROUP_COMMIT_MAX_WAIT_MS) -> None:
+        self.max_rows = max(1, max_rows)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._db: Optional[Prisma] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[CommitListener] = []
+
+    def add_listener(self, listener: CommitListener) -> None:
+        """Registra um callback chamado com as linhas após cada commit."""
+        self._listeners.append(listener)
+
+    async def start(self, db: Prisma) -> None:
+        self._db = db
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None or self._queue is None:
+            return
+        # sentinela: o escritor termina depois de gravar o que já estava na fila
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, db: Prisma, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Enfileira linhas para inserção e aguarda o commit do lote."""
+        if not rows:
+            return []
+        if self._task is None or self._queue is None or self._task.done():
+            # fora do ciclo de vida da app (scripts/testes): grava direto
+            await self._write(db, rows)
+            await self._notify(db, rows)
+            return rows
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Submission(rows=rows, future=future))
+        return await future
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            pending = [first]
+            total = len(first.rows)
+            deadline = loop.time() + self.max_wait
+            while total < self.max_rows:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+                total += len(item.rows)
+            try:
+                await self._flush(pending)
+            except Exception as exc:
+                logging.exception("Group commit interrompido")
+                for item in pending:
+                    self._fail(item, exc)
+
+    async def _flush(self, pending: List[_Submission]) -> None:
+        db = self._db
+        assert db is not None
+        rows = [row for item in pending for row in item.rows]
+        try:
+            await self._write(db, rows)
+        except Exception as exc:
+            if len(pending) == 1:
+                self._fail(pending[0], exc)
+                return
+            # um lote com uma linha inválida (FK, id duplicado) não pode derrubar
+            # os demais chamadores: regrava cada submissão isoladamente
+            logging.warning("Group commit de %s linhas falhou; regravando por submissão", len(rows))
+            committed: List[Dict[str, Any]] = []
+            for item in pending:
+                try:
+                    await self._write(db, item.rows)
+                except Exception as item_exc:
+                    self._fail(item, item_exc)
+                else:
+                    committed.extend(item.rows)
+                    if not item.future.done():
+                        item.future.set_result(item.rows)
+            await self._notify(db, committed)
+            return
+
+        for item in pending:
+            if not item.future.done():
+                item.future.set_result(item.rows)
+        await self._notify(db, rows)
+
+    @staticmethod
+    def _fail(item: _Submission, exc: BaseException) -> None:
+        if not item.future.done():
+            item.future.set_exception(exc)
+
+    @staticmethod
+    async def _write(db: Prisma, rows: List[Dict[str, Any]]) -> None:
+        async with db.batch_() as batcher:
+            for row in rows:
+                batcher.interacao.create(data=row)
+
+    async def _notify(self, db: Prisma, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        for listener in self._listeners:
+            try:
+                await listener(db, rows)
+            except Exception as exc:
+                logging.warning("Listener de group commit falhou: %s", exc)
+
+
+interaction_writer = GroupCommitQueue()
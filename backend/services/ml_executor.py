@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from backend.services.cpu_budget import cpu_budget, run_limited
+
+# thread: pool no próprio processo (pandas/numpy/sklearn/torch liberam o GIL nas
+# partes pesadas e os modelos já carregados são compartilhados); process: pool
+# de processos, isola o GIL mas cada processo carrega os próprios modelos
+ML_EXECUTOR = os.getenv("ML_EXECUTOR", "thread").lower()
+# ML_EXECUTOR_WORKERS: padrão min(4, núcleos do worker), ver cpu_budget
+ML_EXECUTOR_WORKERS = cpu_budget.executor_workers
+# chamadas em execução + na fila; acima disso a rota responde 503 na hora
+ML_QUEUE_MAX = int(os.getenv("ML_QUEUE_MAX", str(ML_EXECUTOR_WORKERS * 4)))
+ML_CALL_TIMEOUT_SECONDS = float(os.getenv("ML_CALL_TIMEOUT_SECONDS", "30"))
+ML_RETRY_AFTER_SECONDS = int(os.getenv("ML_RETRY_AFTER_SECONDS", "5"))
+
+
+class ExecutorSaturated(RuntimeError):
+    """Fila de ML cheia: a chamada foi recusada sem entrar na fila."""
+
+    def __init__(self, pending: int, retry_after: int) -> None:
+        super().__init__(f"Fila de ML cheia ({pending} chamadas pendentes); tente novamente em {retry_after}s")
+        self.pending = pending
+        self.retry_after = retry_after
+
+
+class ExecutorTimeout(TimeoutError):
+    """A chamada passou do tempo limite (o resultado é descartado)."""
+
+
+class MLExecutor:
+    """
+    Pool dimensionado para o trabalho de CPU do ML (ETL em pandas, predições,
+    treino do PredictiveLab), fora do event loop e fora do executor padrão
+    usado pelo resto do app. `run` recusa na hora quando já há ML_QUEUE_MAX
+    chamadas pendentes e desiste de esperar após o tempo limite; a vaga só é
+    liberada quando a chamada realmente termina, então chamadas que estouraram
+    o tempo continuam contando e a fila não cresce sem limite.
+
+    No modo process as funções precisam ser de módulo (picklable), e as
+    exceções que elas levantam também.
+    """
+
+    def __init__(
+        self,
+        mode: str = ML_EXECUTOR,
+        workers: int = ML_EXECUTOR_WORKERS,
+        queue_max: int = ML_QUEUE_MAX,
+        timeout: float = ML_CALL_TIMEOUT_SECONDS,
+        retry_after: int = ML_RETRY_AFTER_SECONDS,
+    ) -> None:
+        if mode not in ("thread", "process"):
+            logging.warning("ML_EXECUTOR=%s inválido; usando thread", mode)
+            mode = "thread"
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_max = max(self.workers, queue_max)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.pending = 0
+        self.running = 0
+        self.stats: Dict[str, int] = {"completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    def _pool(self) -> Executor:
+        # criado no primeiro uso: com o launcher de vários workers, cada worker
+        # (já depois do fork) tem o seu
+        if self._executor is None:
+            if self.mode == "process":
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ml")
+        return self._executor
+
+    def _tracked(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            self.stats["failed" if future.exception() is not None else "completed"] += 1
+
+    def _submit(self, threads: Optional[int], fn: Callable[..., Any], *args: Any) -> Future:
+        if self.mode == "thread":
+            return self._pool().submit(self._tracked, run_limited, threads, fn, *args)
+        try:
+            return self._pool().submit(run_limited, threads, fn, *args)
+        except BrokenExecutor:
+            # um processo do pool morreu (ex.: OOM): recria o pool uma vez
+            logging.warning("Pool de processos de ML quebrado; recriando")
+            self.shutdown()
+            return self._pool().submit(run_limited, threads, fn, *args)
+
+    async def run(
+        self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, threads: Optional[int] = None
+    ) -> Any:
+        """
+        Executa `fn(*args)` no pool com `threads` threads nativas (padrão: as de
+        inferência do cpu_budget); ExecutorSaturated se a fila estiver cheia,
+        ExecutorTimeout se demorar.
+        """
+        with self._lock:
+            if self.pending >= self.queue_max:
+                self.stats["rejected"] += 1
+                raise ExecutorSaturated(self.pending, self.retry_after)
+            self.pending += 1
+        try:
+            future = self._submit(threads, fn, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._finished)
+        limit = self.timeout if timeout is None else timeout
+        try:
+            # no timeout (ou se o cliente desconectar) a chamada ainda na fila é
+            # cancelada; a que já está rodando vai até o fim e é descartada
+            return await asyncio.wait_for(asyncio.wrap_future(future), limit or None)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise ExecutorTimeout(f"Chamada de ML excedeu {limit:g}s")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "queueMax": self.queue_max,
+                "pending": self.pending,
+                "running": self.running if self.mode == "thread" else None,
+                "saturated": self.pending >= self.queue_max,
+                **self.stats,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+ml_executor = MLExecutor()
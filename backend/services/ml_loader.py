@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# eager: importa o ML junto com o app e aquece no startup (bloqueia até terminar)
+# background: sobe sem o ML e importa/aquece logo depois que o servidor já atende
+# lazy: importa na primeira requisição para /api/ml; off: sem rotas de ML
+ML_STARTUP_MODE = os.getenv("ML_STARTUP_MODE", "background").lower()
+ML_STARTUP_MODES = ("eager", "background", "lazy", "off")
+
+ML_MODULE = "backend.ml.inference.ml_endpoints"
+ML_PREFIX = "/api/ml"
+_UNAVAILABLE = json.dumps({"detail": "Endpoints de ML indisponíveis neste processo"}).encode()
+
+Warmup = Callable[[], Awaitable[Any]]
+
+
+class DeferredMLRouter:
+    """
+    Monta o router de ML (`ml_endpoints`: pandas, scipy, sklearn, xgboost,
+    lightgbm e os pickles) fora do caminho de import do app. O import roda numa
+    thread e, terminado, o router é incluído no app em execução; requisições
+    para /api/ml que chegam antes esperam a montagem no `DeferredMLMiddleware`
+    em vez de receber 404. Os handlers de startup do router (warmup dos modelos,
+    observador de versões) e os aquecimentos extras registrados com
+    `add_warmup` rodam em seguida, sem segurar o startup.
+    """
+
+    def __init__(self, mode: str = ML_STARTUP_MODE) -> None:
+        if mode not in ML_STARTUP_MODES:
+            logging.warning("ML_STARTUP_MODE=%s inválido; usando background", mode)
+            mode = "background"
+        self.mode = mode
+        self.state = "disabled" if mode == "off" else "pending"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.module: Any = None
+        self._app: Any = None
+        self._on_mount: List[Callable[[Any], None]] = []
+        self._warmups: List[Warmup] = []
+        self._mounted: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def registry(self) -> Any:
+        """ModelRegistry do router montado (None até lá)."""
+        return getattr(self.module, "registry", None)
+
+    @property
+    def mounted(self) -> bool:
+        return self.module is not None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Nada mais a esperar: aquecido, desligado ou indisponível (o resto do app
+        atende sem ML). No modo lazy o carregamento sob demanda não afeta a prontidão.
+        """
+        return self.mode == "lazy" or self.state in ("ready", "disabled", "failed")
+
+    def attach(self, app: Any, on_mount: Optional[Callable[[Any], None]] = None) -> None:
+        """Liga ao app; no modo eager importa e inclui o router agora (como antes)."""
+        self._app = app
+        if on_mount is not None:
+            self._on_mount.append(on_mount)
+        if self.mode == "eager":
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(ML_MODULE)
+            except Exception as exc:
+                self._fail(exc)
+                return
+            self.timings["importSeconds"] = round(time.perf_counter() - started, 3)
+            # inclui também os handlers de startup do router no startup do app
+            self._include(module)
+            self.state = "warming"
+
+    def add_warmup(self, warmup: Warmup) -> None:
+        """Aquecimento extra executado depois da montagem (fora do startup nos modos adiados)."""
+        self._warmups.append(warmup)
+
+    def _fail(self, exc: BaseException) -> None:
+        self.state = "failed"
+        self.error = f"{type(exc).__name__}: {exc}"
+        print(f"Warning: ML endpoints not available ({self.error}). Run: python backend/ml/models/all_models.py")
+
+    def _include(self, module: Any) -> None:
+        self._app.include_router(module.router)
+        # o schema OpenAPI pode ter sido gerado antes das rotas de ML
+        self._app.openapi_schema = None
+        self.module = module
+        for callback in self._on_mount:
+            callback(module)
+        print("✓ ML endpoints registered successfully!")
+
+    async def start(self) -> None:
+        """Chamado no startup do app."""
+        if self.mode == "eager" and self.mounted:
+            # handlers do router já rodaram no startup; só os aquecimentos extras ficam para depois
+            self._task = asyncio.create_task(self._warm(run_router_startup=False))
+        elif self.mode == "background":
+            self.ensure_started()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def ensure_started(self) -> asyncio.Event:
+        if self._mounted is None:
+            self._mounted = asyncio.Event()
+        if self._task is None and self.state == "pending":
+            self._task = asyncio.create_task(self._load())
+        return self._mounted
+
+    async def wait_mounted(self) -> bool:
+        """Espera a montagem (disparando-a no modo lazy); False se o ML não está disponível."""
+        if self.mounted:
+            return True
+        if self.state in ("failed", "disabled"):
+            return False
+        await self.ensure_started().wait()
+        return self.mounted
+
+    async def _load(self) -> None:
+        # cede o loop para o servidor terminar o startup e começar a atender
+        await asyncio.sleep(0)
+        self.state = "importing"
+        started = time.perf_counter()
+        try:
+            module = await asyncio.to_thread(importlib.import_module, ML_MODULE)
+            self.timings["importSeconds"] = round(time.perf_counter() - started, 3)
+            self._include(module)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # não só ImportError: OSError de lib nativa (libgomp do lightgbm),
+            # ponteiro de versão corrompido etc.
+            self._fail(exc)
+            return
+        finally:
+            # quem espera em wait_mounted nunca fica preso
+            self._mounted.set()
+        await self._warm(run_router_startup=True)
+
+    async def _warm(self, run_router_startup: bool) -> None:
+        self.state = "warming"
+        started = time.perf_counter()
+        steps: List[Warmup] = list(self.module.router.on_startup) if run_router_startup else []
+        for step in steps + self._warmups:
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logging.warning("Falha no aquecimento do ML (%s): %s", getattr(step, "__name__", step), exc)
+        self.timings["warmupSeconds"] = round(time.perf_counter() - started, 3)
+        self.state = "ready"
+
+    def status(self) -> Dict[str, Any]:
+        registry = self.registry
+        return {
+            "mode": self.mode,
+            "state": self.state,
+            "ready": self.ready,
+            "error": self.error,
+            **self.timings,
+            "modelsLoaded": sorted(
+                name for name, info in registry.status().items() if info["status"] == "loaded"
+            ) if registry is not None else [],
+        }
+
+
+class DeferredMLMiddleware:
+    """Segura requisições para /api/ml até o router de ML estar montado."""
+
+    def __init__(self, app: Any, loader: DeferredMLRouter) -> None:
+        self.app = app
+        self.loader = loader
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (
+            scope["type"] == "http"
+            and not self.loader.mounted
+            and self.loader.state != "disabled"
+            and scope["path"].startswith(ML_PREFIX)
+            and not await self.loader.wait_mounted()
+        ):
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"30")],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": _UNAVAILABLE,
+            })
+            return
+        await self.app(scope, receive, send)
+
+
+ml_loader = DeferredMLRouter()
@@ -1,24 +1,108 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import os
+import pickle
+import time
 from datetime import datetime, timedelta
 from statistics import mean
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from prisma import Prisma
 
 from backend.experiments import ml_models
+from backend.services.cpu_budget import cpu_budget
+from backend.services.ml_executor import ExecutorSaturated, ExecutorTimeout, ml_executor
+from backend.services.shared_state import owner_id, seal, shared_state, unseal
+from backend.services.timeutil import epoch_ms
+
+# Médias por equipe em uma única consulta; a janela de tempo é opcional.
+TEAM_METRICS_SQL = """
+SELECT e.id AS teamId, e.nome AS teamName,
+       COALESCE(m.checkins, 0) AS checkins,
+       m.nivelEstresse, m.nivelFoco, m.horasSono, m.qualidadeSono, m.nivelFadiga
+FROM equipes e
+LEFT JOIN (
+    SELECT u.idEquipe AS idEquipe,
+           COUNT(*) AS checkins,
+           AVG(COALESCE(c.nivelEstresse, 0)) AS nivelEstresse,
+           AVG(COALESCE(c.nivelFoco, 0)) AS nivelFoco,
+           AVG(COALESCE(c.horasSono, 0)) AS horasSono,
+           AVG(COALESCE(c.qualidadeSono, 0)) AS qualidadeSono,
+           AVG(COALESCE(c.nivelFadiga, 0)) AS nivelFadiga
+    FROM checkins_bio c
+    JOIN usuarios u ON u.id = c.idUsuario{window}
+    GROUP BY u.idEquipe
+) m ON m.idEquipe = e.id
+ORDER BY e.nome
+"""
+
+
+# treino compartilhado entre workers: um só treina (lease) e publica os modelos
+PREDICTIVE_LAB_REFRESH_MINUTES = float(os.getenv("PREDICTIVE_LAB_REFRESH_MINUTES", "20"))
+PREDICTIVE_LAB_LEASE_SECONDS = float(os.getenv("PREDICTIVE_LAB_LEASE_SECONDS", "300"))
+# quanto um worker sem modelo espera pelo treino de outro antes de seguir com o baseline
+PREDICTIVE_LAB_WAIT_SECONDS = float(os.getenv("PREDICTIVE_LAB_WAIT_SECONDS", "30"))
+
+_TRAINER_LEASE = "predictive_lab:trainer"
+_VERSION_KEY = "predictive_lab:version"
+_STATE_KEY = "predictive_lab:state"
+
+
+def _summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Médias e contagens usadas pelo baseline e pelos sinais (no lugar das linhas)."""
+    if not rows:
+        return {}
+    return {
+        "baseline": {key: mean(row.get(key, 0) for row in rows) for key in ml_models.FEATURE_KEYS},
+        "total": len(rows),
+        "lowSleep": sum(1 for row in rows if (row.get("horasSono") or 0) < 6),
+        "highFatigue": sum(1 for row in rows if (row.get("nivelFadiga") or 0) > 70),
+        "goodSleep": sum(1 for row in rows if (row.get("qualidadeSono") or 0) >= 8),
+    }
+
+
+def _train(rows: List[Dict[str, Any]]) -> Tuple[bytes, Dict[str, Any]]:
+    """Roda no ml_executor: treina e devolve os modelos serializados e o resumo."""
+    ml_models.train_models(rows)
+    return ml_models.dump_state(), _summarize(rows)
+
+
+# versão dos modelos carregada neste processo (nos processos do pool, com ML_EXECUTOR=process)
+_loaded_version: Optional[str] = None
+
+
+def _predict_many(
+    version: Optional[str], blob: Optional[bytes], samples: List[Dict[str, Any]]
+) -> List[Dict[str, float]]:
+    """Roda no ml_executor; com `blob` (modo process) carrega a versão na primeira chamada do processo."""
+    global _loaded_version
+    if blob is not None and version != _loaded_version:
+        ml_models.load_state(blob)
+        _loaded_version = version
+    return ml_models.predict_many(samples)
 
 
 class PredictiveLab:
     """
     Camada "BioDigital Twin" que treina modelos clássicos e neurais usando
     exclusivamente os dados já registrados na tabela checkins_bio.
+
+    Com vários workers, só o que obtém a lease no estado compartilhado treina;
+    ele publica os modelos serializados e o resumo dos dados com uma versão
+    nova, e os demais carregam essa versão em vez de treinar de novo.
     """
 
     def __init__(self) -> None:
         self.last_trained_at: Optional[datetime] = None
         self.dataset_size: int = 0
-        self.feature_snapshot: List[Dict[str, Any]] = []
+        self.summary: Dict[str, Any] = {}
+        self.version: Optional[str] = None
+        # modelos serializados da versão atual (enviados ao pool de processos)
+        self._blob: Optional[bytes] = None
+        # versão publicada com assinatura inválida (não é lida de novo)
+        self._rejected: Optional[str] = None
 
     async def _fetch_rows(self, db: Prisma) -> List[Dict[str, Any]]:
         checkins = await db.checkinbio.find_many()
@@ -39,22 +123,97 @@ class PredictiveLab:
 
     async def refresh(self, db: Prisma) -> None:
         rows = await self._fetch_rows(db)
+        if not rows:
+            self.dataset_size = 0
+            self.summary = {}
+            return
+        # treino fora do loop com as threads de treino; os modelos voltam
+        # serializados (vale também para ML_EXECUTOR=process) e o tempo limite
+        # é o da lease
+        blob, self.summary = await ml_executor.run(
+            _train, rows, timeout=PREDICTIVE_LAB_LEASE_SECONDS, threads=cpu_budget.training_threads
+        )
+        ml_models.load_state(blob)
+        self._blob = blob
         self.dataset_size = len(rows)
-        self.feature_snapshot = rows
-        if rows:
-            ml_models.train_models(rows)
-            self.last_trained_at = datetime.utcnow()
+        self.last_trained_at = datetime.utcnow()
+        await self._publish(blob)
+
+    async def _publish(self, models: bytes) -> None:
+        version = f"{self.last_trained_at.isoformat()}@{owner_id()}"
+        state = {
+            "version": version,
+            "trainedAt": self.last_trained_at,
+            "datasetSize": self.dataset_size,
+            "summary": self.summary,
+            "models": models,
+        }
+        await shared_state.set(_STATE_KEY, seal(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)))
+        await shared_state.set(_VERSION_KEY, version.encode())
+        self.version = version
+
+    async def _sync(self) -> None:
+        """Carrega a versão publicada por outro worker, se for diferente da local."""
+        version = await shared_state.get(_VERSION_KEY)
+        if version is None or version.decode() in (self.version, self._rejected):
+            return
+        blob = await shared_state.get(_STATE_KEY)
+        if blob is None:
+            return
+        # pickle executa código: só carrega o que foi assinado com a chave da aplicação
+        payload = unseal(blob)
+        if payload is None:
+            self._rejected = version.decode()
+            logging.warning("Modelos publicados no estado compartilhado com assinatura inválida; ignorados")
+            return
+        state = pickle.loads(payload)
+        ml_models.load_state(state["models"])
+        self._blob = state["models"]
+        self.last_trained_at = state["trainedAt"]
+        self.dataset_size = state["datasetSize"]
+        self.summary = state["summary"]
+        self.version = state["version"]
+
+    async def _predict(self, samples: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+        """
+        Predições no ml_executor, fora do loop; fila cheia e tempo esgotado
+        sobem para os handlers do app (503 com Retry-After / 504).
+        """
+        # no modo thread os modelos deste processo já servem o pool
+        blob = self._blob if ml_executor.mode == "process" else None
+        return await ml_executor.run(_predict_many, self.version, blob, samples)
+
+    def _stale(self) -> bool:
+        if not self.last_trained_at or not self.summary:
+            return True
+        return datetime.utcnow() - self.last_trained_at > timedelta(minutes=PREDICTIVE_LAB_REFRESH_MINUTES)
+
+    async def preload(self) -> None:
+        """Carrega as bibliotecas de treino fora do loop antes do primeiro dashboard."""
+        await asyncio.to_thread(ml_models.preload)
 
     async def ensure_trained(self, db: Prisma) -> None:
-        needs_refresh = False
-        if not self.last_trained_at:
-            needs_refresh = True
-        elif not self.feature_snapshot:
-            needs_refresh = True
-        else:
-            needs_refresh = datetime.utcnow() - self.last_trained_at > timedelta(minutes=20)
-        if needs_refresh:
-            await self.refresh(db)
+        await self._sync()
+        if not self._stale():
+            return
+        if await shared_state.acquire(_TRAINER_LEASE, owner_id(), PREDICTIVE_LAB_LEASE_SECONDS):
+            try:
+                # outro worker pode ter publicado entre a leitura e a lease
+                await self._sync()
+                if self._stale():
+                    await self.refresh(db)
+            except (ExecutorSaturated, ExecutorTimeout) as exc:
+                # fila de ML cheia ou treino lento: segue com o último modelo (ou o
+                # baseline) e tenta de novo na próxima chamada
+                logging.warning("Treino do PredictiveLab adiado: %s", exc)
+            finally:
+                await shared_state.release(_TRAINER_LEASE, owner_id())
+            return
+        # outro worker está treinando: quem já tem um modelo segue com ele
+        deadline = time.monotonic() + PREDICTIVE_LAB_WAIT_SECONDS
+        while self.version is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            await self._sync()
 
     async def _sample_from_user(self, db: Prisma, user_id: str) -> Optional[Dict[str, Any]]:
         checkins = await db.checkinbio.find_many(
@@ -71,16 +230,9 @@ class PredictiveLab:
         }
 
     def _organization_baseline(self) -> Dict[str, Any]:
-        if not self.feature_snapshot:
+        if not self.summary:
             return ml_models.feature_template()
-        horas = [row.get("horasSono", 0) for row in self.feature_snapshot]
-        qualidade = [row.get("qualidadeSono", 0) for row in self.feature_snapshot]
-        fadiga = [row.get("nivelFadiga", 0) for row in self.feature_snapshot]
-        return {
-            "horasSono": mean(horas) if horas else 0,
-            "qualidadeSono": mean(qualidade) if qualidade else 0,
-            "nivelFadiga": mean(fadiga) if fadiga else 0,
-        }
+        return dict(self.summary["baseline"])
 
     async def predict_for_user(self, db: Prisma, user_id: Optional[str]) -> Dict[str, Any]:
         await self.ensure_trained(db)
@@ -89,7 +241,7 @@ class PredictiveLab:
             sample = await self._sample_from_user(db, user_id)
         if not sample:
             sample = self._organization_baseline()
-        projections = ml_models.predict(sample)
+        projections = (await self._predict([sample]))[0]
         return {
             "inputs": sample,
             "projection": projections,
@@ -114,27 +266,40 @@ class PredictiveLab:
             return "MICRO_APRENDIZADO"
         return "ALTA_PERFORMANCE"
 
-    async def organization_snapshot(self, db: Prisma) -> Dict[str, Any]:
+    async def team_metrics(self, db: Prisma, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Médias de check-in por equipe (estresse, foco e features dos modelos)
+        agregadas no banco. `since` limita aos check-ins a partir da data.
+        """
+        if since is None:
+            return await db.query_raw(TEAM_METRICS_SQL.format(window=""))
+        # DateTime do Prisma no SQLite é gravado em epoch ms
+        return await db.query_raw(
+            TEAM_METRICS_SQL.format(window="\n    WHERE c.dataHora >= ?"),
+            epoch_ms(since),
+        )
+
+    async def organization_snapshot(self, db: Prisma, since: Optional[datetime] = None) -> Dict[str, Any]:
         await self.ensure_trained(db)
         baseline = self._organization_baseline()
-        projections = ml_models.predict(baseline)
 
-        teams = await db.equipe.find_many(include={"usuarios": {"include": {"checkInsBio": True}}})
+        teams = [row for row in await self.team_metrics(db, since) if row["checkins"]]
+        # baseline + uma linha por equipe em uma única chamada aos modelos
+        projected = await self._predict([baseline] + teams)
+        projections = projected[0]
+
         team_heatmap = []
-        for team in teams:
-            checkins = []
-            for usuario in team.usuarios or []:
-                checkins.extend(usuario.checkInsBio or [])
-            if not checkins:
-                continue
-            stress_avg = mean(c.nivelEstresse or 0 for c in checkins)
-            focus_avg = mean(c.nivelFoco or 0 for c in checkins)
+        for team, team_projection in zip(teams, projected[1:]):
+            stress_avg = float(team["nivelEstresse"] or 0)
+            focus_avg = float(team["nivelFoco"] or 0)
             team_heatmap.append(
                 {
-                    "teamId": team.id,
-                    "teamName": team.nome,
+                    "teamId": team["teamId"],
+                    "teamName": team["teamName"],
                     "stressRisk": round(stress_avg, 1),
                     "focusScore": round(focus_avg, 1),
+                    "checkins": team["checkins"],
+                    "projection": team_projection,
                     "recommendation": self._mode_from_projection({"stress": stress_avg, "focus": focus_avg}),
                 }
             )
@@ -149,16 +314,17 @@ class PredictiveLab:
             "confidence": self._confidence(),
             "stressAverage": stress_avg,
             "teamHeatmap": team_heatmap,
+            "windowStart": since.isoformat() if since else None,
             "topSignals": self._signals(),
         }
 
     def _signals(self) -> List[Dict[str, Any]]:
-        if not self.feature_snapshot:
+        if not self.summary:
             return []
-        horas_baixas = sum(1 for row in self.feature_snapshot if (row.get("horasSono") or 0) < 6)
-        alta_fadiga = sum(1 for row in self.feature_snapshot if (row.get("nivelFadiga") or 0) > 70)
-        boa_qualidade = sum(1 for row in self.feature_snapshot if (row.get("qualidadeSono") or 0) >= 8)
-        total = len(self.feature_snapshot) or 1
+        horas_baixas = self.summary["lowSleep"]
+        alta_fadiga = self.summary["highFatigue"]
+        boa_qualidade = self.summary["goodSleep"]
+        total = self.summary["total"] or 1
         return [
             {"label": "Sono < 6h", "impact": int((horas_baixas / total) * 100), "action": "Liberar pausas de foco"},
             {"label": "Fadiga elevada", "impact": int((alta_fadiga / total) * 100), "action": "Agendar telemetria com IA Coach"},
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# limites para poder deixar os endpoints ligados em produção
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_MIN_INTERVAL_MS = float(os.getenv("PROFILER_MIN_INTERVAL_MS", "1"))
+PROFILER_MAX_DEPTH = int(os.getenv("PROFILER_MAX_DEPTH", "128"))
+PROFILER_MAX_SNAPSHOTS = int(os.getenv("PROFILER_MAX_SNAPSHOTS", "5"))
+PROFILER_TRACEMALLOC_FRAMES = int(os.getenv("PROFILER_TRACEMALLOC_FRAMES", "10"))
+
+_ROOT = str(Path(__file__).resolve().parents[2]) + os.sep
+_STDLIB = os.path.dirname(os.__file__) + os.sep
+
+# alocações do próprio tracemalloc/importlib não interessam no diff
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _short(path: str) -> str:
+    if path.startswith(_ROOT):
+        return path[len(_ROOT):]
+    if path.startswith(_STDLIB):
+        return path[len(_STDLIB):]
+    marker = "site-packages" + os.sep
+    at = path.find(marker)
+    return path[at + len(marker):] if at >= 0 else path
+
+
+class StackSampler:
+    """
+    Profiler estatístico: uma thread própria lê `sys._current_frames()` a cada
+    intervalo e conta as pilhas no formato "collapsed" (uma linha por pilha,
+    frames separados por `;`, seguida da contagem), que o flamegraph.pl e o
+    speedscope abrem direto. Não instala hooks no interpretador; o custo fica
+    na thread de amostragem e só existe enquanto a sessão roda.
+    """
+
+    def __init__(self) -> None:
+        self._running = False
+        self._labels: Dict[Tuple[Any, int], str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _label(self, frame: Any) -> str:
+        code = frame.f_code
+        key = (code, frame.f_lineno)
+        label = self._labels.get(key)
+        if label is None:
+            label = self._labels[key] = f"{code.co_name} ({_short(code.co_filename)}:{frame.f_lineno})"
+        return label
+
+    def _collapse(self, frame: Any, thread_name: Optional[str]) -> str:
+        frames: List[str] = []
+        while frame is not None and len(frames) < PROFILER_MAX_DEPTH:
+            frames.append(self._label(frame))
+            frame = frame.f_back
+        if thread_name:
+            frames.append(f"thread:{thread_name}")
+        return ";".join(reversed(frames))
+
+    def _sample(self, seconds: float, interval: float, target: Optional[int]) -> Dict[str, Any]:
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Counter = Counter()
+        ticks = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (target is not None and ident != target):
+                    continue
+                stacks[self._collapse(frame, None if target is not None else names.get(ident, str(ident)))] += 1
+            ticks += 1
+            time.sleep(interval)
+        return {"stacks": stacks, "ticks": ticks, "seconds": time.perf_counter() - started}
+
+    async def profile(self, seconds: float, interval_ms: float = 10.0, all_threads: bool = False) -> Dict[str, Any]:
+        """
+        Amostra por `seconds`. Sem `all_threads` só a thread do loop de eventos
+        (a que chama) é amostrada; com ele, também os executores (ML, to_thread).
+        """
+        if self._running:
+            raise RuntimeError("Já existe uma sessão de profiling em andamento")
+        if not 0 < seconds <= PROFILER_MAX_SECONDS:
+            raise ValueError(f"seconds deve estar entre 0 e {PROFILER_MAX_SECONDS:g}")
+        interval = max(interval_ms, PROFILER_MIN_INTERVAL_MS) / 1000
+        target = None if all_threads else threading.get_ident()
+        loop = asyncio.get_running_loop()
+        done: asyncio.Future = loop.create_future()
+
+        def run() -> None:
+            try:
+                result = self._sample(seconds, interval, target)
+            except BaseException as exc:  # devolve ao loop em vez de morrer na thread
+                loop.call_soon_threadsafe(done.set_exception, exc)
+            else:
+                loop.call_soon_threadsafe(done.set_result, result)
+
+        self._running = True
+        try:
+            threading.Thread(target=run, name="stack-sampler", daemon=True).start()
+            result = await done
+        finally:
+            self._running = False
+            self._labels.clear()
+        result["intervalMs"] = interval * 1000
+        result["allThreads"] = all_threads
+        return result
+
+    @staticmethod
+    def collapsed(result: Dict[str, Any]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in result["stacks"].most_common())
+
+    @staticmethod
+    def summary(result: Dict[str, Any], limit: int = 30) -> Dict[str, Any]:
+        """Resumo JSON: pilhas mais frequentes e funções com mais tempo próprio (folha)."""
+        stacks: Counter = result["stacks"]
+        total = sum(stacks.values()) or 1
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "samples": sum(stacks.values()),
+            "ticks": result["ticks"],
+            "seconds": round(result["seconds"], 3),
+            "intervalMs": result["intervalMs"],
+            "allThreads": result["allThreads"],
+            "topSelf": [
+                {"frame": frame, "samples": count, "percent": round(100 * count / total, 2)}
+                for frame, count in leaves.most_common(limit)
+            ],
+            "topStacks": [
+                {"stack": stack, "samples": count, "percent": round(100 * count / total, 2)}
+                for stack, count in stacks.most_common(limit)
+            ],
+        }
+
+
+class AllocationTracker:
+    """
+    Snapshots do tracemalloc sob demanda. O tracemalloc só é ligado por
+    `start` (custa memória e CPU em toda alocação enquanto ativo); os
+    snapshots guardados são limitados a PROFILER_MAX_SNAPSHOTS. Enquanto ativo,
+    `AllocationMiddleware` soma por rota a memória que continuou alocada ao
+    fim de cada requisição: com requisições concorrentes a atribuição é
+    aproximada, mas crescimento persistente (cache, vazamento) aparece na rota
+    que o causa.
+    """
+
+    def __init__(self) -> None:
+        self._snapshots: "OrderedDict[int, Tuple[str, float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._next_id = 1
+        self.routes: Dict[Tuple[str, str], List[int]] = {}
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = PROFILER_TRACEMALLOC_FRAMES) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+            self.routes.clear()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        tracemalloc.stop()
+        self._snapshots.clear()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "tracedKiB": round(current / 1024, 1),
+            "peakKiB": round(peak / 1024, 1),
+            "overheadKiB": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "snapshots": [
+                {"id": snapshot_id, "label": label, "takenAt": taken_at}
+                for snapshot_id, (label, taken_at, _) in self._snapshots.items()
+            ],
+        }
+
+    def record(self, method: str, route: str, delta: int) -> None:
+        entry = self.routes.get((method, route))
+        if entry is None:
+            entry = self.routes[(method, route)] = [0, 0]
+        entry[0] += 1
+        entry[1] += delta
+
+    def route_growth(self, limit: int = 25) -> List[Dict[str, Any]]:
+        ranked = sorted(self.routes.items(), key=lambda item: -item[1][1])[:limit]
+        return [
+            {"method": method, "route": route, "requests": count, "retainedKiB": round(delta / 1024, 1)}
+            for (method, route), (count, delta) in ranked
+        ]
+
+    def _require_tracing(self) -> None:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc desligado: inicie o rastreamento de memória antes")
+
+    def snapshot(self, label: str = "") -> Dict[str, Any]:
+        """Tira e guarda um snapshot (descarta o mais antigo acima do limite)."""
+        self._require_tracing()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self._snapshots[snapshot_id] = (label, time.time(), snapshot)
+        while len(self._snapshots) > PROFILER_MAX_SNAPSHOTS:
+            self._snapshots.popitem(last=False)
+        return {"id": snapshot_id, "label": label, **self._top(snapshot)}
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        if snapshot_id not in self._snapshots:
+            raise KeyError(snapshot_id)
+        return self._snapshots[snapshot_id][2]
+
+    @staticmethod
+    def _top(snapshot: tracemalloc.Snapshot, limit: int = 15) -> Dict[str, Any]:
+        stats = snapshot.statistics("lineno")
+        return {
+            "totalKiB": round(sum(stat.size for stat in stats) / 1024, 1),
+            "top": [
+                {
+                    "location": f"{_short(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "sizeKiB": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+    def diff(self, base: int, current: Optional[int] = None, group: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        """Crescimento entre dois snapshots (sem `current`, contra um snapshot novo)."""
+        if group not in ("lineno", "filename", "traceback"):
+            raise ValueError("group deve ser lineno, filename ou traceback")
+        older = self._get(base)
+        if current is None:
+            current = self.snapshot("diff")["id"]
+        newer = self._get(current)
+        stats = newer.compare_to(older, group)
+        entries = []
+        for stat in stats[:limit]:
+            frames = stat.traceback if group == "traceback" else stat.traceback[:1]
+            entries.append({
+                "location": f"{_short(frames[0].filename)}:{frames[0].lineno}",
+                "traceback": [f"{_short(frame.filename)}:{frame.lineno}" for frame in frames]
+                if group == "traceback" else None,
+                "sizeDiffKiB": round(stat.size_diff / 1024, 1),
+                "sizeKiB": round(stat.size / 1024, 1),
+                "countDiff": stat.count_diff,
+            })
+        return {
+            "base": base,
+            "current": current,
+            "group": group,
+            "growthKiB": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+            "diff": entries,
+            "routes": self.route_growth(),
+        }
+
+
+class AllocationMiddleware:
+    """Middleware ASGI puro; com o tracemalloc desligado custa uma chamada por requisição."""
+
+    def __init__(self, app: Any, tracker: AllocationTracker) -> None:
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tracemalloc.is_tracing():
+                route = getattr(scope.get("route"), "path", "<unmatched>")
+                self.tracker.record(scope["method"], route, tracemalloc.get_traced_memory()[0] - before)
+
+
+stack_sampler = StackSampler()
+allocation_tracker = AllocationTracker()
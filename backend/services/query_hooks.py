@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# consultas pelo Prisma (ORM e SQL cru via `_execute`) e pelo pool de leitura aiosqlite
+PRISMA = "prisma"
+SQLITE = "sqlite"
+
+
+class QueryEvent:
+    """Uma consulta concluída (ou que falhou): origem, operação e duração."""
+
+    __slots__ = ("source", "method", "model", "arguments", "sql", "seconds")
+
+    def __init__(
+        self,
+        source: str,
+        seconds: float,
+        method: Optional[str] = None,
+        model: Any = None,
+        arguments: Optional[Dict[str, Any]] = None,
+        sql: Optional[str] = None,
+    ) -> None:
+        self.source = source
+        self.seconds = seconds
+        self.method = method
+        self.model = model
+        self.arguments = arguments
+        self.sql = sql
+
+
+Listener = Callable[[QueryEvent], None]
+
+
+class QueryHooks:
+    """
+    Ponto único de instrumentação das consultas: envolve uma vez o `_execute`
+    do Prisma (todas as operações passam por ele) e o `fetch_all`/`fetch_one`
+    do pool de leitura, e repassa cada consulta aos ouvintes inscritos
+    (métricas, rastreamento de N+1, contador do benchmark). Os ouvintes rodam
+    no loop, depois da consulta, e cada um decide pelo próprio contexto
+    (ContextVar) se a consulta pertence a uma requisição.
+    """
+
+    def __init__(self) -> None:
+        self._listeners: List[Listener] = []
+
+    def subscribe(self, listener: Listener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _publish(self, event: QueryEvent) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as exc:
+                # falha de um ouvinte não derruba a consulta nem os demais
+                logging.warning("Ouvinte de consultas %r falhou: %s", listener, exc)
+
+    def _wrap_prisma(self, fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        async def execute(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self._publish(QueryEvent(
+                    PRISMA,
+                    time.perf_counter() - started,
+                    method=kwargs.get("method"),
+                    model=kwargs.get("model"),
+                    arguments=kwargs.get("arguments"),
+                ))
+        execute.__query_hooks__ = True
+        return execute
+
+    def _wrap_pool(self, fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        async def fetch(sql: str, *args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await fn(sql, *args, **kwargs)
+            finally:
+                self._publish(QueryEvent(SQLITE, time.perf_counter() - started, sql=sql))
+        fetch.__query_hooks__ = True
+        return fetch
+
+    def install(self, prisma: Any, read_pool: Any) -> bool:
+        """
+        Envolve o cliente e o pool (chamadas repetidas não envolvem de novo);
+        False se o Prisma não expõe `_execute` e só o pool é observado.
+        """
+        for name in ("fetch_all", "fetch_one"):
+            fn = getattr(read_pool, name)
+            if not getattr(fn, "__query_hooks__", False):
+                setattr(read_pool, name, self._wrap_pool(fn))
+        if not hasattr(prisma, "_execute"):
+            return False
+        if not getattr(prisma._execute, "__query_hooks__", False):
+            prisma._execute = self._wrap_prisma(prisma._execute)
+        return True
+
+
+query_hooks = QueryHooks()
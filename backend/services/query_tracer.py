@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend.services.query_hooks import SQLITE, QueryEvent, query_hooks
+
+QUERY_TRACING_ENABLED = os.getenv("QUERY_TRACING_ENABLED", "1").lower() in {"1", "true", "yes"}
+# mesma consulta (fingerprint) repetida mais que isso numa requisição => aviso de N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+# estouro de orçamento vira exceção (testes/CI) em vez de só log
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() in {"1", "true", "yes"}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint_sql(sql: str) -> str:
+    """SQL normalizado: literais viram `?` e listas `IN (?, ?, ...)`/`VALUES (...), (...)` colapsam."""
+    normalized = _STRING.sub("?", sql)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    normalized = _VALUES_LIST.sub(r"\1, ...", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+def fingerprint_operation(method: str, model: Any, arguments: Optional[Dict[str, Any]]) -> str:
+    """Operação do Prisma: SQL cru pelo texto; ORM por modelo, método e campos do `where`."""
+    arguments = arguments or {}
+    if method in ("query_raw", "execute_raw"):
+        return fingerprint_sql(arguments.get("query") or "")
+    name = getattr(model, "__name__", "?")
+    where = arguments.get("where")
+    fields = ",".join(sorted(where)) if isinstance(where, dict) else ""
+    return f"{name}.{method}({fields})"
+
+
+def fingerprint_event(event: QueryEvent) -> str:
+    if event.source == SQLITE:
+        return fingerprint_sql(event.sql or "")
+    return fingerprint_operation(event.method or "", event.model, event.arguments)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class QueryTrace:
+    """Consultas de uma requisição, agrupadas por fingerprint."""
+    method: str = ""
+    route: str = ""
+    budget: Optional[int] = None
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.total > self.budget
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        return sorted(
+            ((fingerprint, count) for fingerprint, count in self.counts.items() if count > threshold),
+            key=lambda item: -item[1],
+        )
+
+    def describe(self, limit: int = 5) -> str:
+        top = sorted(self.counts.items(), key=lambda item: -item[1])[:limit]
+        return "; ".join(f"{count}x {fingerprint}" for fingerprint, count in top)
+
+    def assert_budget(self, limit: Optional[int] = None) -> None:
+        """Falha se a requisição passou do orçamento (`limit` ou o declarado na rota)."""
+        limit = self.budget if limit is None else limit
+        if limit is not None and self.total > limit:
+            raise QueryBudgetExceeded(
+                f"{self.method} {self.route}: {self.total} consultas (orçamento {limit}) — {self.describe()}"
+            )
+
+    def assert_no_repeats(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> None:
+        repeated = self.repeated(threshold)
+        if repeated:
+            fingerprint, count = repeated[0]
+            raise QueryBudgetExceeded(f"{self.method} {self.route}: {count}x {fingerprint}")
+
+
+def query_budget(limit: int) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Orçamento de consultas por requisição da rota. Vai abaixo do `@app.get(...)`
+    para que o FastAPI registre a função já marcada.
+    """
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        fn.__query_budget__ = limit
+        return fn
+    return decorate
+
+
+_current: ContextVar[Optional[QueryTrace]] = ContextVar("query_trace", default=None)
+
+
+class QueryTracer:
+    """
+    Rastreia as consultas de cada requisição (Prisma e pool SQLite) por
+    fingerprint. Ao fim da requisição avisa quando uma fingerprint se repete
+    mais que QUERY_REPEAT_THRESHOLD vezes (consulta dentro de laço) e quando o
+    total passa do `@query_budget` da rota. Testes usam a fixture
+    `query_trace` (backend/tests/conftest.py) ou `capture()` para inspecionar
+    os traces, ou ligam QUERY_BUDGET_STRICT para falhar na hora.
+    """
+
+    def __init__(self, threshold: int = QUERY_REPEAT_THRESHOLD, strict: bool = QUERY_BUDGET_STRICT) -> None:
+        self.threshold = threshold
+        self.strict = strict
+        self._captures: List[List[QueryTrace]] = []
+
+    def record(self, fingerprint: str) -> None:
+        trace = _current.get()
+        if trace is not None:
+            trace.counts[fingerprint] = trace.counts.get(fingerprint, 0) + 1
+
+    def _on_query(self, event: QueryEvent) -> None:
+        if _current.get() is not None:
+            self.record(fingerprint_event(event))
+
+    def instrument(self, prisma: Any, read_pool: Any) -> None:
+        """Rastreia as consultas do cliente Prisma e do pool de leitura (via query_hooks)."""
+        query_hooks.install(prisma, read_pool)
+        query_hooks.subscribe(self._on_query)
+
+    def begin(self, method: str = "") -> Tuple[QueryTrace, Any]:
+        trace = QueryTrace(method=method)
+        return trace, _current.set(trace)
+
+    def finish(self, trace: QueryTrace, token: Any) -> None:
+        _current.reset(token)
+        for captured in self._captures:
+            captured.append(trace)
+        for fingerprint, count in trace.repeated(self.threshold):
+            logging.warning("Possível N+1 em %s %s: %dx %s", trace.method, trace.route, count, fingerprint)
+        if trace.over_budget:
+            logging.warning(
+                "Orçamento de consultas estourado em %s %s: %d > %d (%s)",
+                trace.method, trace.route, trace.total, trace.budget, trace.describe(),
+            )
+            if self.strict:
+                trace.assert_budget()
+
+    @contextmanager
+    def capture(self) -> Iterator[List[QueryTrace]]:
+        """Coleta os traces das requisições concluídas dentro do bloco (para fixtures de teste)."""
+        captured: List[QueryTrace] = []
+        self._captures.append(captured)
+        try:
+            yield captured
+        finally:
+            self._captures.remove(captured)
+
+    @contextmanager
+    def trace(self, label: str = "") -> Iterator[QueryTrace]:
+        """Rastreia um trecho fora de requisição (job, script, teste de função isolada)."""
+        trace, token = self.begin()
+        trace.route = label
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+
+
+class QueryTraceMiddleware:
+    """Middleware ASGI puro: abre o trace da requisição e o avalia ao final."""
+
+    def __init__(self, app: Any, tracer: QueryTracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace, token = self.tracer.begin(scope["method"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            trace.route = getattr(route, "path", scope.get("path", ""))
+            trace.budget = getattr(getattr(route, "endpoint", None), "__query_budget__", None)
+            self.tracer.finish(trace, token)
+
+
+query_tracer = QueryTracer()
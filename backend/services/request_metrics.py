@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import os
+import time
+from array import array
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.services.query_hooks import SQLITE, QueryEvent, query_hooks
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in {"1", "true", "yes"}
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "synapse")
+
+# limites superiores dos buckets (o `le` do Prometheus); o último bucket é +Inf
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS: Tuple[float, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DB_CALL_BUCKETS: Tuple[float, ...] = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# ORM do Prisma, SQL cru via Prisma (query_raw/execute_raw) e pool de leitura aiosqlite
+DB_KINDS: Tuple[str, ...] = ("prisma", "raw", "sqlite")
+_PRISMA, _RAW, _SQLITE = range(len(DB_KINDS))
+
+UNMATCHED_ROUTE = "<unmatched>"
+# chamadas ao banco fora de uma requisição (jobs de background, startup)
+BACKGROUND_ROUTE = "<background>"
+
+# o Starlette acrescenta "; charset=utf-8" em respostas text/*
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class Histogram:
+    """Buckets pré-alocados; `observe` é uma busca binária e dois incrementos."""
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = array("Q", bytes(8 * (len(bounds) + 1)))
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class RouteSeries:
+    __slots__ = ("latency", "response_size", "db_calls", "request_bytes", "statuses", "db_count", "db_seconds")
+
+    def __init__(self) -> None:
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.db_calls = Histogram(DB_CALL_BUCKETS)
+        self.request_bytes = 0
+        self.statuses: Dict[int, int] = {}
+        self.db_count = array("Q", bytes(8 * len(DB_KINDS)))
+        self.db_seconds = array("d", bytes(8 * len(DB_KINDS)))
+
+
+class RequestStats:
+    """Chamadas ao banco feitas enquanto uma requisição é atendida."""
+
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self) -> None:
+        self.calls = [0] * len(DB_KINDS)
+        self.seconds = [0.0] * len(DB_KINDS)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _kind(event: QueryEvent) -> int:
+    if event.source == SQLITE:
+        return _SQLITE
+    return _RAW if event.method in ("query_raw", "execute_raw") else _PRISMA
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """
+    Métricas por template de rota (`/api/dashboard/collaborator/{user_id}`, não
+    o caminho concreto): latência, tamanho de requisição e resposta, status e
+    chamadas ao banco (quantidade e tempo por tipo). Tudo é atualizado no loop
+    de eventos, então os contadores dispensam lock; cada série é criada uma vez
+    com os buckets já alocados e `/metrics` só formata o estado atual.
+    """
+
+    def __init__(self) -> None:
+        self._series: Dict[Tuple[str, str], RouteSeries] = {}
+        self.in_flight = 0
+        self.background = RouteSeries()
+
+    def _get_series(self, method: str, route: str) -> RouteSeries:
+        key = (method, route)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = RouteSeries()
+        return series
+
+    def record_db(self, kind: int, seconds: float) -> None:
+        stats = _current.get()
+        if stats is None:
+            self.background.db_count[kind] += 1
+            self.background.db_seconds[kind] += seconds
+            return
+        stats.calls[kind] += 1
+        stats.seconds[kind] += seconds
+
+    def observe(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        request_bytes: int,
+        response_bytes: int,
+        stats: RequestStats,
+    ) -> None:
+        series = self._get_series(method, route)
+        series.latency.observe(seconds)
+        series.response_size.observe(response_bytes)
+        series.request_bytes += request_bytes
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        series.db_calls.observe(sum(stats.calls))
+        for kind in range(len(DB_KINDS)):
+            series.db_count[kind] += stats.calls[kind]
+            series.db_seconds[kind] += stats.seconds[kind]
+
+    def _on_query(self, event: QueryEvent) -> None:
+        self.record_db(_kind(event), event.seconds)
+
+    def instrument(self, prisma: Any, read_pool: Any) -> None:
+        """Registra as chamadas ao banco do cliente Prisma e do pool de leitura (via query_hooks)."""
+        query_hooks.install(prisma, read_pool)
+        query_hooks.subscribe(self._on_query)
+
+    def render(self) -> str:
+        """Estado atual no formato texto do Prometheus."""
+        prefix = METRICS_PREFIX
+        lines: List[str] = [
+            f"# HELP {prefix}_http_requests_in_flight Requisições em atendimento.",
+            f"# TYPE {prefix}_http_requests_in_flight gauge",
+            f"{prefix}_http_requests_in_flight {self.in_flight}",
+        ]
+        series = sorted(self._series.items())
+
+        lines += [
+            f"# HELP {prefix}_http_requests_total Requisições atendidas por rota e status.",
+            f"# TYPE {prefix}_http_requests_total counter",
+        ]
+        for (method, route), item in series:
+            labels = f'method="{method}",route="{_label(route)}"'
+            for status, count in sorted(item.statuses.items()):
+                lines.append(f'{prefix}_http_requests_total{{{labels},status="{status}"}} {count}')
+
+        for name, help_text, attribute in (
+            ("http_request_duration_seconds", "Latência da requisição até o último byte.", "latency"),
+            ("http_response_size_bytes", "Tamanho do corpo da resposta.", "response_size"),
+            ("db_calls_per_request", "Chamadas ao banco por requisição.", "db_calls"),
+        ):
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} histogram"]
+            for (method, route), item in series:
+                self._render_histogram(
+                    lines, f"{prefix}_{name}", f'method="{method}",route="{_label(route)}"', getattr(item, attribute)
+                )
+
+        lines += [
+            f"# HELP {prefix}_http_request_size_bytes_total Bytes recebidos no corpo das requisições.",
+            f"# TYPE {prefix}_http_request_size_bytes_total counter",
+        ]
+        for (method, route), item in series:
+            labels = f'method="{method}",route="{_label(route)}"'
+            lines.append(f"{prefix}_http_request_size_bytes_total{{{labels}}} {item.request_bytes}")
+
+        everything = series + [(("", BACKGROUND_ROUTE), self.background)]
+        for name, help_text, attribute in (
+            ("db_calls_total", "Chamadas ao banco por rota e tipo.", "db_count"),
+            ("db_duration_seconds_total", "Tempo gasto em chamadas ao banco por rota e tipo.", "db_seconds"),
+        ):
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for (method, route), item in everything:
+                values = getattr(item, attribute)
+                for kind, label in enumerate(DB_KINDS):
+                    lines.append(
+                        f'{prefix}_{name}{{method="{method}",route="{_label(route)}",kind="{label}"}} '
+                        f'{_number(values[kind])}'
+                    )
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _render_histogram(lines: List[str], name: str, labels: str, histogram: Histogram) -> None:
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{_number(bound)}"}} {cumulative}')
+        cumulative += histogram.counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {_number(histogram.total)}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro: não cria task nem bufferiza o corpo (ao contrário do
+    `@app.middleware("http")`). O template da rota vem de `scope["route"]`,
+    preenchido pelo roteador do FastAPI durante o atendimento.
+    """
+
+    def __init__(self, app: Any, metrics: RequestMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        received = sent = 0
+
+        async def counting_receive() -> Dict[str, Any]:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Dict[str, Any]) -> None:
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight -= 1
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            metrics.observe(scope["method"], route, status, elapsed, received, sent, stats)
+
+
+request_metrics = RequestMetrics()
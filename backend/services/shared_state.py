@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import importlib
+import logging
+import math
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# memory: por processo (um worker só); sqlite:<caminho>: arquivo compartilhado
+# entre os workers da máquina (em /dev/shm fica só em memória)
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory")
+# KV externo: "pacote.modulo:fabrica", chamada com a SHARED_STATE_URL (ex.: redis://...)
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "")
+# a cada N operações o SQLite apaga as chaves expiradas
+SHARED_STATE_SWEEP_EVERY = int(os.getenv("SHARED_STATE_SWEEP_EVERY", "1000"))
+# assina os valores serializados (ex.: modelos do PredictiveLab); sem ela cada
+# processo usa uma chave aleatória e só aceita o que ele mesmo publicou
+SHARED_STATE_SECRET = os.getenv("SHARED_STATE_SECRET", "")
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)",
+    "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)",
+    "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+)
+
+
+def owner_id() -> str:
+    """Identifica o processo nas leases (máquina + pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+_SECRET = SHARED_STATE_SECRET.encode() or os.urandom(32)
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+def seal(value: bytes) -> bytes:
+    """Prefixa `value` com o HMAC-SHA256 da SHARED_STATE_SECRET."""
+    return hmac.new(_SECRET, value, hashlib.sha256).digest() + value
+
+
+def unseal(blob: bytes) -> Optional[bytes]:
+    """Conteúdo de `seal`, ou None se a assinatura não confere (outra chave ou valor adulterado)."""
+    signature, value = blob[:_SIGNATURE_SIZE], blob[_SIGNATURE_SIZE:]
+    if not hmac.compare_digest(signature, hmac.new(_SECRET, value, hashlib.sha256).digest()):
+        return None
+    return value
+
+
+class SharedState(ABC):
+    """
+    Estado compartilhado entre workers: rate limit, contadores, valores com
+    TTL e leases para eleger um único processo para tarefas como o treino.
+    Todas as operações são atômicas no backend. Para um KV externo basta
+    implementar os métodos abstratos (no Redis: `hit` com duas chaves INCR/EXPIRE por
+    janela, `incr` com INCRBY, `set`/`get` com SET PX/GET, `acquire` com
+    SET NX PX e renovação condicionada ao dono via script Lua) e apontar
+    SHARED_STATE_BACKEND para a fábrica.
+    """
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Conta uma requisição na janela deslizante; devolve (permitida, segundos até liberar)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Pega (ou renova, se já for o dono) a lease `name` por `ttl` segundos."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release(self, name: str, owner: str) -> None:
+        raise NotImplementedError
+
+
+class MemorySharedState(SharedState):
+    """Implementação por processo; é o comportamento de um worker só."""
+
+    def __init__(self) -> None:
+        self._hits: Dict[str, Deque[float]] = {}
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        now = time.time()
+        bucket = self._hits.get(key)
+        if bucket is None:
+            bucket = self._hits[key] = deque()
+        while bucket and bucket[0] < now - window:
+            bucket.popleft()
+        if len(bucket) >= limit:
+            return False, bucket[0] + window - now
+        bucket.append(now)
+        return True, 0.0
+
+    def _live(self, key: str) -> Any:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[key]
+            return None
+        return value
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = (self._live(key) or 0) + amount
+        entry = self._values.get(key)
+        expires_at = entry[1] if entry is not None else (time.time() + ttl if ttl else None)
+        self._values[key] = (value, expires_at)
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        holder = self._leases.get(name)
+        if holder is not None and holder[0] != owner and holder[1] > now:
+            return False
+        self._leases[name] = (owner, now + ttl)
+        return True
+
+    async def release(self, name: str, owner: str) -> None:
+        holder = self._leases.get(name)
+        if holder is not None and holder[0] == owner:
+            del self._leases[name]
+
+
+class SQLiteSharedState(SharedState):
+    """
+    Arquivo SQLite em WAL compartilhado pelos workers da máquina. Cada processo
+    usa uma conexão própria numa thread dedicada (as operações não bloqueiam o
+    loop e ficam serializadas); a atomicidade entre processos vem de
+    `BEGIN IMMEDIATE`. O rate limit usa janela deslizante aproximada: contador
+    da janela atual + o da anterior ponderado pelo tempo que ainda a cobre.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._ops = 0
+
+    async def open(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        await self._call(self._connect)
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._call(self._disconnect)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _connect(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._conn = conn
+
+    def _disconnect(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            await self.open()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection, float], Any]) -> Any:
+        conn = self._conn
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, now)
+            self._ops += 1
+            if self._ops % SHARED_STATE_SWEEP_EVERY == 0:
+                for table in ("kv", "counters"):
+                    conn.execute(f"DELETE FROM {table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def _counter(conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute(
+            "SELECT value FROM counters WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        def run(conn: sqlite3.Connection, now: float) -> Tuple[bool, float]:
+            bucket = math.floor(now / window)
+            elapsed = now - bucket * window
+            previous = self._counter(conn, f"rl:{key}:{bucket - 1}", now)
+            current = self._counter(conn, f"rl:{key}:{bucket}", now)
+            if previous * (1 - elapsed / window) + current >= limit:
+                if current < limit and previous:
+                    # quando o peso da janela anterior cair o suficiente
+                    wait = window * (1 - (limit - current) / previous) - elapsed
+                else:
+                    wait = window - elapsed
+                return False, max(wait, 0.0)
+            conn.execute(
+                "INSERT INTO counters (key, value, expires_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (f"rl:{key}:{bucket}", (bucket + 2) * window),
+            )
+            return True, 0.0
+        return await self._call(self._transaction, run)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        def run(conn: sqlite3.Connection, now: float) -> int:
+            conn.execute("DELETE FROM counters WHERE key = ? AND expires_at <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount, now + ttl if ttl else None),
+            )
+            return self._counter(conn, key, now)
+        return await self._call(self._transaction, run)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        def run() -> Optional[bytes]:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+            return row[0] if row else None
+        return await self._call(run)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        def run(conn: sqlite3.Connection, now: float) -> None:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None),
+            )
+        await self._call(self._transaction, run)
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        def run(conn: sqlite3.Connection, now: float) -> bool:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (name, owner, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+        return await self._call(self._transaction, run)
+
+    async def release(self, name: str, owner: str) -> None:
+        def run(conn: sqlite3.Connection, now: float) -> None:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+        await self._call(self._transaction, run)
+
+
+def _sqlite_backend(url: str) -> SharedState:
+    path = url.split(":", 1)[1]
+    if path.startswith("//"):
+        path = path[2:]
+    if not os.path.isabs(path):
+        path = str(PROJECT_ROOT / path)
+    return SQLiteSharedState(path)
+
+
+_BACKENDS: Dict[str, Callable[[str], SharedState]] = {
+    "memory": lambda url: MemorySharedState(),
+    "sqlite": _sqlite_backend,
+}
+
+
+def create_shared_state(url: str = SHARED_STATE_URL, backend: str = SHARED_STATE_BACKEND) -> SharedState:
+    if backend:
+        module, _, attribute = backend.partition(":")
+        return getattr(importlib.import_module(module), attribute)(url)
+    scheme = url.split(":", 1)[0].lower()
+    factory = _BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"SHARED_STATE_URL com esquema desconhecido: {scheme} (disponíveis: {sorted(_BACKENDS)})")
+    return factory(url)
+
+
+shared_state = create_shared_state()
+if not SHARED_STATE_SECRET and not isinstance(shared_state, MemorySharedState):
+    logging.warning("SHARED_STATE_SECRET não definida: os workers não compartilham os modelos treinados")
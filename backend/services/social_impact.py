@@ -1,73 +1,308 @@
 from __future__ import annotations
 
-from statistics import mean
-from typing import Any, Dict, List
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
 
 from prisma import Prisma
 
+from backend.services.timeutil import epoch_ms
 
-async def build_social_impact(db: Prisma) -> Dict[str, Any]:
-    usuarios = await db.usuario.find_many(include={"matriculas": {"include": {"curso": True}}})
-    cursos = await db.materialfonte.find_many()
-    checkins = await db.checkinbio.find_many()
-    sessoes = await db.sessaoaprendizado.find_many()
+IMPACT_RECONCILE_HOUR_UTC = int(os.getenv("IMPACT_RECONCILE_HOUR_UTC", "3"))
+IMPACT_SNAPSHOT_BUCKET_MINUTES = int(os.getenv("IMPACT_SNAPSHOT_BUCKET_MINUTES", "60"))
+IMPACT_HISTORY_DAYS = int(os.getenv("IMPACT_HISTORY_DAYS", "365"))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS indicadores_impacto_contadores ("
+    "chave TEXT PRIMARY KEY, valor REAL NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS indicadores_impacto_historico ("
+    "periodo INTEGER PRIMARY KEY, capturadoEm INTEGER NOT NULL, origem TEXT NOT NULL, metricas TEXT NOT NULL)",
+)
+
+# Cargo ausente conta como "Colaborador", como no cálculo original
+_ROLE_PREFIX = "cargo:"
+_DEFAULT_ROLE = "Colaborador"
+_SIGNATURE_USE_CASES = ["Onboarding ético", "Escuta ativa", "Mentoria verde"]
+
+
+def _is_green(course: Any) -> bool:
+    categoria = (getattr(course, "categoria", None) or "").lower()
+    descricao = (getattr(course, "descricao", None) or "").lower()
+    return "sust" in categoria or "sust" in descricao
+
+
+def _contribution(kind: str, record: Any) -> Counter:
+    """Parcela de um registro de domínio nos contadores de impacto."""
+    counts: Counter = Counter()
+    if record is None:
+        return counts
+    if kind == "checkin":
+        counts["checkins"] += 1
+        counts["somaFoco"] += record.nivelFoco or 0
+        counts["somaEstresse"] += record.nivelEstresse or 0
+    elif kind == "curso":
+        counts["cursosVerdes"] += 1 if _is_green(record) else 0
+    elif kind == "usuario":
+        counts["usuarios"] += 1
+        counts["somaSequencia"] += record.diasSequencia or 0
+        counts[_ROLE_PREFIX + (record.cargo or _DEFAULT_ROLE)] += 1
+    elif kind == "matricula":
+        concluida = 1 if record.status == "CONCLUIDO" else 0
+        if record.ehObrigatorio:
+            counts["obrigatoriasConcluidas"] += concluida
+        else:
+            counts["opcionais"] += 1
+            counts["opcionaisConcluidas"] += concluida
+    elif kind == "sessao":
+        counts["sessoes"] += 1
+    else:
+        raise ValueError(f"Tipo de registro desconhecido: {kind}")
+    return counts
+
+
+def compute_metrics(counters: Dict[str, float]) -> Dict[str, Any]:
+    """Deriva os índices do dashboard a partir dos contadores agregados."""
+    usuarios = int(counters.get("usuarios", 0))
+    total_users = usuarios or 1
+    checkins = int(counters.get("checkins", 0))
+    green_courses = int(counters.get("cursosVerdes", 0))
+    sessoes = int(counters.get("sessoes", 0))
 
-    total_users = len(usuarios) or 1
     sustainable_pace = 0
     if checkins:
-        focus_avg = mean(c.nivelFoco or 0 for c in checkins)
-        stress_avg = mean(c.nivelEstresse or 0 for c in checkins)
+        focus_avg = counters.get("somaFoco", 0) / checkins
+        stress_avg = counters.get("somaEstresse", 0) / checkins
         sustainable_pace = int(0.6 * focus_avg + 0.4 * (100 - stress_avg))
 
-    green_courses = [
-        c for c in cursos if "sust" in (c.categoria or "").lower() or "sust" in (c.descricao or "").lower()
-    ]
-    carbon_alerts = max(0, len(checkins) - len(green_courses) * 4)
-    missions_completed = sum(
-        1
-        for u in usuarios
-        for m in (u.matriculas or [])
-        if m.ehObrigatorio and m.status == "CONCLUIDO"
-    )
     belonging_index = 0
-    streaks = [u.diasSequencia or 0 for u in usuarios]
-    if streaks:
-        belonging_index = int(min(1.0, mean(streaks) / 30) * 100)
-    roles = [u.cargo or "Colaborador" for u in usuarios]
-    diversity_index = int(len(set(roles)) / total_users * 100)
-
-    optional_paths = [
-        m
-        for u in usuarios
-        for m in (u.matriculas or [])
-        if not m.ehObrigatorio
-    ]
-    optional_completed = sum(1 for m in optional_paths if m.status == "CONCLUIDO")
-    equity_ratio = int((optional_completed / len(optional_paths)) * 100) if optional_paths else 0
-
-    bot_sessions = len(sessoes)
-    bot_touch_rate = int((bot_sessions / (total_users or 1)) * 100)
+    if usuarios:
+        belonging_index = int(min(1.0, (counters.get("somaSequencia", 0) / usuarios) / 30) * 100)
+    roles = sum(1 for key, value in counters.items() if key.startswith(_ROLE_PREFIX) and value > 0)
+
+    optional_paths = int(counters.get("opcionais", 0))
+    optional_completed = int(counters.get("opcionaisConcluidas", 0))
+    equity_ratio = int((optional_completed / optional_paths) * 100) if optional_paths else 0
 
     return {
         "esgRadar": {
             "sustainablePace": sustainable_pace,
-            "greenLearningHours": round(len(green_courses) * 1.5, 1),
-            "missionsCompleted": missions_completed,
-            "carbonAlerts": carbon_alerts,
+            "greenLearningHours": round(green_courses * 1.5, 1),
+            "missionsCompleted": int(counters.get("obrigatoriasConcluidas", 0)),
+            "carbonAlerts": max(0, checkins - green_courses * 4),
         },
         "inclusionPulse": {
             "belongingIndex": belonging_index,
-            "diversityIndex": diversity_index,
-            "agentStories": len(sessoes),
+            "diversityIndex": int(roles / total_users * 100),
+            "agentStories": sessoes,
         },
         "talentEquity": {
             "equityRatio": equity_ratio,
-            "optionalTracks": len(optional_paths),
+            "optionalTracks": optional_paths,
             "fastTrackers": optional_completed,
         },
         "botAssistants": {
-            "activeSessions": bot_sessions,
-            "coverage": min(100, bot_touch_rate),
-            "signatureUseCases": ["Onboarding ético", "Escuta ativa", "Mentoria verde"],
+            "activeSessions": sessoes,
+            "coverage": min(100, int((sessoes / total_users) * 100)),
+            "signatureUseCases": list(_SIGNATURE_USE_CASES),
         },
     }
+
+
+class SocialImpactEngine:
+    """
+    Mantém os indicadores ESG/impacto social como contadores incrementais.
+
+    Cada escrita de domínio (check-in, curso, usuário, matrícula, sessão)
+    aplica a diferença entre o registro antes e depois da mudança; o
+    dashboard lê só o snapshot mais recente. Um snapshot por período
+    (`IMPACT_SNAPSHOT_BUCKET_MINUTES`) fica no histórico para gráficos de
+    tendência, e uma reconciliação noturna recalcula tudo no banco para
+    corrigir desvios (ex.: exclusões em cascata).
+    """
+
+    def __init__(
+        self,
+        reconcile_hour: int = IMPACT_RECONCILE_HOUR_UTC,
+        bucket_minutes: int = IMPACT_SNAPSHOT_BUCKET_MINUTES,
+        history_days: int = IMPACT_HISTORY_DAYS,
+    ) -> None:
+        self.reconcile_hour = reconcile_hour % 24
+        self.bucket_ms = max(1, bucket_minutes) * 60 * 1000
+        self.history_days = history_days
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_schema(self, db: Prisma) -> None:
+        for statement in _SCHEMA:
+            await db.execute_raw(statement)
+        rows = await db.query_raw("SELECT COUNT(*) AS total FROM indicadores_impacto_contadores")
+        if not rows or not rows[0]["total"]:
+            await self.reconcile(db)
+
+    async def start(self, db: Prisma) -> None:
+        self._task = asyncio.create_task(self._nightly(db))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _seconds_until_reconcile(self, now: datetime) -> float:
+        target = now.replace(hour=self.reconcile_hour, minute=0, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    async def _nightly(self, db: Prisma) -> None:
+        while True:
+            await asyncio.sleep(self._seconds_until_reconcile(datetime.utcnow()))
+            try:
+                await self.reconcile(db)
+            except Exception:
+                logging.exception("Reconciliação dos indicadores de impacto falhou")
+
+    async def record(self, db: Prisma, kind: str, before: Any = None, after: Any = None) -> None:
+        """
+        Aplica a mudança de um registro (`before` -> `after`; None em
+        criação/exclusão). Falhas só geram aviso: a escrita de domínio já
+        foi feita e a reconciliação corrige o contador.
+        """
+        delta = _contribution(kind, after)
+        delta.subtract(_contribution(kind, before))
+        delta = {key: value for key, value in delta.items() if value}
+        if not delta:
+            return
+        try:
+            await self._increment(db, delta)
+            await self._snapshot(db, "incremental")
+        except Exception as exc:
+            logging.warning("Falha ao atualizar indicadores de impacto: %s", exc)
+
+    async def _increment(self, db: Prisma, delta: Dict[str, float]) -> None:
+        placeholders = ", ".join("(?, ?)" for _ in delta)
+        params: List[Any] = []
+        for key, value in delta.items():
+            params.extend((key, float(value)))
+        await db.execute_raw(
+            "INSERT INTO indicadores_impacto_contadores (chave, valor) VALUES "
+            f"{placeholders} ON CONFLICT(chave) DO UPDATE SET valor = valor + excluded.valor",
+            *params,
+        )
+
+    async def _counters(self, db: Prisma) -> Dict[str, float]:
+        rows = await db.query_raw("SELECT chave, valor FROM indicadores_impacto_contadores")
+        return {row["chave"]: float(row["valor"] or 0) for row in rows}
+
+    async def _snapshot(self, db: Prisma, origin: str) -> Dict[str, Any]:
+        metrics = compute_metrics(await self._counters(db))
+        now_ms = epoch_ms()
+        await db.execute_raw(
+            "INSERT OR REPLACE INTO indicadores_impacto_historico (periodo, capturadoEm, origem, metricas) "
+            "VALUES (?, ?, ?, ?)",
+            now_ms - now_ms % self.bucket_ms,
+            now_ms,
+            origin,
+            json.dumps(metrics, ensure_ascii=False),
+        )
+        return metrics
+
+    async def _recount(self, db: Prisma) -> Dict[str, float]:
+        counters: Dict[str, float] = {}
+        checkins = await db.query_raw(
+            "SELECT COUNT(*) AS total, COALESCE(SUM(COALESCE(nivelFoco, 0)), 0) AS foco, "
+            "COALESCE(SUM(COALESCE(nivelEstresse, 0)), 0) AS estresse FROM checkins_bio"
+        )
+        counters["checkins"] = checkins[0]["total"]
+        counters["somaFoco"] = checkins[0]["foco"]
+        counters["somaEstresse"] = checkins[0]["estresse"]
+
+        green = await db.query_raw(
+            "SELECT COUNT(*) AS total FROM materiais_fonte "
+            "WHERE LOWER(COALESCE(categoria, '')) LIKE '%sust%' OR LOWER(COALESCE(descricao, '')) LIKE '%sust%'"
+        )
+        counters["cursosVerdes"] = green[0]["total"]
+
+        roles = await db.query_raw(
+            "SELECT COALESCE(NULLIF(cargo, ''), ?) AS cargo, COUNT(*) AS total, "
+            "COALESCE(SUM(COALESCE(diasSequencia, 0)), 0) AS sequencia FROM usuarios GROUP BY 1",
+            _DEFAULT_ROLE,
+        )
+        counters["usuarios"] = sum(row["total"] for row in roles)
+        counters["somaSequencia"] = sum(row["sequencia"] for row in roles)
+        for row in roles:
+            counters[_ROLE_PREFIX + row["cargo"]] = row["total"]
+
+        enrollments = await db.query_raw(
+            "SELECT "
+            "COALESCE(SUM(CASE WHEN COALESCE(ehObrigatorio, 0) AND status = 'CONCLUIDO' THEN 1 ELSE 0 END), 0) AS obrigatorias, "
+            "COALESCE(SUM(CASE WHEN NOT COALESCE(ehObrigatorio, 0) THEN 1 ELSE 0 END), 0) AS opcionais, "
+            "COALESCE(SUM(CASE WHEN NOT COALESCE(ehObrigatorio, 0) AND status = 'CONCLUIDO' THEN 1 ELSE 0 END), 0) AS opcionaisConcluidas "
+            "FROM matriculas"
+        )
+        counters["obrigatoriasConcluidas"] = enrollments[0]["obrigatorias"]
+        counters["opcionais"] = enrollments[0]["opcionais"]
+        counters["opcionaisConcluidas"] = enrollments[0]["opcionaisConcluidas"]
+
+        sessions = await db.query_raw("SELECT COUNT(*) AS total FROM sessoes_aprendizado")
+        counters["sessoes"] = sessions[0]["total"]
+        return counters
+
+    async def reconcile(self, db: Prisma) -> Dict[str, Any]:
+        """Recalcula os contadores a partir das tabelas de domínio e grava um snapshot."""
+        counters = await self._recount(db)
+        # cargos que sumiram ficam zerados em vez de apagados (um único upsert)
+        for key in await self._counters(db):
+            counters.setdefault(key, 0)
+        placeholders = ", ".join("(?, ?)" for _ in counters)
+        params: List[Any] = []
+        for key, value in counters.items():
+            params.extend((key, float(value or 0)))
+        await db.execute_raw(
+            "INSERT INTO indicadores_impacto_contadores (chave, valor) VALUES "
+            f"{placeholders} ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+            *params,
+        )
+        cutoff = epoch_ms(datetime.utcnow() - timedelta(days=self.history_days))
+        await db.execute_raw("DELETE FROM indicadores_impacto_historico WHERE periodo < ?", cutoff)
+        return await self._snapshot(db, "reconciliacao")
+
+    async def current(self, db: Prisma) -> Dict[str, Any]:
+        rows = await db.query_raw(
+            "SELECT metricas FROM indicadores_impacto_historico ORDER BY periodo DESC LIMIT 1"
+        )
+        if rows:
+            return json.loads(rows[0]["metricas"])
+        return await self._snapshot(db, "incremental")
+
+    async def history(self, db: Prisma, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        cutoff = epoch_ms(since) if since else 0
+        rows = await db.query_raw(
+            "SELECT periodo, capturadoEm, origem, metricas FROM indicadores_impacto_historico "
+            "WHERE periodo >= ? ORDER BY periodo",
+            cutoff,
+        )
+        return [
+            {
+                "period": datetime.utcfromtimestamp(row["periodo"] / 1000).isoformat(),
+                "capturedAt": datetime.utcfromtimestamp(row["capturadoEm"] / 1000).isoformat(),
+                "source": row["origem"],
+                "metrics": json.loads(row["metricas"]),
+            }
+            for row in rows
+        ]
+
+
+social_impact = SocialImpactEngine()
+
+
+async def build_social_impact(db: Prisma) -> Dict[str, Any]:
+    """Indicadores de impacto social do dashboard do gestor (snapshot mais recente)."""
+    return await social_impact.current(db)
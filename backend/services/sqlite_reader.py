@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, List, Optional
+
+import aiosqlite
+
+SQLITE_FAST_READS = os.getenv("SQLITE_FAST_READS", "true").lower() in {"1", "true", "yes"}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024)))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+
+def sqlite_datetime(value: Any) -> Optional[datetime]:
+    """Converte DateTime gravado pelo Prisma (epoch ms) ou texto ISO."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value / 1000)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+class SQLiteReadPool:
+    """
+    Pool de conexões aiosqlite somente-leitura para endpoints quentes.
+
+    O pool é sempre aberto quando o arquivo existe (serve de fallback quando o
+    Prisma falha ao decodificar linhas); `SQLITE_FAST_READS` decide se os
+    endpoints o usam como caminho principal.
+
+    Evita o motor de queries do Prisma (processo separado + JSON) em leituras
+    agregadas: cada conexão abre o arquivo com `mode=ro`, `query_only`,
+    `mmap_size` e `cache_size` ajustados, e reaproveita statements preparados
+    pelo cache do módulo sqlite3 (as consultas são strings constantes).
+    O banco é colocado em WAL uma vez na abertura para que estas leituras
+    não bloqueiem o escritor.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int = SQLITE_READ_POOL_SIZE,
+        mmap_size: int = SQLITE_MMAP_SIZE,
+        cache_size_kib: int = SQLITE_CACHE_SIZE_KIB,
+        enabled: bool = SQLITE_FAST_READS,
+    ) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.enabled = enabled
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+
+    @property
+    def ready(self) -> bool:
+        return self._pool is not None
+
+    @property
+    def available(self) -> bool:
+        """Indica se os endpoints devem preferir o caminho SQL direto."""
+        return self.enabled and self._pool is not None
+
+    def _ensure_wal(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError as exc:
+            logging.warning("Não foi possível ativar WAL em %s: %s", self.path, exc)
+        finally:
+            conn.close()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(
+            f"file:{self.path}?mode=ro",
+            uri=True,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        await conn.execute("PRAGMA query_only=1")
+        await conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        await conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    async def open(self) -> None:
+        if self._pool is not None:
+            return
+        if not os.path.exists(self.path):
+            logging.warning("SQLite %s inexistente; leituras rápidas desativadas", self.path)
+            return
+        await asyncio.to_thread(self._ensure_wal)
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await self._connect()
+            self._connections.append(conn)
+            pool.put_nowait(conn)
+        self._pool = pool
+
+    async def close(self) -> None:
+        self._pool = None
+        for conn in self._connections:
+            await conn.close()
+        self._connections = []
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._pool is None:
+            raise RuntimeError("Pool SQLite não inicializado")
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
+    async def fetch_all(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        async with self.acquire() as conn:
+            async with conn.execute(sql, tuple(params)) as cursor:
+                return list(await cursor.fetchall())
+
+    async def fetch_one(self, sql: str, params: Iterable[Any] = ()) -> Optional[sqlite3.Row]:
+        async with self.acquire() as conn:
+            async with conn.execute(sql, tuple(params)) as cursor:
+                return await cursor.fetchone()
+
+
+# --- Consultas dos endpoints quentes (uma ida ao banco cada) ---
+
+USERS_SQL = """
+SELECT u.id, u.nome, u.email, u.cpf, u.cargo, u.idEquipe, u.avatarUrl,
+       u.totalXp, u.nivel, u.diasSequencia,
+       COALESCE(m.atribuidos, 0) AS atribuidos,
+       COALESCE(m.concluidos, 0) AS concluidos,
+       COALESCE(m.atrasados, 0) AS atrasados
+FROM usuarios u
+LEFT JOIN (
+    SELECT idUsuario,
+           COUNT(*) AS atribuidos,
+           SUM(CASE WHEN UPPER(COALESCE(status, '')) = 'CONCLUIDO' THEN 1 ELSE 0 END) AS concluidos,
+           SUM(CASE WHEN UPPER(COALESCE(status, '')) IN ('ATRASADO', 'REPROVADO_SIMULADO') THEN 1 ELSE 0 END) AS atrasados
+    FROM matriculas
+    GROUP BY idUsuario
+) m ON m.idUsuario = u.id
+ORDER BY COALESCE(u.nome, '')
+"""
+
+TEAMS_SQL = """
+SELECT e.id, e.nome, e.descricao, e.idArea, e.idGestor, a.nome AS areaNome,
+       COALESCE(uc.membros, 0) AS membros,
+       mt.progressoMedio, mt.notaMedia
+FROM equipes e
+LEFT JOIN areas a ON a.id = e.idArea
+LEFT JOIN (
+    SELECT idEquipe, COUNT(*) AS membros FROM usuarios GROUP BY idEquipe
+) uc ON uc.idEquipe = e.id
+LEFT JOIN (
+    SELECT u.idEquipe AS idEquipe,
+           AVG(COALESCE(m.progresso, 0)) AS progressoMedio,
+           AVG(m.notaFinal) AS notaMedia
+    FROM matriculas m
+    JOIN usuarios u ON u.id = m.idUsuario
+    GROUP BY u.idEquipe
+) mt ON mt.idEquipe = e.id
+"""
+
+ENROLLMENT_STATUS_COUNTS_SQL = """
+SELECT COALESCE(status, 'NAO_INICIADO') AS status, COUNT(*) AS total
+FROM matriculas
+GROUP BY COALESCE(status, 'NAO_INICIADO')
+"""
+
+TEAM_COMPARISON_SQL = """
+SELECT e.nome,
+       COUNT(DISTINCT u.id) AS totalColaboradores,
+       COALESCE(x.xpMedio, 0) AS xpMedio,
+       COALESCE(m.total, 0) AS totalMatriculas,
+       COALESCE(m.concluidas, 0) AS concluidas,
+       COALESCE(m.atrasadas, 0) AS atrasadas
+FROM equipes e
+JOIN usuarios u ON u.idEquipe = e.id
+LEFT JOIN (
+    SELECT idEquipe, AVG(COALESCE(totalXp, 0)) AS xpMedio FROM usuarios GROUP BY idEquipe
+) x ON x.idEquipe = e.id
+LEFT JOIN (
+    SELECT u2.idEquipe AS idEquipe,
+           COUNT(*) AS total,
+           SUM(CASE WHEN m2.status = 'CONCLUIDO' THEN 1 ELSE 0 END) AS concluidas,
+           SUM(CASE WHEN m2.status = 'ATRASADO' THEN 1 ELSE 0 END) AS atrasadas
+    FROM matriculas m2
+    JOIN usuarios u2 ON u2.id = m2.idUsuario
+    GROUP BY u2.idEquipe
+) m ON m.idEquipe = e.id
+GROUP BY e.id
+"""
+
+LATEST_COLLABORATOR_CHECKINS_SQL = """
+SELECT AVG(COALESCE(c.nivelFoco, 0)) AS focoMedio,
+       AVG(COALESCE(c.nivelEstresse, 0)) AS stressMedio,
+       COUNT(*) AS total
+FROM usuarios u
+JOIN checkins_bio c ON c.rowid = (
+    SELECT c2.rowid FROM checkins_bio c2
+    WHERE c2.idUsuario = u.id
+    ORDER BY c2.dataHora DESC
+    LIMIT 1
+)
+WHERE u.papel = 'COLABORADOR'
+"""
+
+LATEST_USER_CHECKIN_SQL = """
+SELECT nivelFoco, nivelEstresse, horasSono, qualidadeSono, dataHora
+FROM checkins_bio
+WHERE idUsuario = ?
+ORDER BY dataHora DESC
+LIMIT 1
+"""
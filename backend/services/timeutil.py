@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import calendar
+import time
+from datetime import datetime
+from typing import Optional
+
+
+def epoch_ms(value: Optional[datetime] = None) -> int:
+    """
+    Epoch em milissegundos, como o Prisma grava DateTime no SQLite; sem
+    argumento, o instante atual. Datas ingênuas são UTC (`datetime.utcnow()`
+    no código), não hora local como em `.timestamp()`.
+    """
+    if value is None:
+        return int(time.time() * 1000)
+    if value.tzinfo is not None:
+        return int(value.timestamp() * 1000)
+    return calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000
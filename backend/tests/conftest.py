@@ -0,0 +1,90 @@
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+import pytest
+
+from backend.services.query_hooks import query_hooks
+from backend.services.query_tracer import query_tracer
+
+
+class SQLitePrisma:
+    """
+    Cliente mínimo com a mesma porta do Prisma para SQL cru: `query_raw`
+    passa por `_execute`, que é o ponto que o `query_hooks` envolve.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    async def _execute(self, *, method: str, arguments: Dict[str, Any], model: Any = None) -> Any:
+        cursor = self.conn.execute(arguments["query"], arguments.get("parameters", []))
+        return [dict(row) for row in cursor.fetchall()]
+
+    async def query_raw(self, query: str, *args: Any) -> List[Dict[str, Any]]:
+        return await self._execute(method="query_raw", arguments={"query": query, "parameters": list(args)})
+
+    async def execute_raw(self, query: str, *args: Any) -> int:
+        await self._execute(method="execute_raw", arguments={"query": query, "parameters": list(args)})
+        return self.conn.total_changes
+
+    def batch_(self) -> "SQLiteBatch":
+        return SQLiteBatch(self.conn)
+
+
+class SQLiteBatch:
+    """`batch_()` do Prisma: as operações enfileiradas rodam numa transação ao sair do bloco."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.statements: List[tuple] = []
+
+    def execute_raw(self, query: str, *args: Any) -> None:
+        self.statements.append((query, args))
+
+    async def __aenter__(self) -> "SQLiteBatch":
+        return self
+
+    async def __aexit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is not None:
+            return
+        with self.conn:
+            for query, args in self.statements:
+                self.conn.execute(query, args)
+
+
+class SQLiteReadPool:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    async def fetch_all(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        return self.conn.execute(sql, tuple(params)).fetchall()
+
+    async def fetch_one(self, sql: str, params: Iterable[Any] = ()) -> Optional[sqlite3.Row]:
+        return self.conn.execute(sql, tuple(params)).fetchone()
+
+
+@pytest.fixture
+def sqlite_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def db(sqlite_conn):
+    return SQLitePrisma(sqlite_conn)
+
+
+@pytest.fixture
+def query_trace(db, sqlite_conn):
+    """
+    Trace das consultas feitas dentro do teste pelo `query_tracer`, como o
+    middleware faz por requisição. Use `trace.assert_budget(n)` ao final.
+    """
+    query_tracer.instrument(db, SQLiteReadPool(sqlite_conn))
+    try:
+        with query_tracer.trace("test") as trace:
+            yield trace
+    finally:
+        query_hooks.unsubscribe(query_tracer._on_query)
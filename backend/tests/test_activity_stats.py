@@ -0,0 +1,81 @@
+"""Reconciliação das estatísticas incrementais com `interacoes`."""
+import asyncio
+
+import pytest
+
+from backend.services.activity_stats import ActivityStatsStore
+
+
+@pytest.fixture
+def store():
+    return ActivityStatsStore(settle_seconds=0)
+
+
+@pytest.fixture
+def interactions(db, sqlite_conn, store):
+    sqlite_conn.execute(
+        "CREATE TABLE interacoes (id INTEGER PRIMARY KEY, idAtividade TEXT, tempoRespostaMs INTEGER,"
+        " tentativas INTEGER, estaCorreto INTEGER)"
+    )
+    asyncio.run(store.ensure_schema(db))
+
+    def insert(activity_id, count, notify=True):
+        rows = [
+            {"idAtividade": activity_id, "tempoRespostaMs": 1000 + i * 10, "tentativas": 1 + i % 3, "estaCorreto": i % 2}
+            for i in range(count)
+        ]
+        sqlite_conn.executemany(
+            "INSERT INTO interacoes (idAtividade, tempoRespostaMs, tentativas, estaCorreto)"
+            " VALUES (:idAtividade, :tempoRespostaMs, :tentativas, :estaCorreto)",
+            rows,
+        )
+        if notify:
+            asyncio.run(store.record(db, rows))
+
+    return insert
+
+
+def stats(db, store, *activity_ids):
+    return asyncio.run(store.get_many(db, list(activity_ids)))
+
+
+def test_consistent_stats_are_left_alone(db, store, interactions):
+    interactions("a1", 5)
+    assert asyncio.run(store.drifted(db)) == []
+    assert asyncio.run(store.reconcile(db)) == 0
+
+
+def test_reconcile_rebuilds_only_drifted_activities(db, store, interactions):
+    interactions("a1", 5)
+    interactions("a2", 4)
+    # gravadas sem passar pelo listener (ex.: queda antes do upsert, seed)
+    interactions("a2", 3, notify=False)
+    interactions("a3", 2, notify=False)
+    before = stats(db, store, "a1")["a1"]
+
+    assert sorted(asyncio.run(store.drifted(db))) == ["a2", "a3"]
+    assert asyncio.run(store.reconcile(db)) == 2
+
+    after = stats(db, store, "a1", "a2", "a3")
+    assert after["a1"]["updatedAt"] == before["updatedAt"]
+    assert [after[key]["attempts"] for key in ("a1", "a2", "a3")] == [5, 7, 2]
+    assert sum(after["a2"]["attemptsHistogram"].values()) == 7
+    assert asyncio.run(store.drifted(db)) == []
+
+
+def test_reconcile_drops_stats_without_interactions(db, sqlite_conn, store, interactions):
+    interactions("a1", 3)
+    sqlite_conn.execute("DELETE FROM interacoes WHERE idAtividade = 'a1'")
+
+    assert asyncio.run(store.reconcile(db)) == 0
+    assert stats(db, store, "a1")["a1"]["attempts"] == 0
+    assert sqlite_conn.execute("SELECT COUNT(*) FROM estatisticas_atividades_buckets").fetchone()[0] == 0
+
+
+def test_rebuild_matches_incremental_counters(db, store, interactions):
+    interactions("a1", 20)
+    incremental = stats(db, store, "a1")["a1"]
+    asyncio.run(store.rebuild(db))
+    rebuilt = stats(db, store, "a1")["a1"]
+    for key in ("attempts", "answered", "correct", "avgResponseTimeMs", "responseTimeMs", "attemptsHistogram"):
+        assert rebuilt[key] == incremental[key]
@@ -0,0 +1,129 @@
+"""Paridade dos ensembles compilados com os modelos originais."""
+import numpy as np
+import pytest
+
+from backend.ml.inference import compiled_trees
+from backend.ml.inference.compiled_trees import (
+    CompiledBoostedRegressor,
+    CompiledForestClassifier,
+    CompiledForestRegressor,
+    CompiledIsolationForest,
+    compiled_or_original,
+)
+
+RTOL = 1e-5
+# XGBoost e LightGBM acumulam as folhas em float32
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(400, 6))
+    y_reg = X[:, 0] * 2 + X[:, 1] * X[:, 2] + rng.normal(scale=0.1, size=400)
+    y_cls = (X[:, 0] + X[:, 3] > 0).astype(int)
+    # linhas fora do treino; os testes de boosting acrescentam faltantes (NaN)
+    X_test = rng.normal(size=(64, 6))
+    return X, y_reg, y_cls, X_test
+
+
+def test_random_forest_regressor(data):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y, _, X_test = data
+    model = RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+    compiled = compiled_or_original(model)
+    assert isinstance(compiled, CompiledForestRegressor)
+    np.testing.assert_allclose(compiled.predict(X_test), model.predict(X_test), rtol=RTOL, atol=1e-9)
+
+
+def test_random_forest_classifier(data):
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, _, y, X_test = data
+    model = RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0).fit(X, y)
+    compiled = compiled_or_original(model)
+    assert isinstance(compiled, CompiledForestClassifier)
+    np.testing.assert_allclose(compiled.predict_proba(X_test), model.predict_proba(X_test), rtol=RTOL, atol=1e-9)
+    np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+
+
+def test_isolation_forest(data):
+    from sklearn.ensemble import IsolationForest
+
+    X, _, _, X_test = data
+    model = IsolationForest(n_estimators=30, max_features=0.8, random_state=0).fit(X)
+    compiled = compiled_or_original(model)
+    assert isinstance(compiled, CompiledIsolationForest)
+    np.testing.assert_allclose(compiled.score_samples(X_test), model.score_samples(X_test), rtol=RTOL, atol=1e-9)
+    np.testing.assert_allclose(
+        compiled.decision_function(X_test), model.decision_function(X_test), rtol=RTOL, atol=1e-9
+    )
+    np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+
+
+def test_xgboost_regressor(data):
+    xgb = pytest.importorskip("xgboost")
+
+    X, y, _, X_test = data
+    model = xgb.XGBRegressor(n_estimators=30, max_depth=4, tree_method="hist").fit(X, y)
+    X_test = X_test.copy()
+    X_test[::7, 1] = np.nan
+    compiled = compiled_or_original(model)
+    assert isinstance(compiled, CompiledBoostedRegressor)
+    np.testing.assert_allclose(compiled.predict(X_test), model.predict(X_test), rtol=RTOL, atol=ATOL)
+
+
+def test_lightgbm_regressor(data):
+    lgb = pytest.importorskip("lightgbm")
+
+    X, y, _, X_test = data
+    model = lgb.LGBMRegressor(n_estimators=30, num_leaves=15, verbose=-1).fit(X, y)
+    X_test = X_test.copy()
+    X_test[::7, 1] = np.nan
+    compiled = compiled_or_original(model)
+    assert isinstance(compiled, CompiledBoostedRegressor)
+    np.testing.assert_allclose(compiled.predict(X_test), model.predict(X_test), rtol=RTOL, atol=ATOL)
+
+
+def test_large_batches_use_the_original(data, monkeypatch):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y, _, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    compiled = compiled_or_original(model)
+    monkeypatch.setattr(compiled_trees, "ML_COMPILED_BATCH_ROWS", 10)
+    monkeypatch.setattr(compiled.trees, "leaf_values", pytest.fail)
+    np.testing.assert_allclose(compiled.predict(X_test), model.predict(X_test))
+
+
+def test_fallback_keeps_unsupported_models(data):
+    from sklearn.linear_model import LogisticRegression
+
+    X, _, y, X_test = data
+    model = LogisticRegression().fit(X, y)
+    assert compiled_or_original(model) is model
+    assert compiled_or_original(None) is None
+
+
+def test_fallback_when_disabled(data):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y, _, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    assert compiled_or_original(model, enabled=False) is model
+
+
+def test_fallback_when_compilation_fails(data, monkeypatch):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y, _, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+
+    def broken(model):
+        raise ValueError("dump inválido")
+
+    monkeypatch.setattr(compiled_trees, "compile_model", broken)
+    fallback = compiled_or_original(model)
+    assert fallback is model
+    np.testing.assert_allclose(fallback.predict(X_test), model.predict(X_test))
@@ -0,0 +1,73 @@
+"""Orçamento de consultas das rotas agregadas (`@query_budget`)."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.services.predictive_lab import predictive_lab
+from backend.services.query_tracer import QueryBudgetExceeded
+from backend.services.timeutil import epoch_ms
+
+# mesmo orçamento de GET /api/analytics/overview (app.py)
+ANALYTICS_OVERVIEW_BUDGET = 2
+TEAMS = 6
+
+
+@pytest.fixture
+def teams(sqlite_conn):
+    sqlite_conn.executescript(
+        """
+        CREATE TABLE equipes (id INTEGER PRIMARY KEY, nome TEXT);
+        CREATE TABLE usuarios (id INTEGER PRIMARY KEY, idEquipe INTEGER);
+        CREATE TABLE checkins_bio (
+            id INTEGER PRIMARY KEY, idUsuario INTEGER, dataHora INTEGER,
+            nivelEstresse REAL, nivelFoco REAL, horasSono REAL, qualidadeSono REAL, nivelFadiga REAL
+        );
+        """
+    )
+    now = datetime.utcnow()
+    for team in range(1, TEAMS + 1):
+        sqlite_conn.execute("INSERT INTO equipes VALUES (?, ?)", (team, f"Equipe {team}"))
+        sqlite_conn.execute("INSERT INTO usuarios VALUES (?, ?)", (team, team))
+        for days in (1, 40):
+            sqlite_conn.execute(
+                "INSERT INTO checkins_bio (idUsuario, dataHora, nivelEstresse, nivelFoco, horasSono,"
+                " qualidadeSono, nivelFadiga) VALUES (?, ?, ?, ?, 7, 3, 2)",
+                (team, epoch_ms(now - timedelta(days=days)), team, 10 - team),
+            )
+    return now
+
+
+async def team_metrics_per_team(db):
+    """O padrão que a consulta agrupada substituiu: uma consulta por equipe."""
+    rows = []
+    for team in await db.query_raw("SELECT id, nome FROM equipes ORDER BY nome"):
+        stats = await db.query_raw(
+            "SELECT COUNT(*) AS checkins, AVG(c.nivelEstresse) AS nivelEstresse FROM checkins_bio c"
+            " JOIN usuarios u ON u.id = c.idUsuario WHERE u.idEquipe = ?",
+            team["id"],
+        )
+        rows.append({"teamId": team["id"], "teamName": team["nome"], **stats[0]})
+    return rows
+
+
+def test_team_metrics_stays_within_budget(db, teams, query_trace):
+    rows = asyncio.run(predictive_lab.team_metrics(db))
+    recent = asyncio.run(predictive_lab.team_metrics(db, teams - timedelta(days=7)))
+
+    assert [row["checkins"] for row in rows] == [2] * TEAMS
+    assert [row["checkins"] for row in recent] == [1] * TEAMS
+    assert query_trace.total == 2
+    query_trace.assert_budget(ANALYTICS_OVERVIEW_BUDGET)
+    query_trace.assert_no_repeats(threshold=2)
+
+
+def test_per_team_queries_trip_the_budget(db, teams, query_trace):
+    rows = asyncio.run(team_metrics_per_team(db))
+
+    assert len(rows) == TEAMS
+    assert query_trace.total == TEAMS + 1
+    with pytest.raises(QueryBudgetExceeded, match="orçamento 2"):
+        query_trace.assert_budget(ANALYTICS_OVERVIEW_BUDGET)
+    with pytest.raises(QueryBudgetExceeded, match=f"{TEAMS}x"):
+        query_trace.assert_no_repeats()
@@ -0,0 +1,115 @@
+"""Estado compartilhado em SQLite: dois clientes (ou processos) no mesmo arquivo."""
+import asyncio
+import multiprocessing
+
+import pytest
+
+from backend.services.shared_state import SQLiteSharedState
+
+WINDOW = 3600.0
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared_state.db")
+
+
+def run_with_clients(path, scenario):
+    """Roda `scenario(a, b)` com dois clientes (conexões próprias) no mesmo arquivo."""
+    async def main():
+        a, b = SQLiteSharedState(path), SQLiteSharedState(path)
+        try:
+            return await scenario(a, b)
+        finally:
+            await a.close()
+            await b.close()
+    return asyncio.run(main())
+
+
+def _worker(path, key, count):
+    """Outro processo: `count` hits no rate limit e tenta a lease do primeiro."""
+    async def main():
+        state = SQLiteSharedState(path)
+        try:
+            for _ in range(count):
+                await state.hit(key, 10, WINDOW)
+            return await state.acquire("job", "worker-2", 60)
+        finally:
+            await state.close()
+    # código 3: pegou uma lease que tinha dono
+    raise SystemExit(3 if asyncio.run(main()) else 0)
+
+
+def test_rate_limit_counter_is_shared(path):
+    async def scenario(a, b):
+        results = [await a.hit("login:1.2.3.4", 3, WINDOW), await b.hit("login:1.2.3.4", 3, WINDOW)]
+        results.append(await a.hit("login:1.2.3.4", 3, WINDOW))
+        blocked_b = await b.hit("login:1.2.3.4", 3, WINDOW)
+        blocked_a = await a.hit("login:1.2.3.4", 3, WINDOW)
+        other_key = await b.hit("login:5.6.7.8", 3, WINDOW)
+        return results, blocked_b, blocked_a, other_key
+
+    results, blocked_b, blocked_a, other_key = run_with_clients(path, scenario)
+    assert [allowed for allowed, _ in results] == [True, True, True]
+    assert blocked_b[0] is False and blocked_b[1] > 0
+    assert blocked_a[0] is False
+    assert other_key == (True, 0.0)
+
+
+def test_leases_are_exclusive_across_clients(path):
+    async def scenario(a, b):
+        steps = [
+            await a.acquire("predictive_lab:trainer", "worker-a", 60),
+            await b.acquire("predictive_lab:trainer", "worker-b", 60),
+            # renovar a própria lease funciona
+            await a.acquire("predictive_lab:trainer", "worker-a", 60),
+        ]
+        # só o dono solta a lease
+        await b.release("predictive_lab:trainer", "worker-b")
+        steps.append(await b.acquire("predictive_lab:trainer", "worker-b", 60))
+        await a.release("predictive_lab:trainer", "worker-a")
+        steps.append(await b.acquire("predictive_lab:trainer", "worker-b", 60))
+        return steps
+
+    assert run_with_clients(path, scenario) == [True, False, True, False, True]
+
+
+def test_expired_lease_is_taken_over(path):
+    async def scenario(a, b):
+        first = await a.acquire("job", "worker-a", 0.05)
+        await asyncio.sleep(0.1)
+        return first, await b.acquire("job", "worker-b", 60), await a.acquire("job", "worker-a", 60)
+
+    assert run_with_clients(path, scenario) == (True, True, False)
+
+
+def test_counters_and_values_are_shared(path):
+    async def scenario(a, b):
+        await a.incr("predictive_lab:version")
+        version = await b.incr("predictive_lab:version")
+        await b.set("predictive_lab:state", b"blob", ttl=60)
+        return version, await a.get("predictive_lab:state")
+
+    assert run_with_clients(path, scenario) == (2, b"blob")
+
+
+def test_state_is_shared_with_another_process(path):
+    async def scenario():
+        state = SQLiteSharedState(path)
+        try:
+            assert await state.acquire("job", "worker-1", 60)
+            await state.hit("api:user", 7, WINDOW)
+
+            child = multiprocessing.get_context("spawn").Process(target=_worker, args=(path, "api:user", 4))
+            child.start()
+            await asyncio.get_running_loop().run_in_executor(None, child.join, 30)
+
+            allowed = [(await state.hit("api:user", 7, WINDOW))[0] for _ in range(3)]
+            return child.exitcode, allowed
+        finally:
+            await state.close()
+
+    exitcode, allowed = asyncio.run(scenario())
+    assert exitcode == 0
+    # 1 hit daqui + 4 do outro processo: só restam 2 dos 7
+    assert allowed == [True, True, False]
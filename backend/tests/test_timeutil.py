@@ -0,0 +1,22 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.services.sqlite_reader import sqlite_datetime
+from backend.services.timeutil import epoch_ms
+
+
+def test_naive_datetimes_are_utc():
+    naive = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    assert epoch_ms(naive) == 1767323045678
+    assert epoch_ms(naive) == epoch_ms(naive.replace(tzinfo=timezone.utc))
+    assert epoch_ms(naive.replace(tzinfo=timezone(timedelta(hours=-3)))) == 1767323045678 + 3 * 3600 * 1000
+
+
+def test_round_trip_with_sqlite_datetime():
+    value = datetime(2025, 7, 30, 23, 59, 59, 999000)
+    assert sqlite_datetime(epoch_ms(value)) == value
+
+
+def test_now_by_default():
+    before = int(time.time() * 1000)
+    assert before <= epoch_ms() <= int(time.time() * 1000)
@@ -0,0 +1,4 @@
+-- AlterTable
+ALTER TABLE "usuarios" ADD COLUMN "perfilAprendizado" TEXT;
+ALTER TABLE "usuarios" ADD COLUMN "perfilCluster" INTEGER;
+ALTER TABLE "usuarios" ADD COLUMN "perfilAtualizadoEm" DATETIME;
@@ -57,6 +57,7 @@ export interface CollaboratorDashboardData {
     categoria?: string;
     thumbnailUrl?: string;
     tipoCurso?: string;
+    score?: number | null;
   }>;
 }
 
@@ -92,6 +93,19 @@ export interface ManagerDashboardData {
       tituloCurso: string;
       notaFinal?: number;
     }>;
+    anomaliasBemEstar?: Array<{
+      id: number;
+      idUsuario: string;
+      nomeUsuario: string;
+      avatarUrl?: string | null;
+      metrica: 'nivelFoco' | 'nivelEstresse' | 'nivelFadiga' | 'horasSono';
+      valor: number;
+      media: number;
+      zScore: number;
+      tipo: 'zscore' | 'cusum';
+      direcao: 'alta' | 'queda';
+      dataHora: string;
+    }>;
   };
   performance: {
     top5: Array<{
@@ -125,8 +139,14 @@ export interface ManagerDashboardData {
       teamName: string;
       stressRisk: number;
       focusScore: number;
+      checkins?: number;
+      projection?: {
+        stress: number;
+        focus: number;
+      };
       recommendation: string;
     }>;
+    windowStart?: string | null;
     topSignals: Array<{
       label: string;
       impact: number;